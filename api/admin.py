@@ -1,12 +1,13 @@
 from django.contrib import admin
-from .models import Category, Product, Order, OrderItem
+from .models import CATEGORY_SUMMARY_FIELDS, Category, Product, Order, OrderItem, OutboxMessage
 
 # Register your models here.
 
 # Register Category configurations
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ("name", "created_at")
+    list_display = ("name", "product_count", "in_stock_count", "created_at")
+    readonly_fields = CATEGORY_SUMMARY_FIELDS
 
 # Register Product configurations
 @admin.register(Product)
@@ -24,4 +25,10 @@ class OrderItemInline(admin.TabularInline):
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = ("id", "user", "status", "total_price", "created_at")
-    inlines = [OrderItemInline]
\ No newline at end of file
+    inlines = [OrderItemInline]
+
+# Register OutboxMessage so stuck or dropped notifications can be inspected
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ("id", "group", "attempts", "available_at", "created_at")
+    readonly_fields = ("group", "payload", "created_at", "attempts", "last_error")
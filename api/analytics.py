@@ -0,0 +1,188 @@
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+from .models import Category, OrderItem, Product, SalesRollup
+
+# Daily sales rollups (see models.SalesRollup).
+# Orders are folded into the rollups in the transaction that places them or
+# changes their status, so dashboards read pre-aggregated rows instead of
+# scanning orders and items. Folding an order costs two queries whatever its
+# size: an INSERT creating the missing rows and one UPDATE adding its figures.
+# Days are local dates of Order.created_at; sales count towards the category a
+# product was in when the order was placed, kept on its items
+# (OrderItem.category), so moving a product later doesn't move its sales.
+
+REVENUE_FIELD = DecimalField(max_digits=14, decimal_places=2)
+# the category an item's sales are filed under
+LINE_CATEGORY = Coalesce("category_id", "product__category_id")
+BATCH_SIZE = 1000
+
+
+def order_day(order):
+    return timezone.localdate(order.created_at)
+
+
+# Rollup members touched by an order and what it adds to each:
+# {(dimension, key): [revenue, units]} from (product_id, category_id, quantity, price) lines
+def order_figures(lines):
+    figures = defaultdict(lambda: [Decimal("0"), 0])
+    for product_id, category_id, quantity, price in lines:
+        for member in (("total", 0), ("product", product_id), ("category", category_id)):
+            figures[member][0] += price * quantity
+            figures[member][1] += quantity
+    return figures
+
+
+# Rollup members touched by several orders, with the number of orders per
+# member: {(dimension, key): [revenue, units, orders]} from each order's lines
+def orders_figures(lines_by_order):
+    figures = defaultdict(lambda: [Decimal("0"), 0, 0])
+    for lines in lines_by_order:
+        for member, (revenue, units) in order_figures(lines).items():
+            figures[member][0] += revenue
+            figures[member][1] += units
+            figures[member][2] += 1
+    return figures
+
+
+# Add (sign=1) or remove (sign=-1) figures in a day's `status` rows: those of
+# one order (order_figures) or of several (orders_figures)
+def apply_order(day, status, figures, sign=1):
+    # orders without items touch no member; an empty Q() would update them all
+    if not figures:
+        return
+    SalesRollup.objects.bulk_create(
+        [SalesRollup(day=day, status=status, dimension=dimension, key=key) for dimension, key in figures],
+        ignore_conflicts=True,
+    )
+    members, revenue, units, orders = Q(), [], [], []
+    for (dimension, key), (member_revenue, member_units, *member_orders) in figures.items():
+        member = Q(dimension=dimension, key=key)
+        members |= member
+        revenue.append(When(member, then=Value(sign * member_revenue)))
+        units.append(When(member, then=Value(sign * member_units)))
+        orders.append(When(member, then=Value(sign * (member_orders[0] if member_orders else 1))))
+    SalesRollup.objects.filter(members, day=day, status=status).update(
+        revenue=F("revenue") + Case(*revenue, output_field=REVENUE_FIELD),
+        units=F("units") + Case(*units, output_field=IntegerField()),
+        orders=F("orders") + Case(*orders, output_field=IntegerField()),
+    )
+
+
+def _order_lines(order):
+    return OrderItem.objects.filter(order=order).values_list(
+        "product_id", LINE_CATEGORY, "quantity", "price_at_purchase"
+    )
+
+
+# Fold a newly placed order in; `lines` as for order_figures
+def record_order(order, lines):
+    apply_order(order_day(order), order.status, order_figures(lines))
+
+
+# Move an order's figures from its previous status to its current one
+def record_status_change(order, previous_status):
+    if previous_status == order.status:
+        return
+    figures = order_figures(_order_lines(order))
+    with transaction.atomic():
+        apply_order(order_day(order), previous_status, figures, sign=-1)
+        apply_order(order_day(order), order.status, figures)
+
+
+# Move several orders' figures to `status`, given as dicts with their "id",
+# "created_at" and previous "status"; costs one query for their lines and four
+# per (day, previous status) pair
+def record_status_changes(orders, status):
+    orders = [order for order in orders if order["status"] != status]
+    lines = defaultdict(list)
+    for order_id, *line in OrderItem.objects.filter(order_id__in=[order["id"] for order in orders]).values_list(
+        "order_id", "product_id", LINE_CATEGORY, "quantity", "price_at_purchase"
+    ):
+        lines[order_id].append(line)
+    moved = defaultdict(list)
+    for order in orders:
+        moved[(timezone.localdate(order["created_at"]), order["status"])].append(lines[order["id"]])
+    with transaction.atomic():
+        for (day, previous_status), order_lines in moved.items():
+            figures = orders_figures(order_lines)
+            apply_order(day, previous_status, figures, sign=-1)
+            apply_order(day, status, figures)
+
+
+# Take an order out of the rollups, before it is deleted
+def forget_order(order):
+    apply_order(order_day(order), order.status, order_figures(_order_lines(order)), sign=-1)
+
+
+# Recompute the rollups from orders and items, for all days or for the local
+# days from `start` to `end` (inclusive); returns the number of rows written
+def rebuild_rollups(start=None, end=None):
+    rollups = SalesRollup.objects.all()
+    items = OrderItem.objects.all()
+    if start is not None:
+        rollups = rollups.filter(day__gte=start)
+        items = items.filter(order__created_at__date__gte=start)
+    if end is not None:
+        rollups = rollups.filter(day__lte=end)
+        items = items.filter(order__created_at__date__lte=end)
+    items = items.annotate(day=TruncDate("order__created_at"), order_status=F("order__status")).order_by()
+    written = 0
+    with transaction.atomic():
+        rollups.delete()
+        for dimension, key in (("total", Value(0)), ("product", F("product_id")), ("category", LINE_CATEGORY)):
+            rows = items.annotate(member=key).values("day", "order_status", "member").annotate(
+                revenue=Sum(F("quantity") * F("price_at_purchase"), output_field=REVENUE_FIELD),
+                units=Sum("quantity"),
+                orders=Count("order_id", distinct=True),
+            )
+            batch = []
+            for row in rows.iterator(chunk_size=BATCH_SIZE):
+                batch.append(SalesRollup(
+                    day=row["day"], status=row["order_status"], dimension=dimension, key=row["member"],
+                    revenue=row["revenue"], units=row["units"], orders=row["orders"],
+                ))
+                if len(batch) >= BATCH_SIZE:
+                    written += len(SalesRollup.objects.bulk_create(batch))
+                    batch = []
+            written += len(SalesRollup.objects.bulk_create(batch))
+    return written
+
+
+# money as a string with two decimals, like the serializers' DecimalFields
+def _figures_dict(row):
+    return {"revenue": f"{row['revenue'] or Decimal('0'):.2f}", "units": row["units"] or 0, "orders": row["orders"] or 0}
+
+
+# Sales between two local dates (inclusive) from the rollups: store-wide
+# totals plus a row per day (every day of the range), or the top `limit`
+# products or categories by revenue
+def sales_report(start, end, group="day", status=None, limit=50):
+    rollups = SalesRollup.objects.filter(day__gte=start, day__lte=end)
+    if status:
+        rollups = rollups.filter(status=status)
+    sums = {"revenue": Sum("revenue"), "units": Sum("units"), "orders": Sum("orders")}
+    totals = rollups.filter(dimension="total").aggregate(**sums)
+    if group == "day":
+        by_day = {row["day"]: row for row in rollups.filter(dimension="total").values("day").annotate(**sums)}
+        empty = {"revenue": None, "units": 0, "orders": 0}
+        days = (start + timedelta(days=offset) for offset in range((end - start).days + 1))
+        results = [{"day": day, **_figures_dict(by_day.get(day, empty))} for day in days]
+    else:
+        rows = list(
+            rollups.filter(dimension=group).values("key").annotate(**sums).order_by("-revenue", "key")[:limit]
+        )
+        model = Product if group == "product" else Category
+        names = dict(model.objects.filter(pk__in=[row["key"] for row in rows]).values_list("pk", "name"))
+        results = [
+            {f"{group}_id": row["key"], "name": names.get(row["key"]), **_figures_dict(row)}
+            for row in rows
+        ]
+    return {
+        "start": start, "end": end, "group": group, "status": status,
+        "totals": _figures_dict(totals), "results": results,
+    }
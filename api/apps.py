@@ -7,3 +7,5 @@ class ApiConfig(AppConfig):
 
     def ready(self):
         import api.signals
+        from api import metrics
+        metrics.install()
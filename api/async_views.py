@@ -0,0 +1,114 @@
+from django.http import HttpResponse
+from django.views import View
+from rest_framework.exceptions import APIException, NotFound
+from rest_framework.request import Request
+from .models import Category, Product
+from .renderers import ORJSONRenderer
+from .serializers import CategorySerializer, summary_requested
+from .fast_serializers import product_rows, product_values
+from .pagination import OptionalKeysetPaginationMixin, StandardResultsSetPagination
+from .conditional import evaluate_preconditions, set_validators, validators
+from .cache import (
+    async_cache, aget_versions, acategory_list_key, category_list_namespaces, aproduct_list_key, product_list_namespaces,
+    product_namespaces, product_list_stale_key, render_cache_entry, cached_json_response, aget_or_regenerate,
+)
+from .views import CACHE_TIMEOUT, ProductViewSet, product_list_cache_parts
+
+# Native async read endpoints.
+# Under ASGI these run on the event loop instead of a sync_to_async worker, so
+# cache hits (the common case) never wait for a thread. They share filters,
+# pagination, cache entries, invalidation and conditional GET support with the
+# sync viewsets in api.views and are read-only and public, like the sync
+# list/retrieve actions.
+
+
+# Base view: GET only, JSON out, DRF exceptions turned into error responses
+class AsyncAPIView(View):
+    http_method_names = ["get", "head"]
+
+    async def get(self, request, *args, **kwargs):
+        # DRF's Request gives filter backends and paginators `query_params`
+        self.request = Request(request)
+        try:
+            return await self.read(self.request, *args, **kwargs)
+        except APIException as exc:
+            # same body shape as DRF's exception handler
+            detail = exc.detail if isinstance(exc.detail, (list, dict)) else {"detail": exc.detail}
+            return self.render(detail, status=exc.status_code)
+
+    async def read(self, request, *args, **kwargs):
+        raise NotImplementedError
+
+    @staticmethod
+    def render(data, status=200):
+        return HttpResponse(ORJSONRenderer().render(data), content_type="application/json", status=status)
+
+
+# GET /api/async/categories/
+class AsyncCategoryListView(AsyncAPIView):
+
+    async def read(self, request):
+        summary = summary_requested(request)
+        versions = await aget_versions(*category_list_namespaces(summary))
+        list_validators = validators(versions, "categories", summary)
+        not_modified = evaluate_preconditions(request, *list_validators)
+        if not_modified is not None:
+            return not_modified
+        key = await acategory_list_key(versions, summary)
+        data = await async_cache.get(key)
+        if data is None:
+            categories = [category async for category in Category.objects.all()]
+            data = CategorySerializer(categories, many=True, context={"request": request}).data
+            await async_cache.set(key, data, CACHE_TIMEOUT)
+        return set_validators(self.render(data), *list_validators)
+
+
+# GET /api/async/products/ with the same query parameters as /api/products/
+class AsyncProductListView(OptionalKeysetPaginationMixin, AsyncAPIView):
+    queryset = Product.objects.select_related("category").all()
+    pagination_class = StandardResultsSetPagination
+    filter_backends = ProductViewSet.filter_backends
+    filterset_class = ProductViewSet.filterset_class
+    ordering_fields = ProductViewSet.ordering_fields
+
+    async def read(self, request):
+        location, query, category_id = product_list_cache_parts(request, self.paginator)
+        versions = await aget_versions(*product_list_namespaces(category_id))
+        self.page_validators = validators(versions, location, query)
+        not_modified = evaluate_preconditions(request, *self.page_validators)
+        if not_modified is not None:
+            return not_modified
+        entry = await aget_or_regenerate(
+            await aproduct_list_key(location, query, category_id, versions),
+            self.render_page,
+            CACHE_TIMEOUT,
+            stale_key=product_list_stale_key(location, query),
+        )
+        return cached_json_response(request, entry)
+
+    async def render_page(self):
+        queryset = product_values(self.filter_queryset(self.queryset.all()))
+        page = await self.paginator.apaginate_queryset(queryset, self.request, view=self)
+        data = self.paginator.get_paginated_response(product_rows(page)).data
+        return render_cache_entry(data, self.page_validators)
+
+    # building the queryset runs no SQL, so the sync filter backends are safe here
+    def filter_queryset(self, queryset):
+        for backend in self.filter_backends:
+            queryset = backend().filter_queryset(self.request, queryset, self)
+        return queryset
+
+
+# GET /api/async/products/<pk>/
+class AsyncProductDetailView(AsyncAPIView):
+
+    async def read(self, request, pk):
+        product_validators = validators(await aget_versions(*product_namespaces(pk)), "product", pk)
+        not_modified = evaluate_preconditions(request, *product_validators)
+        if not_modified is not None:
+            return not_modified
+        try:
+            row = await product_values(Product.objects.all()).aget(pk=pk)
+        except Product.DoesNotExist:
+            raise NotFound("No Product matches the given query.")
+        return set_validators(self.render(product_rows([row])[0]), *product_validators)
@@ -0,0 +1,66 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+from .cache import auth_user_key
+
+User = get_user_model()
+
+# JWT authentication without a user lookup per request.
+# Users are cached under a versioned key for a few minutes; saving or deleting
+# a user (deactivation, password or permission changes) bumps the version (see
+# signals). The password hash is not cached: it is loaded on first access.
+# With JWT_STATELESS_READS, safe-method requests to views with
+# `stateless_reads = True` get a TokenUser built from the token claims alone.
+
+USER_CACHE_TIMEOUT = getattr(settings, "AUTH_USER_CACHE_TIMEOUT", 300)
+STATELESS_READS = getattr(settings, "JWT_STATELESS_READS", False)
+CACHED_FIELDS = tuple(field.attname for field in User._meta.concrete_fields if field.attname != "password")
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+
+    def authenticate(self, request):
+        view = (request.parser_context or {}).get("view")
+        self.stateless = (
+            STATELESS_READS and request.method in SAFE_METHODS and getattr(view, "stateless_reads", False)
+        )
+        return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        if self.stateless:
+            if api_settings.USER_ID_CLAIM not in validated_token:
+                raise InvalidToken(_("Token contained no recognizable user identification"))
+            return api_settings.TOKEN_USER_CLASS(validated_token)
+        try:
+            key = auth_user_key(validated_token[api_settings.USER_ID_CLAIM])
+        except KeyError:
+            return super().get_user(validated_token)
+        entry = cache.get(key)
+        if entry is None:
+            # looks the user up and checks it may authenticate
+            user = super().get_user(validated_token)
+            cache.set(key, cached_user_entry(user), USER_CACHE_TIMEOUT)
+            return user
+        values, password_claim = entry
+        user = User.from_db(DEFAULT_DB_ALIAS, CACHED_FIELDS, values)
+        # the checks JWTAuthentication.get_user makes, against the cached entry
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != password_claim:
+            raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        return user
+
+
+# (field values, revoke claim) kept for a user; the claim is only computed when
+# SimpleJWT's CHECK_REVOKE_TOKEN is on
+def cached_user_entry(user):
+    password_claim = get_md5_hash_password(user.password) if api_settings.CHECK_REVOKE_TOKEN else None
+    return tuple(getattr(user, name) for name in CACHED_FIELDS), password_claim
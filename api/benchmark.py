@@ -0,0 +1,186 @@
+import math
+import statistics
+import threading
+import time
+from urllib.parse import urlsplit
+from asgiref.testing import ApplicationCommunicator
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import RefreshToken
+from .cache import bump, PRODUCTS_NS, CATEGORIES_NS
+from .models import Product
+
+# Endpoint benchmarks (manage.py bench_endpoints) and query budgets
+# (api/tests/test_query_budgets.py) share the list of read endpoints below and
+# go through the whole Django stack in-process: middleware, authentication,
+# routing, caching and rendering.
+
+# Read endpoints of api.urls outside the router, with the model their detail
+# route needs a sample of
+OTHER_ENDPOINTS = (
+    ("async-categories-list", None),
+    ("async-products-list", None),
+    ("async-products-detail", Product),
+    ("analytics-sales", None),
+    ("metrics", None),
+    ("metrics-slow-requests", None),
+)
+
+
+def _sample_pk(model):
+    return model.objects.order_by("pk").values_list("pk", flat=True).first()
+
+
+# The model a router viewset serves; None for plain ViewSets (e.g. the cart)
+def _viewset_model(viewset):
+    if getattr(viewset, "queryset", None) is not None:
+        return viewset.queryset.model
+    serializer_class = getattr(viewset, "serializer_class", None)
+    return serializer_class.Meta.model if serializer_class is not None else None
+
+
+# (name, path) of a GET request for every route of the API router (list,
+# detail and extra GET actions) and for the other read endpoints; detail
+# routes use the first row of their model and are left out if there is none
+def read_endpoints():
+    from .urls import router
+    endpoints = []
+    for _, viewset, basename in router.registry:
+        pk = _sample_pk(model) if (model := _viewset_model(viewset)) is not None else None
+        endpoints.append((f"{basename}-list", reverse(f"{basename}-list")))
+        if pk is not None and hasattr(viewset, "retrieve"):
+            endpoints.append((f"{basename}-detail", reverse(f"{basename}-detail", args=[pk])))
+        for action in viewset.get_extra_actions():
+            # routes with their own URL parameters (e.g. checkout tickets) need a value
+            if "get" not in action.mapping or "(?P<" in action.url_path:
+                continue
+            name = f"{basename}-{action.url_name}"
+            if not action.detail:
+                endpoints.append((name, reverse(name)))
+            elif pk is not None:
+                endpoints.append((name, reverse(name, args=[pk])))
+    for name, model in OTHER_ENDPOINTS:
+        if model is None:
+            endpoints.append((name, reverse(name)))
+        elif _sample_pk(model) is not None:
+            endpoints.append((name, reverse(name, args=[_sample_pk(model)])))
+    return endpoints
+
+
+# Request headers authenticating as `user` with a JWT access token
+def auth_headers(user):
+    return {"HTTP_AUTHORIZATION": f"Bearer {RefreshToken.for_user(user).access_token}"}
+
+
+# Drop every cached page, so the next requests measure the database path
+def invalidate_caches():
+    bump(PRODUCTS_NS, CATEGORIES_NS)
+
+
+def get(client, path, headers):
+    response = client.get(path, **headers)
+    if response.streaming:
+        # exports stream their body; the request isn't done until it is read
+        b"".join(response.streaming_content)
+    return response
+
+
+# Status and SQL statements of one request
+def count_queries(client, path, headers):
+    with CaptureQueriesContext(connection) as queries:
+        response = get(client, path, headers)
+    return response.status_code, len(queries)
+
+
+def percentile(timings, p):
+    return timings[max(math.ceil(len(timings) * p / 100) - 1, 0)]
+
+
+# Latency percentiles (ms) and throughput of `requests` GETs of `path`, issued
+# by `concurrency` threads with their own client and database connection.
+# With `cold`, cached pages are invalidated before every request
+def measure(path, headers, requests=200, concurrency=1, warmup=5, cold=False, host="localhost"):
+    client = Client(raise_request_exception=False, HTTP_HOST=host)
+    for _ in range(warmup):
+        get(client, path, headers)
+    if cold:
+        invalidate_caches()
+    status, queries = count_queries(client, path, headers)
+    timings, errors = [], [0]
+    lock = threading.Lock()
+    remaining = iter(range(requests))
+
+    def worker(own_connection):
+        worker_client = Client(raise_request_exception=False, HTTP_HOST=host)
+        try:
+            for _ in remaining:
+                if cold:
+                    invalidate_caches()
+                started = time.perf_counter()
+                response = get(worker_client, path, headers)
+                elapsed = (time.perf_counter() - started) * 1000
+                with lock:
+                    timings.append(elapsed)
+                    errors[0] += response.status_code >= 400
+        finally:
+            if own_connection:
+                connection.close()
+
+    started = time.perf_counter()
+    if concurrency == 1:
+        worker(False)
+    else:
+        threads = [threading.Thread(target=worker, args=(True,)) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    wall = time.perf_counter() - started
+    timings.sort()
+    return {
+        "path": path,
+        "status": status,
+        "queries": queries,
+        "requests": len(timings),
+        "errors": errors[0],
+        "rps": round(len(timings) / wall, 1),
+        "mean_ms": round(statistics.fmean(timings), 3),
+        "p50_ms": round(percentile(timings, 50), 3),
+        "p95_ms": round(percentile(timings, 95), 3),
+        "p99_ms": round(percentile(timings, 99), 3),
+    }
+
+
+# In-process WebSocket client for an ASGI application, for load tests (see
+# manage.py bench_ws); the same handshake and frames as channels' test
+# communicator, without its live-server dependencies
+class WebSocketClient(ApplicationCommunicator):
+
+    def __init__(self, application, path, headers=None):
+        url = urlsplit(path)
+        super().__init__(application, {
+            "type": "websocket", "path": url.path, "query_string": url.query.encode(),
+            "headers": headers or [], "subprotocols": [],
+        })
+
+    # (True, None) once accepted, (False, close code) if refused
+    async def connect(self, timeout=1):
+        await self.send_input({"type": "websocket.connect"})
+        response = await self.receive_output(timeout)
+        if response["type"] == "websocket.close":
+            return False, response.get("code", 1000)
+        return True, None
+
+    async def send_text(self, text):
+        await self.send_input({"type": "websocket.receive", "text": text})
+
+    # The next frame's text; a close event is returned as is
+    async def receive(self, timeout=1):
+        response = await self.receive_output(timeout)
+        return response.get("text") if response["type"] == "websocket.send" else response
+
+    async def disconnect(self, code=1000, timeout=1):
+        await self.send_input({"type": "websocket.disconnect", "code": code})
+        await self.wait(timeout)
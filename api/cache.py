@@ -0,0 +1,421 @@
+import asyncio
+import gzip
+import math
+import random
+import time
+import uuid
+import weakref
+from urllib.parse import urlencode
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from .conditional import set_validators
+from .metrics import cache_operation
+from .renderers import ORJSONRenderer
+
+# Versioned cache namespaces.
+# Instead of flushing the whole cache, every cached entry embeds the generation
+# counters of the data it was built from. Bumping a counter makes the old entries
+# unreachable; they simply age out with their own timeout.
+
+VERSION_KEY_PREFIX = "ver"
+PRODUCTS_NS = "products"
+CATEGORIES_NS = "categories"
+
+
+def category_products_ns(category_id):
+    return f"products:category:{category_id}"
+
+
+def product_ns(product_id):
+    return f"product:{product_id}"
+
+
+def user_ns(user_id):
+    return f"user:{user_id}"
+
+
+def _version_key(namespace):
+    return f"{VERSION_KEY_PREFIX}:{namespace}"
+
+
+def _new_version():
+    # generations only need to differ from every earlier value of the same
+    # namespace, so the clock works across processes and after evictions
+    return time.time_ns()
+
+
+# Return the current generation of each namespace, in order
+def get_versions(*namespaces):
+    keys = [_version_key(ns) for ns in namespaces]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, _new_version(), None)
+            found[key] = cache.get(key)
+    return tuple(found[key] for key in keys)
+
+
+async def aget_versions(*namespaces):
+    keys = [_version_key(ns) for ns in namespaces]
+    found = await async_cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            await async_cache.add(key, _new_version(), None)
+            found[key] = await async_cache.get(key)
+    return tuple(found[key] for key in keys)
+
+
+# Bump namespaces right away, in a single round trip; prefer bump_on_commit
+# inside write paths
+def bump(*namespaces):
+    version = _new_version()
+    cache.set_many({_version_key(ns): version for ns in set(namespaces)}, None)
+
+
+# Bump now, so stale pages stop being served, and again once the surrounding
+# transaction commits, so pages re-cached from pre-commit rows are dropped too
+def bump_on_commit(*namespaces):
+    namespaces = set(namespaces)
+    if namespaces:
+        bump(*namespaces)
+        if transaction.get_connection().in_atomic_block:
+            transaction.on_commit(lambda: bump(*namespaces))
+
+
+# Invalidate cached pages for products given as (product_id, category_id) pairs
+def invalidate_products(products):
+    namespaces = {PRODUCTS_NS}
+    for product_id, category_id in products:
+        namespaces.add(product_ns(product_id))
+        if category_id is not None:
+            namespaces.add(category_products_ns(category_id))
+    bump_on_commit(*namespaces)
+
+
+# Invalidate the category list and the product pages of one category
+def invalidate_category(category_id):
+    bump_on_commit(CATEGORIES_NS, category_products_ns(category_id))
+
+
+# Invalidate a user's cached authentication entry
+def invalidate_user(user_id):
+    bump_on_commit(user_ns(user_id))
+
+
+# Versioned key for a user's authentication entry (see api.authentication)
+def auth_user_key(user_id):
+    return f"auth_user:{user_id}:{get_versions(user_ns(user_id))[0]}"
+
+
+# Versioned key for the category list; pass `versions` (of
+# category_list_namespaces(summary)) if they were already fetched, e.g. for
+# HTTP validators. Lists with summaries also go stale with product changes
+def category_list_key(versions=None, summary=False):
+    return _category_list_key(versions or get_versions(*category_list_namespaces(summary)), summary)
+
+
+async def acategory_list_key(versions=None, summary=False):
+    return _category_list_key(versions or await aget_versions(*category_list_namespaces(summary)), summary)
+
+
+def category_list_namespaces(summary=False):
+    return (CATEGORIES_NS, PRODUCTS_NS) if summary else (CATEGORIES_NS,)
+
+
+def _category_list_key(versions, summary):
+    if summary:
+        return f"categories_list:summary:{'.'.join(str(v) for v in versions)}"
+    return f"categories_list:{versions[0]}"
+
+
+# Canonical form of a query string: sorted params, empty values and values
+# equal to their defaults dropped, so equivalent requests share one entry
+def normalize_query(query_params, defaults=None):
+    defaults = defaults or {}
+    items = []
+    for name in sorted(query_params):
+        for value in sorted(query_params.getlist(name)):
+            if value == "" or defaults.get(name) == value:
+                continue
+            items.append((name, value))
+    return urlencode(items)
+
+
+# Versioned key for a product list page.
+# Lists narrowed to one category only depend on that category's generation, so
+# orders and edits elsewhere in the catalogue leave them cached. Unfiltered
+# lists depend on every product and on the nested category data.
+# `location` should identify the absolute URL up to the query string, since
+# the cached body embeds absolute next/previous links.
+# `versions` are those of product_list_namespaces(category_id), if already fetched.
+def product_list_key(location, query="", category_id=None, versions=None):
+    versions = versions or get_versions(*product_list_namespaces(category_id))
+    return _product_list_key(versions, location, query)
+
+
+async def aproduct_list_key(location, query="", category_id=None, versions=None):
+    versions = versions or await aget_versions(*product_list_namespaces(category_id))
+    return _product_list_key(versions, location, query)
+
+
+def product_list_namespaces(category_id=None):
+    if category_id is not None:
+        return (category_products_ns(category_id),)
+    return (PRODUCTS_NS, CATEGORIES_NS)
+
+
+def _product_list_key(versions, location, query):
+    return f"products_list:{'.'.join(str(v) for v in versions)}:{location}?{query}"
+
+
+# Namespaces a single product's representation depends on (it nests its category)
+def product_namespaces(product_id):
+    return (product_ns(product_id), CATEGORIES_NS)
+
+
+# Last rendered copy of a product list page, whatever its generation; served
+# while the current generation is being regenerated (see get_or_regenerate)
+def product_list_stale_key(location, query=""):
+    return f"products_list:stale:{location}?{query}"
+
+
+# Pre-render a response payload so cache hits skip serialization entirely.
+# `validators` (see api.conditional) are kept with the body, so a stale copy
+# served during regeneration carries its own ETag, not the current one
+def render_cache_entry(data, validators=None):
+    body = ORJSONRenderer().render(data)
+    compressed = None
+    if getattr(settings, "API_CACHE_COMPRESS", False) and len(body) >= getattr(settings, "API_CACHE_COMPRESS_MIN_BYTES", 0):
+        compressed = gzip.compress(body, compresslevel=6)
+    return {"body": body, "gzip": compressed, "validators": validators}
+
+
+# Build a response straight from a pre-rendered cache entry
+def cached_json_response(request, entry):
+    accepts_gzip = "gzip" in request.META.get("HTTP_ACCEPT_ENCODING", "")
+    if entry.get("gzip") is not None and accepts_gzip:
+        response = HttpResponse(entry["gzip"], content_type="application/json")
+        response["Content-Encoding"] = "gzip"
+    else:
+        response = HttpResponse(entry["body"], content_type="application/json")
+    patch_vary_headers(response, ("Accept", "Accept-Encoding"))
+    if entry.get("validators"):
+        set_validators(response, *entry["validators"])
+    return response
+
+
+# Single-flight regeneration.
+# On a miss only the request that takes the per-key lock recomputes the value;
+# the others get the stale copy if there is one, or wait for the winner.
+# Entries also record how long they took to compute, so hot keys are refreshed
+# a little before they expire (probabilistic early expiration, "XFetch"):
+# the closer the expiry and the costlier the value, the likelier a request
+# volunteers to refresh it, while everyone else keeps being served.
+
+LOCK_TIMEOUT = getattr(settings, "CACHE_REGENERATE_LOCK_TIMEOUT", 30)
+LOCK_WAIT = getattr(settings, "CACHE_REGENERATE_WAIT", 5)
+LOCK_POLL_INTERVAL = 0.05
+XFETCH_BETA = getattr(settings, "CACHE_XFETCH_BETA", 1.0)
+
+
+def _lock_key(key):
+    return f"lock:{key}"
+
+
+def _wrap(value, delta, timeout):
+    return {"value": value, "delta": delta, "expires": time.time() + timeout}
+
+
+def _refresh_early(wrapped, beta=XFETCH_BETA):
+    # 1 - random() is in (0, 1], so the log is defined and <= 0
+    return time.time() - wrapped["delta"] * beta * math.log(1 - random.random()) >= wrapped["expires"]
+
+
+def _regenerate(key, regenerate, timeout, stale_key):
+    started = time.monotonic()
+    value = regenerate()
+    entries = {key: _wrap(value, time.monotonic() - started, timeout)}
+    if stale_key is not None:
+        entries[stale_key] = value
+    cache.set_many(entries, timeout)
+    return value
+
+
+# Cached value of `key`, computed by `regenerate()` at most once at a time
+# across all workers
+def get_or_regenerate(key, regenerate, timeout, stale_key=None):
+    wrapped = cache.get(key)
+    if wrapped is not None and not _refresh_early(wrapped):
+        return wrapped["value"]
+    lock_key, token = _lock_key(key), uuid.uuid4().hex
+    if cache.add(lock_key, token, LOCK_TIMEOUT):
+        try:
+            return _regenerate(key, regenerate, timeout, stale_key)
+        finally:
+            if cache.get(lock_key) == token:
+                cache.delete(lock_key)
+    # someone else is regenerating: serve what we have, or wait for them
+    if wrapped is not None:
+        return wrapped["value"]
+    stale = cache.get(stale_key) if stale_key is not None else None
+    if stale is not None:
+        return stale
+    deadline = time.monotonic() + LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        wrapped = cache.get(key)
+        if wrapped is not None:
+            return wrapped["value"]
+        if cache.get(lock_key) is None:
+            break
+    # the lock holder failed or is too slow
+    return _regenerate(key, regenerate, timeout, stale_key)
+
+
+# Async counterpart of get_or_regenerate; `regenerate` is a coroutine function
+async def aget_or_regenerate(key, regenerate, timeout, stale_key=None):
+    wrapped = await async_cache.get(key)
+    if wrapped is not None and not _refresh_early(wrapped):
+        return wrapped["value"]
+    lock_key, token = _lock_key(key), uuid.uuid4().hex
+    if await async_cache.add(lock_key, token, LOCK_TIMEOUT):
+        try:
+            return await _aregenerate(key, regenerate, timeout, stale_key)
+        finally:
+            if await async_cache.get(lock_key) == token:
+                await async_cache.delete(lock_key)
+    if wrapped is not None:
+        return wrapped["value"]
+    stale = await async_cache.get(stale_key) if stale_key is not None else None
+    if stale is not None:
+        return stale
+    deadline = time.monotonic() + LOCK_WAIT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(LOCK_POLL_INTERVAL)
+        wrapped = await async_cache.get(key)
+        if wrapped is not None:
+            return wrapped["value"]
+        if await async_cache.get(lock_key) is None:
+            break
+    return await _aregenerate(key, regenerate, timeout, stale_key)
+
+
+async def _aregenerate(key, regenerate, timeout, stale_key):
+    started = time.monotonic()
+    value = await regenerate()
+    await async_cache.set(key, _wrap(value, time.monotonic() - started, timeout), timeout)
+    if stale_key is not None:
+        await async_cache.set(stale_key, value, timeout)
+    return value
+
+
+# Native async access to the default cache for async views.
+# With django_redis it talks to Redis through redis.asyncio, reusing the
+# backend's key function and serializer so entries are shared with the sync
+# views. Other backends fall back to Django's own async cache methods.
+class AsyncCache:
+
+    def __init__(self, alias="default"):
+        self.alias = alias
+        self._clients = weakref.WeakKeyDictionary()
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    def _redis(self):
+        client = getattr(self.backend, "client", None)
+        if client is None or not hasattr(client, "encode"):
+            return None, None
+        # redis.asyncio connections are bound to the event loop that opened them
+        loop = asyncio.get_running_loop()
+        connection = self._clients.get(loop)
+        if connection is None:
+            from redis.asyncio import Redis
+            location = settings.CACHES[self.alias]["LOCATION"]
+            connection = Redis.from_url(location[0] if isinstance(location, (list, tuple)) else location)
+            self._clients[loop] = connection
+        return connection, client
+
+    @cache_operation("get")
+    async def get(self, key, default=None):
+        redis, client = self._redis()
+        if redis is None:
+            return await self.backend.aget(key, default)
+        hit, value, generation = self._local_get(key)
+        if hit:
+            return value
+        value = await redis.get(client.make_key(key))
+        if value is None:
+            return default
+        value = client.decode(value)
+        self._local_set(key, value, generation)
+        return value
+
+    @cache_operation("get_many")
+    async def get_many(self, keys):
+        redis, client = self._redis()
+        if redis is None:
+            return await self.backend.aget_many(keys)
+        found, remote, generation = {}, [], None
+        for key in keys:
+            hit, value, key_generation = self._local_get(key)
+            if hit:
+                found[key] = value
+            else:
+                remote.append(key)
+                generation = key_generation if generation is None else generation
+        if remote:
+            values = await redis.mget([client.make_key(key) for key in remote])
+            for key, value in zip(remote, values):
+                if value is not None:
+                    found[key] = client.decode(value)
+                    self._local_set(key, found[key], generation)
+        return found
+
+    @cache_operation("set")
+    async def set(self, key, value, timeout):
+        redis, client = self._redis()
+        if redis is None:
+            return await self.backend.aset(key, value, timeout)
+        await redis.set(client.make_key(key), client.encode(value), ex=timeout)
+        await self._invalidate(redis, key)
+
+    @cache_operation("add")
+    async def add(self, key, value, timeout):
+        redis, client = self._redis()
+        if redis is None:
+            return await self.backend.aadd(key, value, timeout)
+        added = bool(await redis.set(client.make_key(key), client.encode(value), ex=timeout, nx=True))
+        if added:
+            await self._invalidate(redis, key)
+        return added
+
+    @cache_operation("delete")
+    async def delete(self, key):
+        redis, client = self._redis()
+        if redis is None:
+            return await self.backend.adelete(key)
+        await redis.delete(client.make_key(key))
+        await self._invalidate(redis, key)
+
+    # Hooks into the local tier of api.cache_backends.TwoTierRedisCache, if used
+    def _local_get(self, key):
+        local_get = getattr(self.backend, "local_get", None)
+        return local_get(key) if local_get else (False, None, None)
+
+    def _local_set(self, key, value, generation):
+        if generation is not None:
+            self.backend.local_set(key, value, generation)
+
+    async def _invalidate(self, redis, key):
+        local_invalidation = getattr(self.backend, "local_invalidation", None)
+        message = local_invalidation([key]) if local_invalidation else None
+        if message is not None:
+            await redis.publish(self.backend.channel, message)
+
+
+async_cache = AsyncCache()
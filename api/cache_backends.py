@@ -0,0 +1,345 @@
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django_redis.cache import RedisCache
+from .metrics import cache_operation
+
+logger = logging.getLogger(__name__)
+
+# Two-tier cache: a bounded in-process LRU in front of django_redis.
+# Reads are served from the local tier when possible and fall back to Redis;
+# every write to a locally cacheable key is published on a Redis channel so all
+# workers drop their copy. Local entries never outlive LOCAL_TIMEOUT, which
+# bounds staleness if an invalidation message is ever lost, and the local tier
+# is only used while the invalidation subscription is up.
+#
+# OPTIONS (besides django_redis' own):
+#   LOCAL_MAX_ENTRIES      entries kept per worker (default 1000)
+#   LOCAL_MAX_BYTES        pickled bytes kept per worker (default 16 MiB)
+#   LOCAL_TIMEOUT          seconds an entry may live locally (default 30)
+#   LOCAL_KEY_PREFIXES     only keys starting with one of these are kept locally
+#                          (default: all keys)
+#   INVALIDATION_CHANNEL   pub/sub channel (default "cache-invalidate:<LOCATION>")
+
+LOCAL_OPTIONS = ("LOCAL_MAX_ENTRIES", "LOCAL_MAX_BYTES", "LOCAL_TIMEOUT", "LOCAL_KEY_PREFIXES", "INVALIDATION_CHANNEL")
+
+# Django creates a cache backend instance per thread; the local tier is shared
+# by all of them, so memory is capped per worker process
+_tiers = {}
+_tiers_lock = threading.Lock()
+
+
+# Thread-safe LRU of pickled values with per-entry expiry and entry/byte caps
+class LocalLRU:
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    # (True, value) on a hit, (False, None) on a miss or an expired entry
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return False, None
+            expires_at, payload = entry
+            if expires_at <= time.monotonic():
+                self._pop(key)
+                return False, None
+            self._data.move_to_end(key)
+        return True, pickle.loads(payload)
+
+    def set(self, key, value, timeout):
+        payload = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(payload) > self.max_bytes:
+            return
+        with self._lock:
+            self._pop(key)
+            self._data[key] = (time.monotonic() + timeout, payload)
+            self.bytes += len(payload)
+            while len(self._data) > self.max_entries or self.bytes > self.max_bytes:
+                self._pop(next(iter(self._data)))
+
+    def delete(self, keys):
+        with self._lock:
+            for key in keys:
+                self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def _pop(self, key):
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self.bytes -= len(entry[1])
+
+
+# Process-wide local tier: the LRU, per-tier counters and the invalidation subscriber
+class LocalTier:
+
+    def __init__(self, channel, max_entries, max_bytes, timeout):
+        self.channel = channel
+        self.lru = LocalLRU(max_entries, max_bytes)
+        self.timeout = timeout
+        self.node = uuid.uuid4().hex
+        self.counters = {"local_hits": 0, "local_misses": 0, "redis_hits": 0, "redis_misses": 0}
+        # bumped on every local invalidation, so a value read from Redis is only
+        # kept if no invalidation arrived while it was being fetched
+        self.generation = 0
+        self._lock = threading.Lock()
+        self._listener_pid = None
+        self._listening = threading.Event()
+
+    # counted from request threads and the subscriber thread alike
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+        return {**counters, "local_entries": len(self.lru), "local_bytes": self.lru.bytes}
+
+    def reset_stats(self):
+        with self._lock:
+            for name in self.counters:
+                self.counters[name] = 0
+
+    def get(self, local_key):
+        return self.lru.get(local_key)
+
+    def store(self, local_key, value, generation):
+        with self._lock:
+            if generation == self.generation:
+                self.lru.set(local_key, value, self.timeout)
+
+    def drop(self, local_keys):
+        with self._lock:
+            self.generation += 1
+            self.lru.delete(local_keys)
+
+    def drop_all(self):
+        with self._lock:
+            self.generation += 1
+            self.lru.clear()
+
+    # Usable once this process is subscribed to invalidations; the subscriber
+    # thread is started lazily, and again in a forked child
+    def ready(self, connect):
+        if self._listener_pid != os.getpid():
+            with self._lock:
+                if self._listener_pid != os.getpid():
+                    self._listener_pid = os.getpid()
+                    self._listening = threading.Event()
+                    self.lru.clear()
+                    threading.Thread(target=self._listen, args=(connect,), name="cache-invalidation", daemon=True).start()
+        return self._listening.is_set()
+
+    def _listen(self, connect):
+        while True:
+            try:
+                pubsub = connect().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                # copies cached before (re)subscribing may have missed messages
+                self.drop_all()
+                self._listening.set()
+                for message in pubsub.listen():
+                    self.on_message(message["data"])
+            except Exception:
+                logger.warning("Cache invalidation subscription lost; local tier disabled until it is back", exc_info=True)
+            finally:
+                self._listening.clear()
+                self.drop_all()
+            time.sleep(1)
+
+    def on_message(self, data):
+        try:
+            message = json.loads(data)
+        except (TypeError, ValueError):
+            return
+        if message.get("node") == self.node:
+            return
+        if message.get("all"):
+            self.drop_all()
+        else:
+            self.drop(message.get("keys", []))
+
+
+class TwoTierRedisCache(RedisCache):
+
+    def __init__(self, server, params):
+        options = dict(params.get("OPTIONS", {}))
+        local = {name: options.pop(name) for name in LOCAL_OPTIONS if name in options}
+        super().__init__(server, {**params, "OPTIONS": options})
+        self.local_key_prefixes = tuple(local.get("LOCAL_KEY_PREFIXES", ()))
+        channel = local.get("INVALIDATION_CHANNEL", f"cache-invalidate:{server}")
+        with _tiers_lock:
+            self.tier = _tiers.get(channel)
+            if self.tier is None:
+                self.tier = _tiers[channel] = LocalTier(
+                    channel,
+                    local.get("LOCAL_MAX_ENTRIES", 1000),
+                    local.get("LOCAL_MAX_BYTES", 16 * 1024 * 1024),
+                    local.get("LOCAL_TIMEOUT", 30),
+                )
+
+    # Hit/miss counters per tier plus the local tier's size
+    def stats(self):
+        return self.tier.stats()
+
+    def reset_stats(self):
+        self.tier.reset_stats()
+
+    @cache_operation("get")
+    def get(self, key, default=None, version=None, client=None):
+        hit, value, generation = self.local_get(key, version)
+        if hit:
+            return value
+        if generation is None:
+            return super().get(key, default, version, client)
+        missing = object()
+        value = super().get(key, missing, version, client)
+        if value is missing:
+            self.tier.count("redis_misses")
+            return default
+        self.tier.count("redis_hits")
+        self.local_set(key, value, generation, version)
+        return value
+
+    @cache_operation("get_many")
+    def get_many(self, keys, version=None, client=None):
+        found, remote = {}, []
+        generation = None
+        for key in keys:
+            hit, value, key_generation = self.local_get(key, version)
+            if hit:
+                found[key] = value
+            else:
+                remote.append(key)
+                generation = key_generation if generation is None else generation
+        if remote:
+            fetched = super().get_many(remote, version=version, client=client)
+            self.tier.count("redis_hits", len(fetched))
+            self.tier.count("redis_misses", len(remote) - len(fetched))
+            if generation is not None:
+                for key, value in fetched.items():
+                    self.local_set(key, value, generation, version)
+            found.update(fetched)
+        return found
+
+    # Local tier lookup: (hit, value, generation). `generation` is None when the
+    # key is not kept locally; otherwise pass it to local_set() with the value
+    # read from Redis, so values raced by an invalidation are not kept
+    def local_get(self, key, version=None):
+        if not self._is_local(key) or not self._local_ready():
+            return False, None, None
+        generation = self.tier.generation
+        hit, value = self.tier.get(self.make_key(key, version))
+        self.tier.count("local_hits" if hit else "local_misses")
+        return hit, value, generation
+
+    def local_set(self, key, value, generation, version=None):
+        if self._is_local(key):
+            self.tier.store(self.make_key(key, version), value, generation)
+
+    # Drop `keys` locally and return the message announcing it to other workers
+    # (None if none of them is kept locally); callers publish it on `channel`
+    def local_invalidation(self, keys, version=None):
+        local_keys = [self.make_key(key, version) for key in keys if self._is_local(key)]
+        if not local_keys:
+            return None
+        self.tier.drop(local_keys)
+        return json.dumps({"node": self.tier.node, "keys": local_keys})
+
+    @property
+    def channel(self):
+        return self.tier.channel
+
+    @cache_operation("set")
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None, client=None, **kwargs):
+        result = super().set(key, value, timeout, version, client, **kwargs)
+        self._invalidate([key], version)
+        return result
+
+    @cache_operation("set_many")
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None, client=None):
+        result = super().set_many(data, timeout, version, client)
+        self._invalidate(list(data), version)
+        return result
+
+    @cache_operation("add")
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None, client=None):
+        added = super().add(key, value, timeout, version, client)
+        if added:
+            self._invalidate([key], version)
+        return added
+
+    @cache_operation("delete")
+    def delete(self, key, version=None, prefix=None, client=None):
+        result = super().delete(key, version=version, prefix=prefix, client=client)
+        self._invalidate([key], version)
+        return result
+
+    @cache_operation("delete_many")
+    def delete_many(self, keys, version=None, client=None):
+        result = super().delete_many(keys, version=version, client=client)
+        self._invalidate(list(keys), version)
+        return result
+
+    @cache_operation("incr")
+    def incr(self, key, delta=1, version=None, client=None, **kwargs):
+        result = super().incr(key, delta, version, client, **kwargs)
+        self._invalidate([key], version)
+        return result
+
+    @cache_operation("decr")
+    def decr(self, key, delta=1, version=None, client=None, **kwargs):
+        result = super().decr(key, delta, version, client, **kwargs)
+        self._invalidate([key], version)
+        return result
+
+    def delete_pattern(self, *args, **kwargs):
+        result = super().delete_pattern(*args, **kwargs)
+        self._invalidate_all()
+        return result
+
+    def clear(self):
+        result = super().clear()
+        self._invalidate_all()
+        return result
+
+    def _is_local(self, key):
+        return not self.local_key_prefixes or str(key).startswith(self.local_key_prefixes)
+
+    def _local_ready(self):
+        return self.tier.ready(lambda: self.client.get_client(write=True))
+
+    def _invalidate(self, keys, version):
+        message = self.local_invalidation(keys, version)
+        if message is not None:
+            self._publish(message)
+
+    def _invalidate_all(self):
+        self.tier.drop_all()
+        self._publish(json.dumps({"node": self.tier.node, "all": True}))
+
+    def _publish(self, message):
+        try:
+            self.client.get_client(write=True).publish(self.tier.channel, message)
+        except Exception:
+            # other workers keep their copies for at most LOCAL_TIMEOUT
+            logger.exception("Could not publish cache invalidation")
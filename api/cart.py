@@ -0,0 +1,110 @@
+from decimal import Decimal
+from django.conf import settings
+from django_redis import get_redis_connection
+from .models import Product
+
+# Server-side carts.
+# A cart is a Redis hash per user, {product_id: quantity}, so adding, changing
+# and removing a line is one O(1) script call and browsing writes nothing to
+# the database. Carts expire CART_TIMEOUT seconds after their last change.
+# Prices and stock are read when the cart is shown, for every line in one
+# query; checkout places the order through OrderSerializer (see views.CartViewSet).
+
+CART_TIMEOUT = getattr(settings, "CART_TIMEOUT", 30 * 86400)
+MAX_LINES = getattr(settings, "CART_MAX_LINES", 100)
+MAX_QUANTITY = getattr(settings, "CART_MAX_QUANTITY", 1000)
+
+# Add ARGV[2] to a line ("add") or set it ("set"; 0 removes it), capped at
+# MAX_QUANTITY, and refresh the expiry. Returns the line's quantity, or -1 if
+# a new line would exceed MAX_LINES
+WRITE_LINE = """
+local current = tonumber(redis.call("HGET", KEYS[1], ARGV[1]) or "0")
+local quantity = tonumber(ARGV[2])
+if ARGV[3] == "add" then quantity = current + quantity end
+quantity = math.min(quantity, tonumber(ARGV[5]))
+if quantity <= 0 then
+    redis.call("HDEL", KEYS[1], ARGV[1])
+    return 0
+end
+if current == 0 and redis.call("HLEN", KEYS[1]) >= tonumber(ARGV[4]) then
+    return -1
+end
+redis.call("HSET", KEYS[1], ARGV[1], quantity)
+redis.call("EXPIRE", KEYS[1], ARGV[6])
+return quantity
+"""
+
+
+class CartFull(Exception):
+    pass
+
+
+def cart_key(user_id):
+    return f"cart:{user_id}"
+
+
+def _redis():
+    return get_redis_connection("default")
+
+
+def _write_line(user_id, product_id, quantity, mode):
+    result = _redis().eval(
+        WRITE_LINE, 1, cart_key(user_id), product_id, quantity, mode, MAX_LINES, MAX_QUANTITY, CART_TIMEOUT,
+    )
+    if result < 0:
+        raise CartFull(f"A cart holds at most {MAX_LINES} products.")
+    return result
+
+
+# Add `quantity` of a product; returns the line's new quantity
+def add_item(user_id, product_id, quantity=1):
+    return _write_line(user_id, product_id, quantity, "add")
+
+
+# Set a line's quantity, 0 removing it; returns the quantity
+def set_item(user_id, product_id, quantity):
+    return _write_line(user_id, product_id, quantity, "set")
+
+
+def remove_items(user_id, product_ids):
+    if product_ids:
+        _redis().hdel(cart_key(user_id), *product_ids)
+
+
+def clear_cart(user_id):
+    _redis().delete(cart_key(user_id))
+
+
+# {product_id: quantity}
+def get_cart(user_id):
+    return {int(product_id): int(quantity) for product_id, quantity in _redis().hgetall(cart_key(user_id)).items()}
+
+
+# The cart with current names, prices and available stock (stock not held by
+# reservations), read in one query. Lines of products that are gone or short
+# of stock are marked unavailable and left out of the total
+def cart_contents(user_id):
+    cart = get_cart(user_id)
+    products = {
+        product["id"]: product
+        for product in Product.objects.filter(id__in=cart).values("id", "name", "price", "stock", "reserved")
+    } if cart else {}
+    items, total = [], Decimal("0")
+    for product_id, quantity in sorted(cart.items()):
+        product = products.get(product_id)
+        if product is None:
+            items.append({
+                "product_id": product_id, "name": None, "price": None, "quantity": quantity,
+                "stock": 0, "available": False, "subtotal": None,
+            })
+            continue
+        subtotal = product["price"] * quantity
+        stock = max(product["stock"] - product["reserved"], 0)
+        available = stock >= quantity
+        if available:
+            total += subtotal
+        items.append({
+            "product_id": product_id, "name": product["name"], "price": f"{product['price']:.2f}",
+            "quantity": quantity, "stock": stock, "available": available, "subtotal": f"{subtotal:.2f}",
+        })
+    return {"items": items, "total": f"{total:.2f}"}
@@ -0,0 +1,287 @@
+import json
+import logging
+import queue
+import threading
+import uuid
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.utils.module_loading import import_string
+from django_redis import get_redis_connection
+from rest_framework import serializers
+from .models import Order
+from .flashsale import release
+from .orders import place_order
+from .outbox import enqueue, user_group
+
+# Asynchronous checkout.
+# With ASYNC_CHECKOUT on, clients that send `Prefer: respond-async` with
+# POST /orders/ get a 202 with a ticket as soon as the cart is validated; the
+# order is placed by a checkout worker, and the outcome reaches the user's
+# OrderConsumer group as an order.checkout message through the outbox.
+# Workers take submissions from CHECKOUT_QUEUE in batches and place each
+# batch in one transaction, every order in its own savepoint, so an order
+# short of stock fails alone. Orders carry their ticket, so a submission
+# redelivered after a worker crash isn't placed twice. Ticket states are kept
+# in the cache for CHECKOUT_TICKET_TTL seconds for polling.
+
+logger = logging.getLogger(__name__)
+
+ENABLED = getattr(settings, "ASYNC_CHECKOUT", False)
+QUEUE = getattr(settings, "CHECKOUT_QUEUE", "api.checkout.RedisStreamQueue")
+BATCH_SIZE = getattr(settings, "CHECKOUT_BATCH_SIZE", 50)
+TICKET_TTL = getattr(settings, "CHECKOUT_TICKET_TTL", 3600)
+STREAM_MAXLEN = getattr(settings, "CHECKOUT_STREAM_MAXLEN", 1_000_000)
+# threads of LocalPoolQueue's in-process worker pool
+LOCAL_WORKERS = getattr(settings, "CHECKOUT_LOCAL_WORKERS", 4)
+
+PLACEMENT_ERROR = "The order could not be placed, please try again."
+
+
+def ticket_key(ticket):
+    return f"checkout_ticket:{ticket}"
+
+
+# Submissions queued in this process; the stand-in for tests and single
+# processes. get_batch returns up to `count` (entry id, submission) pairs,
+# waiting up to `timeout` seconds for the first
+class InMemoryQueue:
+    # entries taken by a worker are gone, whether their batch succeeds or not
+    redelivers = False
+
+    def __init__(self):
+        self.entries = queue.SimpleQueue()
+
+    def put(self, submission):
+        self.entries.put(submission)
+
+    def get_batch(self, count, timeout=0):
+        batch = []
+        try:
+            batch.append(self.entries.get(timeout=timeout) if timeout else self.entries.get_nowait())
+            while len(batch) < count:
+                batch.append(self.entries.get_nowait())
+        except queue.Empty:
+            pass
+        return [(None, submission) for submission in batch]
+
+    def ack(self, entry_ids):
+        pass
+
+
+# InMemoryQueue drained by LOCAL_WORKERS threads of this process, started
+# with the first submission
+class LocalPoolQueue(InMemoryQueue):
+
+    def __init__(self, workers=LOCAL_WORKERS):
+        super().__init__()
+        self.workers = workers
+        self.started = False
+        self.lock = threading.Lock()
+
+    def put(self, submission):
+        super().put(submission)
+        with self.lock:
+            if not self.started:
+                self.started = True
+                for number in range(self.workers):
+                    threading.Thread(target=run_worker, args=(self,), name=f"checkout-{number}", daemon=True).start()
+
+
+# A Redis stream read by a consumer group, shared by worker processes.
+# Entries are acknowledged once their batch is committed; those of a crashed
+# worker are claimed by another after CLAIM_IDLE_MS. The stream is trimmed to
+# about STREAM_MAXLEN entries as new ones are added, which must stay well
+# above the backlog
+class RedisStreamQueue:
+    stream = "checkout"
+    group = "checkout-workers"
+    CLAIM_IDLE_MS = 60_000
+    redelivers = True
+    # streams whose group this process has created or found
+    ready_streams = set()
+
+    def __init__(self, consumer=None, stream=None):
+        self.redis = get_redis_connection("default")
+        self.consumer = consumer or uuid.uuid4().hex
+        if stream is not None:
+            self.stream = stream
+
+    def put(self, submission):
+        self.redis.xadd(
+            self.stream, {"submission": json.dumps(submission)}, maxlen=STREAM_MAXLEN, approximate=True,
+        )
+
+    def _ensure_group(self):
+        if self.stream not in self.ready_streams:
+            try:
+                self.redis.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+            except Exception as exc:
+                if "BUSYGROUP" not in str(exc):
+                    raise
+            self.ready_streams.add(self.stream)
+
+    def get_batch(self, count, timeout=0):
+        self._ensure_group()
+        _, entries, _ = self.redis.xautoclaim(
+            self.stream, self.group, self.consumer, min_idle_time=self.CLAIM_IDLE_MS, count=count,
+        )
+        if not entries:
+            streams = self.redis.xreadgroup(
+                self.group, self.consumer, {self.stream: ">"}, count=count, block=int(timeout * 1000) or None,
+            )
+            entries = streams[0][1] if streams else []
+        return [(entry_id, json.loads(fields[b"submission"])) for entry_id, fields in entries if fields]
+
+    def ack(self, entry_ids):
+        entry_ids = [entry_id for entry_id in entry_ids if entry_id is not None]
+        if entry_ids:
+            self.redis.xack(self.stream, self.group, *entry_ids)
+
+
+_queue = None
+
+
+def get_queue():
+    global _queue
+    if _queue is None:
+        _queue = import_string(QUEUE)()
+    return _queue
+
+
+# Whether this order request should be placed asynchronously
+def wants_async(request):
+    return ENABLED and "respond-async" in request.headers.get("Prefer", "")
+
+
+# Queue an order of validated items for `user_id`; returns its ticket
+def submit(user_id, items, checkout_queue=None):
+    ticket = uuid.uuid4().hex
+    submission = {
+        "ticket": ticket,
+        "user_id": user_id,
+        "items": [{"product_id": item["product_id"], "quantity": item["quantity"]} for item in items],
+    }
+    cache.set(ticket_key(ticket), {"user_id": user_id, "status": "queued"}, TICKET_TTL)
+    (checkout_queue or get_queue()).put(submission)
+    return ticket
+
+
+# The ticket's state for `user_id`: {"ticket", "status", and "order_id" or
+# "errors"}, or None for unknown tickets and those of other users
+def ticket_state(ticket, user_id):
+    state = cache.get(ticket_key(ticket))
+    if state is None or state.pop("user_id") != user_id:
+        return None
+    return {"ticket": ticket, **state}
+
+
+def _errors(exc):
+    detail = exc.detail if isinstance(exc.detail, list) else [exc.detail]
+    return [str(error) for error in detail]
+
+
+# Place a batch of submissions in one transaction and report every outcome.
+# An order failing with a database error fails alone; if the batch as a whole
+# rolls back, the flash-sale stock its placed orders were admitted is given
+# back before the error propagates. Returns {ticket: state}
+def process_batch(submissions):
+    tickets = [submission["ticket"] for submission in submissions]
+    users = get_user_model().objects.in_bulk({submission["user_id"] for submission in submissions})
+    results = {}
+    admitted = []
+    try:
+        with transaction.atomic():
+            # redelivered submissions whose order already exists
+            for ticket, order_id in Order.objects.filter(checkout_ticket__in=tickets).values_list("checkout_ticket", "id"):
+                results[ticket] = {"status": "placed", "order_id": order_id}
+            for submission in submissions:
+                ticket, user = submission["ticket"], users.get(submission["user_id"])
+                if ticket in results:
+                    continue
+                if user is None:
+                    results[ticket] = {"status": "failed", "errors": ["User does not exist."]}
+                    continue
+                results[ticket] = _place(user, submission, admitted)
+                enqueue(user_group(submission["user_id"]), {"type": "order.checkout", "ticket": ticket, **results[ticket]})
+    except BaseException:
+        for quantities in admitted:
+            release(quantities)
+        raise
+    _save_states(submissions, results)
+    return results
+
+
+# Place one submission's order in a savepoint; returns its state. The order's
+# flash-sale admissions are added to `admitted`
+def _place(user, submission, admitted):
+    ticket = submission["ticket"]
+    try:
+        with transaction.atomic():
+            order = place_order(user, submission["items"], ticket=ticket)
+    except serializers.ValidationError as exc:
+        return {"status": "failed", "errors": _errors(exc)}
+    except IntegrityError:
+        # the same submission, claimed back from a slow worker, was placed by
+        # it meanwhile
+        order_id = Order.objects.filter(checkout_ticket=ticket).values_list("id", flat=True).first()
+        if order_id is not None:
+            return {"status": "placed", "order_id": order_id}
+        logger.exception("Checkout %s failed", ticket)
+        return {"status": "failed", "errors": [PLACEMENT_ERROR]}
+    except DatabaseError:
+        logger.exception("Checkout %s failed", ticket)
+        return {"status": "failed", "errors": [PLACEMENT_ERROR]}
+    admitted.append(order.flash_admitted)
+    return {"status": "placed", "order_id": order.id}
+
+
+def _save_states(submissions, results):
+    cache.set_many({
+        ticket_key(submission["ticket"]): {"user_id": submission["user_id"], **results[submission["ticket"]]}
+        for submission in submissions
+    }, TICKET_TTL)
+
+
+# Fail submissions that couldn't be placed, telling their users as far as
+# the database lets us
+def fail_submissions(submissions):
+    results = {submission["ticket"]: {"status": "failed", "errors": [PLACEMENT_ERROR]} for submission in submissions}
+    _save_states(submissions, results)
+    try:
+        with transaction.atomic():
+            for submission in submissions:
+                enqueue(
+                    user_group(submission["user_id"]),
+                    {"type": "order.checkout", "ticket": submission["ticket"], **results[submission["ticket"]]},
+                )
+    except DatabaseError:
+        logger.exception("Couldn't notify %d failed checkouts", len(submissions))
+    return results
+
+
+# Take batches from `checkout_queue` until `stop` is set. A failed batch is
+# left unacknowledged on queues that redeliver; on the others its
+# submissions are placed again one at a time, and failed if they still fail
+def run_worker(checkout_queue, batch_size=BATCH_SIZE, timeout=1.0, stop=None):
+    try:
+        while stop is None or not stop.is_set():
+            entries = checkout_queue.get_batch(batch_size, timeout)
+            if not entries:
+                continue
+            try:
+                process_batch([submission for _, submission in entries])
+            except Exception:
+                logger.exception("Checkout batch of %d failed", len(entries))
+                if checkout_queue.redelivers:
+                    continue
+                for _, submission in entries:
+                    try:
+                        process_batch([submission])
+                    except Exception:
+                        logger.exception("Checkout %s failed", submission["ticket"])
+                        fail_submissions([submission])
+            checkout_queue.ack([entry_id for entry_id, _ in entries])
+    finally:
+        connection.close()
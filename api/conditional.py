@@ -0,0 +1,59 @@
+import hashlib
+import time
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+# Conditional requests for catalogue resources.
+# Validators are derived from the cache generations a representation depends on
+# (see api.cache), never from its body, so an unchanged resource is answered
+# with a 304 before anything is queried or serialized. Generations are clock
+# readings in nanoseconds, which also gives Last-Modified for free: the
+# latest generation rounded up to the second. Two changes within one second
+# share that date, so it is only sent once its second is over; any later
+# change then gets a later date, and a client's If-Unmodified-Since or
+# If-Modified-Since can't mistake it for the copy it has.
+
+PRECONDITION_HEADERS = ("HTTP_IF_MATCH", "HTTP_IF_NONE_MATCH", "HTTP_IF_MODIFIED_SINCE", "HTTP_IF_UNMODIFIED_SINCE")
+
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = "The resource has changed since it was fetched."
+    default_code = "precondition_failed"
+
+
+# (etag, last_modified) for a representation built from data at `versions`;
+# `parts` tell apart representations built from the same generations
+def validators(versions, *parts):
+    digest = hashlib.blake2b(repr((tuple(versions), parts)).encode(), digest_size=12).hexdigest()
+    return f'"{digest}"', -(-max(versions) // 1_000_000_000)
+
+
+def has_preconditions(request):
+    return any(header in request.META for header in PRECONDITION_HEADERS)
+
+
+# Evaluate If-None-Match / If-Modified-Since / If-Match / If-Unmodified-Since:
+# returns a 304 for a GET whose copy is current, None to go ahead, and raises
+# PreconditionFailed when the client's copy is outdated
+def evaluate_preconditions(request, etag, last_modified):
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        return None
+    if response.status_code == status.HTTP_412_PRECONDITION_FAILED:
+        raise PreconditionFailed()
+    return set_validators(response, etag, last_modified)
+
+
+def set_validators(response, etag, last_modified):
+    # a gzipped body is not byte-for-byte the representation the ETag names
+    if response.get("Content-Encoding") == "gzip" and not etag.startswith("W/"):
+        etag = f"W/{etag}"
+    response["ETag"] = etag
+    if last_modified * 1_000_000_000 <= time.time_ns():
+        response["Last-Modified"] = http_date(last_modified)
+    # clients may keep the body but must revalidate before using it
+    patch_cache_control(response, no_cache=True)
+    return response
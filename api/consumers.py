@@ -1,22 +1,117 @@
+import asyncio
 import json
+import logging
+import time
+import weakref
+from django.conf import settings
 from channels.generic.websocket import AsyncWebsocketConsumer
-from channels.db import database_sync_to_async
+from .outbox import user_group
 
-# Assuming we have a Django model Order
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_INTERVAL = getattr(settings, "WS_HEARTBEAT_INTERVAL", 25)
+# sockets that sent nothing (not even a pong) for this long are closed
+IDLE_TIMEOUT = getattr(settings, "WS_IDLE_TIMEOUT", 75)
+
+# application close codes
+CLOSE_IDLE = 4008
+CLOSE_TOKEN_EXPIRED = 4001
+
+
+# Pings every open consumer of an event loop from one shared task, instead of
+# one timer per socket, and closes those that went idle or whose token expired
+class Heartbeat:
+
+    def __init__(self, interval=HEARTBEAT_INTERVAL, idle_timeout=IDLE_TIMEOUT):
+        self.interval = interval
+        self.idle_timeout = idle_timeout
+        self.consumers = set()
+        self.task = None
+
+    def add(self, consumer):
+        self.consumers.add(consumer)
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+
+    def discard(self, consumer):
+        self.consumers.discard(consumer)
+        # stop sleeping once the last socket is gone; evictions from the
+        # heartbeat task itself end it after the current round instead
+        if not self.consumers and self.task is not None and self.task is not asyncio.current_task():
+            self.task.cancel()
+            self.task = None
+
+    async def run(self):
+        while self.consumers:
+            await asyncio.sleep(self.interval)
+            await self.beat()
+
+    async def beat(self):
+        idle_before = time.monotonic() - self.idle_timeout
+        now = time.time()
+        for consumer in list(self.consumers):
+            try:
+                if consumer.expires_at is not None and consumer.expires_at <= now:
+                    await consumer.evict(CLOSE_TOKEN_EXPIRED)
+                elif consumer.last_seen < idle_before:
+                    await consumer.evict(CLOSE_IDLE)
+                else:
+                    await consumer.send(text_data='{"type":"ping"}')
+            except Exception:
+                # a socket that went away mid-round must not stop the others' pings
+                logger.warning("Dropping a socket the heartbeat couldn't reach", exc_info=True)
+                self.discard(consumer)
+
+
+_heartbeats = weakref.WeakKeyDictionary()
+
+
+def heartbeat():
+    loop = asyncio.get_running_loop()
+    if loop not in _heartbeats:
+        _heartbeats[loop] = Heartbeat()
+    return _heartbeats[loop]
+
+
+# Order status notifications for the connected user (see api.outbox). Clients
+# authenticate with a JWT (api.websocket.JWTAuthMiddleware), get a ping every
+# HEARTBEAT_INTERVAL seconds and must send something, e.g. {"type": "pong"},
+# within IDLE_TIMEOUT seconds
 class OrderConsumer(AsyncWebsocketConsumer):
+    group_name = None
+
     async def connect(self):
         user = self.scope["user"]
         # Only allow authenticated users to connect
         if user.is_anonymous:
             await self.close()
             return
-        self.group_name = f"user_{user.id}"
+        self.expires_at = self.scope.get("token_expires_at")
+        self.last_seen = time.monotonic()
+        self.group_name = user_group(user.id)
         await self.channel_layer.group_add(self.group_name, self.channel_name)
         await self.accept()
+        heartbeat().add(self)
 
     # Handle disconnection
     async def disconnect(self, code):
-        await self.channel_layer.group_discard(self.group_name, self.channel_name)
+        heartbeat().discard(self)
+        if self.group_name is not None:
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    # Any message counts as a sign of life; pings are answered
+    async def receive(self, text_data=None, bytes_data=None):
+        self.last_seen = time.monotonic()
+        try:
+            message = json.loads(text_data or "null")
+        except ValueError:
+            return
+        if isinstance(message, dict) and message.get("type") == "ping":
+            await self.send(text_data='{"type":"pong"}')
+
+    async def evict(self, code):
+        heartbeat().discard(self)
+        await self.close(code)
 
     # Receive message from WebSocket
     async def order_notification(self, event):
@@ -26,3 +121,20 @@ class OrderConsumer(AsyncWebsocketConsumer):
             "status": event["status"],
         }
         await self.send(text_data=json.dumps(payload))
+
+    # Several orders' updates in one frame (bulk status transitions)
+    async def order_notifications(self, event):
+        payload = {
+            "type": "order_updates",
+            "orders": [{"order_id": update["order_id"], "status": update["status"]} for update in event["orders"]],
+        }
+        await self.send(text_data=json.dumps(payload))
+
+    # Outcome of an asynchronous checkout (api.checkout)
+    async def order_checkout(self, event):
+        payload = {"type": "checkout", "ticket": event["ticket"], "status": event["status"]}
+        if "order_id" in event:
+            payload["order_id"] = event["order_id"]
+        if "errors" in event:
+            payload["errors"] = event["errors"]
+        await self.send(text_data=json.dumps(payload))
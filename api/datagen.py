@@ -0,0 +1,111 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+from .analytics import rebuild_rollups
+from .cache import bump, PRODUCTS_NS, CATEGORIES_NS
+from .models import Category, Product, Order, OrderItem
+from .search import rebuild_index
+from .summaries import recompute_summaries
+
+User = get_user_model()
+
+# Synthetic catalogue and order history for load tests and benchmarks.
+# Everything is written with bulk_create, so model signals don't fire; the
+# derived data they maintain (search index, category summaries, sales rollups,
+# cache generations) is rebuilt once at the end. Runs are reproducible for a
+# given seed and add to whatever is already in the database.
+
+ADJECTIVES = ("Classic", "Compact", "Deluxe", "Eco", "Smart", "Pro", "Ultra", "Vintage", "Wireless", "Portable")
+NOUNS = ("Lamp", "Chair", "Phone", "Kettle", "Backpack", "Speaker", "Watch", "Jacket", "Novel", "Blender",
+         "Monitor", "Sneakers", "Camera", "Desk", "Headphones", "Mug", "Router", "Tent", "Guitar", "Keyboard")
+DETAILS = ("built to last", "with a two-year warranty", "in recycled materials", "for everyday use",
+           "loved by reviewers", "with fast shipping", "in several colours", "for small spaces")
+STATUS_WEIGHTS = (("pending", 2), ("shipped", 3), ("delivered", 5))
+PASSWORD = "loadtest-password"
+
+
+def _product(rng, category, number):
+    name = f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {number}"
+    # prices are roughly log-normal, as in most catalogues; one product in ten is sold out
+    price = Decimal(str(round(min(rng.lognormvariate(3.5, 1.0), 99_999), 2))).quantize(Decimal("0.01"))
+    stock = 0 if rng.random() < 0.1 else rng.randint(1, 500)
+    description = f"{name}, {rng.choice(DETAILS)} and {rng.choice(DETAILS)}."
+    return Product(name=name, description=description, price=price, stock=stock, category=category)
+
+
+# Create the given numbers of categories, products, users and orders (with 1 to
+# `max_items` lines each, placed over the last `days` days); returns the counts
+def generate(categories=10, products=1000, users=100, orders=1000, max_items=5, days=90, seed=0,
+             prefix="load", batch_size=1000):
+    rng = random.Random(seed)
+    run = f"{prefix}-{timezone.now():%Y%m%d%H%M%S}-{seed}"
+    with transaction.atomic():
+        new_categories = Category.objects.bulk_create([
+            Category(name=f"{run} category {i}", description=f"Generated category {i}") for i in range(categories)
+        ])
+        if not new_categories:
+            # --categories 0 spreads the products over the existing categories
+            new_categories = list(Category.objects.all()) or [Category.objects.create(name=f"{run} category")]
+        new_products = Product.objects.bulk_create(
+            [_product(rng, rng.choice(new_categories), i) for i in range(products)], batch_size=batch_size,
+        )
+        password = make_password(PASSWORD)
+        new_users = User.objects.bulk_create(
+            [User(username=f"{run}-user-{i}", password=password) for i in range(users)], batch_size=batch_size,
+        )
+        placed, lines = _orders(rng, new_users, new_products, orders, max_items, days, batch_size)
+        rebuild_index()
+        recompute_summaries([category.pk for category in new_categories])
+        if placed:
+            rebuild_rollups(start=timezone.localdate() - timedelta(days=days))
+    bump(PRODUCTS_NS, CATEGORIES_NS)
+    return {
+        "categories": len(new_categories), "products": len(new_products), "users": len(new_users),
+        "orders": placed, "order_items": lines,
+    }
+
+
+def _orders(rng, users, products, count, max_items, days, batch_size):
+    if not users or not products:
+        return 0, 0
+    statuses, weights = zip(*STATUS_WEIGHTS)
+    now = timezone.now()
+    placed = lines = 0
+    # popular products sell more: pick from a skewed distribution
+    ranked = list(products)
+    rng.shuffle(ranked)
+    for start in range(0, count, batch_size):
+        carts = []
+        for _ in range(min(batch_size, count - start)):
+            cart = {}
+            for _ in range(rng.randint(1, max_items)):
+                product = ranked[int(len(ranked) * rng.random() ** 3)]
+                cart[product] = cart.get(product, 0) + rng.randint(1, 3)
+            created_at = now - timedelta(seconds=rng.randint(0, days * 86400))
+            carts.append((cart, created_at))
+        batch = Order.objects.bulk_create([
+            Order(
+                user=rng.choice(users), status=rng.choices(statuses, weights)[0],
+                total_price=sum(product.price * quantity for product, quantity in cart.items()),
+            )
+            for cart, _ in carts
+        ])
+        # created_at is auto_now_add, so spreading orders over time takes an update
+        for order, (_, created_at) in zip(batch, carts):
+            order.created_at = created_at
+        Order.objects.bulk_update(batch, ["created_at"], batch_size=500)
+        items = OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order, product=product, quantity=quantity, price_at_purchase=product.price,
+                category_id=product.category_id,
+            )
+            for order, (cart, _) in zip(batch, carts)
+            for product, quantity in cart.items()
+        ], batch_size=batch_size)
+        placed += len(batch)
+        lines += len(items)
+    return placed, lines
@@ -0,0 +1,118 @@
+from rest_framework import ISO_8601
+from rest_framework.settings import api_settings
+from .models import OrderItem
+from .serializers import OrderSerializer, ProductSerializer
+
+# Read-path serialization without DRF's per-field machinery.
+# List and retrieve actions fetch flat .values() projections and build the
+# response dicts here. Every nested category dict is built once per request
+# and shared by the rows that reference it. Output is identical to
+# ProductSerializer / OrderSerializer: keys come in the same order, and values
+# are formatted by the serializers' own field instances. api/tests/test_fast_serializers.py
+# checks this byte for byte.
+
+PRODUCT_VALUES = [
+    "id", "sku", "name", "description", "price", "stock", "reserved", "created_at", "updated_at",
+    "category_id", "category__name", "category__description",
+]
+ORDER_VALUES = ["id", "user_id", "status", "total_price", "created_at", "updated_at"]
+ITEM_VALUES = ["id", "order_id", "quantity", "price_at_purchase"] + [f"product__{name}" for name in PRODUCT_VALUES]
+
+_product_fields = ProductSerializer().fields
+_order_fields = OrderSerializer().fields
+_item_fields = _order_fields["items"].child.fields
+_price = _product_fields["price"].to_representation
+_total_price = _order_fields["total_price"].to_representation
+_price_at_purchase = _item_fields["price_at_purchase"].to_representation
+_datetime_field = _product_fields["created_at"]
+
+
+# DateTimeField.to_representation with the timezone looked up once per call
+# rather than once per value; formats other than ISO 8601 use the field itself
+def datetime_formatter():
+    field = _datetime_field
+    output_format = getattr(field, "format", api_settings.DATETIME_FORMAT)
+    timezone = getattr(field, "timezone", None) or field.default_timezone()
+    if output_format is None or output_format.lower() != ISO_8601 or timezone is None:
+        return field.to_representation
+
+    def to_representation(value):
+        if value is None or value.tzinfo is None:
+            return field.to_representation(value)
+        value = value.astimezone(timezone).isoformat()
+        return value[:-6] + "Z" if value.endswith("+00:00") else value
+    return to_representation
+
+
+# Product dicts from rows of `queryset.values(*PRODUCT_VALUES)`; `prefix` reads
+# the same columns through a relation (e.g. "product__" on order items)
+class ProductRows:
+
+    def __init__(self, prefix="", datetime=None):
+        self.keys = [f"{prefix}{name}" for name in PRODUCT_VALUES]
+        self.datetime = datetime or datetime_formatter()
+        self.categories = {}
+
+    def __call__(self, row):
+        id_, sku, name, description, price, stock, reserved, created_at, updated_at, category_id, category_name, category_description = (
+            row[key] for key in self.keys
+        )
+        category = self.categories.get(category_id)
+        if category is None:
+            category = self.categories[category_id] = {
+                "id": category_id, "name": category_name, "description": category_description,
+            }
+        return {
+            "id": id_,
+            "sku": sku,
+            "name": name,
+            "description": description,
+            "price": _price(price),
+            "stock": stock,
+            "available": max(stock - reserved, 0),
+            "category": category,
+            "created_at": self.datetime(created_at),
+            "updated_at": self.datetime(updated_at),
+        }
+
+
+def product_values(queryset):
+    return queryset.values(*PRODUCT_VALUES)
+
+
+def product_rows(rows):
+    return list(map(ProductRows(), rows))
+
+
+# items are fetched by order_rows, so any prefetch on the list queryset is dropped
+def order_values(queryset):
+    return queryset.prefetch_related(None).values(*ORDER_VALUES)
+
+
+# Order dicts from rows of `queryset.values(*ORDER_VALUES)`; items, their
+# products and categories come from one extra query for the whole page
+def order_rows(rows):
+    rows = list(rows)
+    datetime = datetime_formatter()
+    product = ProductRows("product__", datetime)
+    items = {}
+    item_rows = OrderItem.objects.filter(order_id__in=[row["id"] for row in rows]).order_by("id").values(*ITEM_VALUES)
+    for item in item_rows:
+        items.setdefault(item["order_id"], []).append({
+            "id": item["id"],
+            "product": product(item),
+            "quantity": item["quantity"],
+            "price_at_purchase": _price_at_purchase(item["price_at_purchase"]),
+        })
+    return [
+        {
+            "id": row["id"],
+            "user": row["user_id"],
+            "status": row["status"],
+            "total_price": _total_price(row["total_price"]),
+            "created_at": datetime(row["created_at"]),
+            "updated_at": datetime(row["updated_at"]),
+            "items": items.get(row["id"], []),
+        }
+        for row in rows
+    ]
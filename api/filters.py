@@ -1,5 +1,7 @@
 import django_filters
-from .models import Product
+from rest_framework.filters import BaseFilterBackend
+from .models import Order, Product
+from .search import search_products
 
 # Filter class for Product model
 class ProductFilter(django_filters.FilterSet):
@@ -17,3 +19,22 @@ class ProductFilter(django_filters.FilterSet):
         if value:
             return queryset.filter(stock__gt=0)
         return queryset.filter(stock__lte=0)
+
+
+# Ranked full-text search over product name and description (see api.search)
+class ProductSearchFilter(BaseFilterBackend):
+    search_param = "search"
+
+    def filter_queryset(self, request, queryset, view):
+        return search_products(queryset, request.query_params.get(self.search_param, ""))
+
+
+# Filters for the admin order export (OrderViewSet.export)
+class OrderExportFilter(django_filters.FilterSet):
+    status = django_filters.ChoiceFilter(choices=Order.STATUS_CHOICES)
+    created_after = django_filters.DateTimeFilter(field_name="created_at", lookup_expr="gte")
+    created_before = django_filters.DateTimeFilter(field_name="created_at", lookup_expr="lt")
+
+    class Meta:
+        model = Order
+        fields = ["status", "created_after", "created_before"]
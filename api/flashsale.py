@@ -0,0 +1,204 @@
+from collections import Counter
+from django.db import transaction
+from django.db.models import Case, IntegerField, Value, When
+from django.utils import timezone
+from django_redis import get_redis_connection
+from rest_framework import serializers
+from .cache import invalidate_products
+from .models import Product
+from .summaries import adjust_summary
+
+# Flash sales: Redis admission control for hot products.
+# A product on sale has its available stock (stock - reserved) mirrored into
+# Redis. Buyers are admitted by one atomic decrement there (ADMIT) before any
+# database work, so a sold-out drop is refused without a transaction and
+# admitted orders don't lock or update the product row. reconcile() writes
+# the Redis stock back to the rows, called periodically by `manage.py
+# reconcile_flash_sales`; product pages show the stock as of the last
+# reconciliation. Stock changed in the database meanwhile (restocks, orders
+# placed just before the sale started, expired reservations) is folded into
+# the Redis stock at the next reconciliation. Orders that fail after admission
+# return their stock (release). The products' names are kept alongside, as of
+# the last reconciliation, so refusals can name the product without a query.
+
+# {product_id: the row's available stock as of the last reconciliation}
+SALES_KEY = "flash_sales"
+# {product_id: name} of the products on sale
+NAMES_KEY = "flash_sale_names"
+
+# Decrement every flash-sale product of an order, all or nothing. KEYS are
+# stock keys, ARGV the quantities. Returns {1, remaining stock or -1 for
+# products not on sale...}, or {0, index of the first short product}
+ADMIT = """
+local remaining = {}
+for i, key in ipairs(KEYS) do
+    local stock = redis.call("GET", key)
+    if stock then
+        stock = tonumber(stock) - tonumber(ARGV[i])
+        if stock < 0 then return {0, i} end
+        remaining[i] = stock
+    else
+        remaining[i] = -1
+    end
+end
+for i, key in ipairs(KEYS) do
+    if remaining[i] >= 0 then redis.call("DECRBY", key, ARGV[i]) end
+end
+table.insert(remaining, 1, 1)
+return remaining
+"""
+
+# Give admitted stock back, to sales that are still running
+RELEASE = """
+for i, key in ipairs(KEYS) do
+    if redis.call("EXISTS", key) == 1 then redis.call("INCRBY", key, ARGV[i]) end
+end
+return 0
+"""
+
+# Start a sale at ARGV[2] units, named ARGV[3], unless it is running;
+# returns its stock
+START = """
+local stock = redis.call("GET", KEYS[1])
+if stock then return tonumber(stock) end
+redis.call("SET", KEYS[1], ARGV[2])
+redis.call("HSET", KEYS[2], ARGV[1], ARGV[2])
+redis.call("HSET", KEYS[3], ARGV[1], ARGV[3])
+return tonumber(ARGV[2])
+"""
+
+# Apply the row's drift (ARGV[2]) to a sale's stock and record it as synced
+# along with the product's name (ARGV[4]), or end the sale (ARGV[3] == "end").
+# Returns the stock, or -1 if not on sale
+SYNC = """
+local stock = redis.call("GET", KEYS[1])
+if not stock then return -1 end
+stock = math.max(tonumber(stock) + tonumber(ARGV[2]), 0)
+if ARGV[3] == "end" then
+    redis.call("DEL", KEYS[1])
+    redis.call("HDEL", KEYS[2], ARGV[1])
+    redis.call("HDEL", KEYS[3], ARGV[1])
+else
+    redis.call("SET", KEYS[1], stock)
+    redis.call("HSET", KEYS[2], ARGV[1], stock)
+    redis.call("HSET", KEYS[3], ARGV[1], ARGV[4])
+end
+return stock
+"""
+
+
+def stock_key(product_id):
+    return f"flash_stock:{product_id}"
+
+
+def _redis():
+    return get_redis_connection("default")
+
+
+# Take `quantities` ({product_id: quantity}) of the order's flash-sale
+# products from Redis. Returns {product_id: remaining stock} for those
+# products; raises a ValidationError, taking nothing, if one is short
+def admit(quantities):
+    redis = _redis()
+    product_ids = sorted(quantities)
+    result = redis.eval(
+        ADMIT, len(product_ids), *map(stock_key, product_ids), *(quantities[product_id] for product_id in product_ids),
+    )
+    if result[0] == 0:
+        product_id = product_ids[result[1] - 1]
+        name = redis.hget(NAMES_KEY, product_id)
+        raise serializers.ValidationError(
+            f"Not enough stock for {name.decode() if name is not None else f'product {product_id}'}"
+        )
+    return {product_id: stock for product_id, stock in zip(product_ids, result[1:]) if stock >= 0}
+
+
+# Return admitted quantities ({product_id: quantity}) to their sales
+def release(quantities):
+    if quantities:
+        _redis().eval(RELEASE, len(quantities), *map(stock_key, quantities), *quantities.values())
+
+
+# Put a product on sale with its available stock; returns the sale's stock.
+# Units already reserved stay with their reservations
+def start_flash_sale(product_id):
+    with transaction.atomic():
+        # holding the row keeps orders on the database path from changing the
+        # stock while it is copied
+        row = Product.objects.select_for_update().filter(pk=product_id).values_list("stock", "reserved", "name").first()
+        if row is None:
+            raise Product.DoesNotExist(f"Product {product_id} does not exist.")
+        stock, reserved, name = row
+        return _redis().eval(
+            START, 3, stock_key(product_id), SALES_KEY, NAMES_KEY, product_id, max(stock - reserved, 0), name,
+        )
+
+
+# Take a product off sale, writing its final stock to the row; returns that
+# stock, or None if it wasn't on sale
+def end_flash_sale(product_id):
+    return reconcile([product_id], end=True).get(product_id)
+
+
+def on_flash_sale(product_id):
+    return bool(_redis().exists(stock_key(product_id)))
+
+
+def active_sales():
+    return sorted(int(product_id) for product_id in _redis().hkeys(SALES_KEY))
+
+
+# Write the Redis stock of the given sales (default: all) to their product
+# rows, after folding in what changed in the rows since the last time.
+# Returns {product_id: available stock}. With `end`, the sales are ended as
+# well; the rows stay locked until the final stock is written, so orders
+# arriving after the sale see it
+def reconcile(product_ids=None, end=False):
+    redis = _redis()
+    with transaction.atomic():
+        product_ids = sorted(product_ids if product_ids is not None else active_sales())
+        if not product_ids:
+            return {}
+        rows = {
+            row["id"]: row
+            for row in Product.objects.select_for_update().filter(id__in=product_ids).order_by("id")
+            .values("id", "stock", "reserved", "category_id", "name")
+        }
+        results, changed, in_stock = {}, {}, Counter()
+        for product_id, synced in zip(product_ids, redis.hmget(SALES_KEY, product_ids)):
+            row = rows.get(product_id)
+            if synced is None:
+                continue
+            if row is None:
+                # the product was deleted during its sale
+                redis.delete(stock_key(product_id))
+                redis.hdel(SALES_KEY, product_id)
+                redis.hdel(NAMES_KEY, product_id)
+                continue
+            drift = row["stock"] - row["reserved"] - int(synced)
+            available = redis.eval(
+                SYNC, 3, stock_key(product_id), SALES_KEY, NAMES_KEY,
+                product_id, drift, "end" if end else "", row["name"],
+            )
+            if available < 0:
+                continue
+            results[product_id] = available
+            # reserved units stay on the row
+            stock = available + row["reserved"]
+            if stock != row["stock"]:
+                changed[product_id] = stock
+                in_stock[row["category_id"]] += (stock > 0) - (row["stock"] > 0)
+        if changed:
+            Product.objects.filter(pk__in=changed).update(
+                stock=Case(
+                    *[When(pk=product_id, then=Value(stock)) for product_id, stock in changed.items()],
+                    output_field=IntegerField(),
+                ),
+                updated_at=timezone.now(),
+            )
+            # no signals fire for the update, as in order placement
+            for category_id, count in in_stock.items():
+                if count:
+                    adjust_summary(category_id, in_stock=count)
+            invalidate_products((product_id, rows[product_id]["category_id"]) for product_id in changed)
+    return results
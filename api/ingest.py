@@ -0,0 +1,172 @@
+import codecs
+import csv
+import json
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from rest_framework import serializers
+from .models import Category, Product
+from .cache import invalidate_products
+from .search import index_products
+from .summaries import recompute_summaries
+
+# Bulk product upsert from NDJSON or CSV streams (ERP catalogue syncs).
+# Rows are read lazily and handled in batches: each batch is validated without
+# touching the database, resolves its categories with one query, looks up the
+# existing products with another and is written with a single
+# INSERT ... ON CONFLICT (sku) DO UPDATE. Caches are invalidated once, after the
+# last batch. Bad rows are reported and skipped; they never abort a batch.
+
+BATCH_SIZE = getattr(settings, "INGEST_BATCH_SIZE", 1000)
+# at most this many row errors are listed in a report; the rest are only counted
+MAX_REPORTED_ERRORS = getattr(settings, "INGEST_MAX_REPORTED_ERRORS", 1000)
+FORMATS = ("ndjson", "csv")
+UPDATE_FIELDS = ["name", "description", "price", "stock", "category", "updated_at"]
+
+
+# Shape of one incoming row; mirrors the Product model constraints
+class ProductRowSerializer(serializers.Serializer):
+    sku = serializers.CharField(max_length=64)
+    name = serializers.CharField(max_length=200)
+    description = serializers.CharField(allow_blank=True, required=False, default="")
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0)
+    stock = serializers.IntegerField(min_value=0, required=False, default=0)
+    category_id = serializers.IntegerField(min_value=1)
+
+
+# Format of an upload from its content type, e.g. "text/csv; charset=utf-8"
+def format_for_content_type(content_type):
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    if media_type in ("text/csv", "application/csv"):
+        return "csv"
+    if media_type in ("application/x-ndjson", "application/ndjson", "application/jsonl", "application/json-lines"):
+        return "ndjson"
+    return None
+
+
+# Yield (line number, record or None, error) from an iterable of text lines
+def iter_records(lines, fmt):
+    if fmt == "csv":
+        reader = csv.DictReader(lines)
+        for record in reader:
+            # empty cells mean "not given", so optional columns fall back to their defaults
+            yield reader.line_num, {k: v for k, v in record.items() if k is not None and v != ""}, None
+        return
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as exc:
+            yield number, None, f"Invalid JSON: {exc}"
+            continue
+        if not isinstance(record, dict):
+            yield number, None, "Expected a JSON object."
+            continue
+        yield number, record, None
+
+
+# Decode a binary stream (an upload, a request body or a file) line by line;
+# utf-8-sig also accepts the byte order mark spreadsheet exports start with
+def decode_lines(stream, encoding="utf-8-sig"):
+    return codecs.iterdecode(stream, encoding)
+
+
+# Outcome of an upsert: counts plus the first MAX_REPORTED_ERRORS row errors
+class UpsertReport:
+
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.error_count = 0
+        self.errors = []
+
+    def add_error(self, line, sku, errors):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "sku": sku, "errors": errors})
+
+    def as_dict(self):
+        return {
+            "created": self.created,
+            "updated": self.updated,
+            "failed": self.error_count,
+            "errors": sorted(self.errors, key=lambda error: error["line"]),
+        }
+
+
+# Upsert products from an iterable of text lines in NDJSON or CSV format
+def upsert_products(lines, fmt, batch_size=BATCH_SIZE):
+    report = UpsertReport()
+    affected = set()
+    batch = []
+    try:
+        for number, record, error in iter_records(lines, fmt):
+            if error is not None:
+                report.add_error(number, None, {"non_field_errors": [error]})
+                continue
+            batch.append((number, record))
+            if len(batch) >= batch_size:
+                _upsert_batch(batch, report, affected)
+                batch = []
+        if batch:
+            _upsert_batch(batch, report, affected)
+    finally:
+        # rows written before a failure (e.g. a decoding error) are live, so
+        # their pages go stale either way; upserts skip model signals, so the
+        # category summaries are recomputed here too
+        if affected:
+            invalidate_products(affected)
+            recompute_summaries({category_id for _, category_id in affected})
+    return report
+
+
+def _upsert_batch(batch, report, affected):
+    rows = {}
+    for number, record in batch:
+        row = ProductRowSerializer(data=record)
+        if not row.is_valid():
+            report.add_error(number, record.get("sku"), row.errors)
+            continue
+        # a later row for the same SKU replaces an earlier one, within a batch as across batches
+        rows[row.validated_data["sku"]] = (number, row.validated_data)
+
+    categories = Category.objects.in_bulk({data["category_id"] for _, data in rows.values()})
+    products = []
+    for sku, (number, data) in list(rows.items()):
+        category = categories.get(data["category_id"])
+        if category is None:
+            report.add_error(number, sku, {"category_id": [f"Invalid pk \"{data['category_id']}\" - object does not exist."]})
+            del rows[sku]
+            continue
+        products.append(Product(
+            sku=sku, name=data["name"], description=data["description"],
+            price=data["price"], stock=data["stock"], category=category,
+        ))
+    if not products:
+        return
+
+    try:
+        with transaction.atomic():
+            # existing rows: counts created vs updated, and their previous category
+            # pages must be invalidated when a product moves
+            existing = dict(Product.objects.filter(sku__in=rows).values_list("sku", "category_id"))
+            Product.objects.bulk_create(
+                products, update_conflicts=True, unique_fields=["sku"], update_fields=UPDATE_FIELDS,
+            )
+            if any(product.pk is None for product in products):
+                # backends that don't return ids from upserts
+                ids = dict(Product.objects.filter(sku__in=rows).values_list("sku", "id"))
+                for product in products:
+                    product.pk = ids[product.sku]
+            index_products(products)
+    except DatabaseError as exc:
+        for sku, (number, _) in rows.items():
+            report.add_error(number, sku, {"non_field_errors": [f"Database error: {exc}"]})
+        return
+
+    report.updated += len(existing)
+    report.created += len(products) - len(existing)
+    for product in products:
+        affected.add((product.pk, product.category_id))
+        if product.sku in existing:
+            affected.add((product.pk, existing[product.sku]))
@@ -0,0 +1,103 @@
+import asyncio
+import statistics
+import time
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from api.models import Category, Product
+
+BENCH_CATEGORY = "bench-asgi"
+
+
+# Minimal in-process ASGI client: one GET, returns (status, seconds)
+async def asgi_get(app, path, query=""):
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": query.encode(),
+        "headers": [(b"host", b"testserver"), (b"accept", b"application/json")],
+        "client": ("127.0.0.1", 0), "server": ("testserver", 80),
+    }
+    received = False
+    status = None
+
+    async def receive():
+        nonlocal received
+        if received:
+            await asyncio.Event().wait()  # like a client keeping the socket open
+        received = True
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    started = time.perf_counter()
+    await app(scope, receive, send)
+    return status, time.perf_counter() - started
+
+
+# Compare concurrent-request throughput of the sync product/category views with
+# their native async counterparts, through Django's ASGI handler in-process.
+# The working set is a rotation of list pages, so after the first pass most
+# requests are cache hits, as in production. Point this at a scratch database.
+class Command(BaseCommand):
+    help = "Benchmark sync vs async product and category endpoints under concurrent ASGI load."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64, 256])
+        parser.add_argument("--products", type=int, default=500)
+
+    def handle(self, *args, **options):
+        category_id = self.ensure_products(options["products"])
+        queries = [f"page={page}" for page in range(1, 6)]
+        queries += [f"category={category_id}&ordering=-price", "in_stock=true&page_size=20", "ordering=created_at"]
+        targets = (
+            ("products", "/api/products/", "/api/async/products/", queries),
+            ("categories", "/api/categories/", "/api/async/categories/", [""]),
+        )
+        app = get_asgi_application()
+        for label, sync_path, async_path, target_queries in targets:
+            for concurrency in options["concurrency"]:
+                for kind, path in (("sync", sync_path), ("async", async_path)):
+                    stats = asyncio.run(self.run(app, path, target_queries, options["requests"], concurrency))
+                    self.stdout.write(
+                        f"{label:>10} {kind:>5} c={concurrency:<4} {stats['rps']:8.0f} req/s  "
+                        f"p50={stats['p50']:.1f}ms p95={stats['p95']:.1f}ms errors={stats['errors']}"
+                    )
+
+    @staticmethod
+    async def run(app, path, queries, total, concurrency):
+        # warm the cache so both variants are measured on the same hit ratio
+        for query in queries:
+            await asgi_get(app, path, query)
+        remaining = iter(range(total))
+        timings, errors = [], 0
+
+        async def worker():
+            nonlocal errors
+            for i in remaining:
+                status, elapsed = await asgi_get(app, path, queries[i % len(queries)])
+                timings.append(elapsed * 1000)
+                errors += status != 200
+
+        started = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        wall = time.perf_counter() - started
+        timings.sort()
+        return {
+            "rps": total / wall,
+            "p50": statistics.median(timings),
+            "p95": timings[int(len(timings) * 0.95) - 1],
+            "errors": errors,
+        }
+
+    def ensure_products(self, target):
+        category, _ = Category.objects.get_or_create(name=BENCH_CATEGORY)
+        existing = Product.objects.filter(category=category).count()
+        if existing < target:
+            Product.objects.bulk_create([
+                Product(name=f"Bench product {i}", price=1 + i % 500, stock=i % 7, category=category)
+                for i in range(existing, target)
+            ])
+        return category.id
@@ -0,0 +1,123 @@
+import threading
+import time
+from types import SimpleNamespace
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from api.benchmark import percentile
+from api.checkout import BATCH_SIZE, InMemoryQueue, RedisStreamQueue, run_worker, submit
+from api.models import Category, Product, Order
+from api.serializers import OrderSerializer
+from api.views import save_order
+
+User = get_user_model()
+
+
+# Benchmark sustained order placement: concurrent buyers placing carts through
+# the synchronous path (what POST /orders/ does in the request), then through
+# asynchronous checkout (api.checkout) with a pool of batching workers.
+# Creates its own fixtures and removes them afterwards.
+class Command(BaseCommand):
+    help = "Compare sustained orders/sec of synchronous and asynchronous checkout."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--buyers", type=int, default=16)
+        parser.add_argument("--orders", type=int, default=25, help="orders per buyer")
+        parser.add_argument("--items", type=int, default=5, help="lines per cart")
+        parser.add_argument("--workers", type=int, default=2, help="checkout workers")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+        parser.add_argument("--queue", choices=["memory", "redis"], default="memory")
+        parser.add_argument("--timeout", type=float, default=300, help="seconds to wait for the workers")
+
+    def handle(self, *args, **options):
+        category = Category.objects.create(name=f"bench-checkout-{time.time_ns()}")
+        products = Product.objects.bulk_create([
+            Product(name=f"bench sku {i}", price=10 + i, stock=10**9, category=category) for i in range(options["items"])
+        ])
+        users = [User.objects.create_user(username=f"bench-{category.id}-{i}") for i in range(options["buyers"])]
+        cart = [{"product_id": product.id, "quantity": 1} for product in products]
+        try:
+            self.report("sync", *self.run_sync(users, cart, options))
+            self.report("async", *self.run_async(users, cart, options))
+        finally:
+            Order.objects.filter(user__in=users).delete()
+            category.delete()
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
+
+    def report(self, mode, placed, elapsed, latencies):
+        latencies.sort()
+        self.stdout.write(
+            f"[{mode}] orders={placed} elapsed={elapsed:.2f}s orders/sec={placed / elapsed:.1f} "
+            f"request p50={percentile(latencies, 50):.2f}ms p95={percentile(latencies, 95):.2f}ms"
+        )
+
+    def buyers(self, users, options, place):
+        latencies = []
+        lock = threading.Lock()
+
+        def buyer(user):
+            try:
+                for _ in range(options["orders"]):
+                    started = time.perf_counter()
+                    place(user)
+                    elapsed = (time.perf_counter() - started) * 1000
+                    with lock:
+                        latencies.append(elapsed)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buyer, args=(user,)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return latencies
+
+    # what the request does: validate, then place the order and queue its notification
+    def run_sync(self, users, cart, options):
+        def place(user):
+            serializer = OrderSerializer(data={"items": cart}, context={"request": SimpleNamespace(user=user)})
+            serializer.is_valid(raise_exception=True)
+            save_order(serializer)
+
+        started = time.perf_counter()
+        latencies = self.buyers(users, options, place)
+        elapsed = time.perf_counter() - started
+        return Order.objects.filter(user__in=users).count(), elapsed, latencies
+
+    # the request validates and submits; workers place the orders
+    def run_async(self, users, cart, options):
+        stream = f"checkout-bench-{time.time_ns()}"
+        if options["queue"] == "redis":
+            queues = [RedisStreamQueue(stream=stream) for _ in range(options["workers"] + 1)]
+        else:
+            queues = [InMemoryQueue()] * (options["workers"] + 1)
+        stop = threading.Event()
+        workers = [
+            threading.Thread(target=run_worker, args=(worker_queue, options["batch_size"], 0.1, stop))
+            for worker_queue in queues[1:]
+        ]
+        for worker in workers:
+            worker.start()
+        placed_before = Order.objects.filter(user__in=users).count()
+        expected = placed_before + len(users) * options["orders"]
+
+        def place(user):
+            serializer = OrderSerializer(data={"items": cart}, context={"request": SimpleNamespace(user=user)})
+            serializer.is_valid(raise_exception=True)
+            submit(user.id, serializer.validated_data["items"], queues[0])
+
+        started = time.perf_counter()
+        try:
+            latencies = self.buyers(users, options, place)
+            deadline = started + options["timeout"]
+            while (placed := Order.objects.filter(user__in=users).count()) < expected and time.perf_counter() < deadline:
+                time.sleep(0.05)
+            elapsed = time.perf_counter() - started
+        finally:
+            stop.set()
+            for worker in workers:
+                worker.join()
+            if options["queue"] == "redis":
+                queues[0].redis.delete(stream)
+        return placed - placed_before, elapsed, latencies
@@ -0,0 +1,101 @@
+import json
+import subprocess
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from api.benchmark import auth_headers, measure, read_endpoints
+
+User = get_user_model()
+
+
+# Latency percentiles, throughput and query counts for every read endpoint of
+# the API (see api.benchmark), authenticated as an admin so admin-only routes
+# are included. Results can be written as JSON and compared with an earlier
+# run. Fill the database first, e.g. with generate_data; use a scratch database.
+class Command(BaseCommand):
+    help = "Benchmark p50/p95/p99 latency, throughput and query counts of the API read endpoints."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200, help="measured requests per endpoint")
+        parser.add_argument("--concurrency", type=int, default=1)
+        parser.add_argument("--warmup", type=int, default=5)
+        parser.add_argument("--cold", action="store_true", help="invalidate cached pages before every request")
+        parser.add_argument("--endpoint", action="append", help="only these endpoint names (repeatable)")
+        parser.add_argument("--user", help="username to authenticate as (default: the first superuser)")
+        parser.add_argument("--host", default="localhost", help="Host header; must be in ALLOWED_HOSTS")
+        parser.add_argument("--output", help="write the results to this JSON file")
+        parser.add_argument("--compare", help="JSON file of an earlier run to compare with")
+
+    def handle(self, *args, **options):
+        user = self.user(options["user"])
+        headers = auth_headers(user)
+        endpoints = read_endpoints()
+        if options["endpoint"]:
+            endpoints = [(name, path) for name, path in endpoints if name in options["endpoint"]]
+        baseline = self.load(options["compare"]) if options["compare"] else {}
+        results = {}
+        for name, path in endpoints:
+            result = measure(
+                path, headers, requests=options["requests"], concurrency=options["concurrency"],
+                warmup=options["warmup"], cold=options["cold"], host=options["host"],
+            )
+            results[name] = result
+            line = (
+                f"{name:<28} {result['rps']:8.0f} req/s  p50={result['p50_ms']:7.2f}ms "
+                f"p95={result['p95_ms']:7.2f}ms p99={result['p99_ms']:7.2f}ms "
+                f"queries={result['queries']:<3} errors={result['errors']}"
+            )
+            if name in baseline:
+                before = baseline[name]
+                line += f"  p95 {self.change(before['p95_ms'], result['p95_ms'])}, rps {self.change(before['rps'], result['rps'])}"
+                if before["queries"] != result["queries"]:
+                    line += f", queries {before['queries']} -> {result['queries']}"
+            self.stdout.write(line)
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump({"meta": self.meta(options), "results": results}, output, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+
+    @staticmethod
+    def user(username):
+        if username:
+            user = User.objects.filter(username=username).first()
+        else:
+            user = User.objects.filter(is_superuser=True).order_by("pk").first()
+        if user is None:
+            raise CommandError("No user to authenticate as; pass --user or create a superuser.")
+        return user
+
+    @staticmethod
+    def load(path):
+        try:
+            with open(path) as baseline:
+                return json.load(baseline)["results"]
+        except (OSError, ValueError, KeyError) as exc:
+            raise CommandError(f"Can't read {path}: {exc}")
+
+    @staticmethod
+    def change(before, after):
+        if not before:
+            return "n/a"
+        return f"{(after - before) / before * 100:+.1f}%"
+
+    @staticmethod
+    def meta(options):
+        try:
+            commit = subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=settings.BASE_DIR,
+            ).stdout.strip() or None
+        except OSError:
+            commit = None
+        return {
+            "started_at": timezone.now().isoformat(),
+            "commit": commit,
+            "database": connection.vendor,
+            "cache": settings.CACHES["default"]["BACKEND"],
+            "options": {
+                name: options[name] for name in ("requests", "concurrency", "warmup", "cold", "endpoint", "host")
+            },
+        }
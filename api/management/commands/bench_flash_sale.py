@@ -0,0 +1,94 @@
+import threading
+import time
+from types import SimpleNamespace
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from api.benchmark import percentile
+from api.flashsale import end_flash_sale, start_flash_sale
+from api.models import Category, Product, Order
+from api.serializers import OrderSerializer
+
+User = get_user_model()
+
+
+# Benchmark a drop: many concurrent buyers, far more attempts than stock, all
+# for one hot SKU, first on the database path and then in flash-sale mode
+# (api.flashsale). Creates its own fixtures and removes them afterwards.
+class Command(BaseCommand):
+    help = "Compare order placement for a sold-out hot SKU with and without flash-sale admission."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--buyers", type=int, default=32)
+        parser.add_argument("--attempts", type=int, default=20, help="orders each buyer tries to place")
+        parser.add_argument("--stock", type=int, default=100, help="units of the hot SKU on sale")
+        parser.add_argument("--mode", choices=["both", "db", "flash"], default="both")
+
+    def handle(self, *args, **options):
+        category = Category.objects.create(name=f"bench-flash-{time.time_ns()}")
+        users = [User.objects.create_user(username=f"bench-{category.id}-{i}") for i in range(options["buyers"])]
+        try:
+            modes = ["db", "flash"] if options["mode"] == "both" else [options["mode"]]
+            for mode in modes:
+                self.run(mode, category, users, options)
+        finally:
+            Order.objects.filter(user__in=users).delete()
+            category.delete()
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
+
+    def run(self, mode, category, users, options):
+        stock = options["stock"]
+        product = Product.objects.create(name=f"hot sku ({mode})", price=10, stock=stock, category=category)
+        if mode == "flash":
+            start_flash_sale(product.id)
+        cart = [{"product_id": product.id, "quantity": 1}]
+        placed, rejected, errors = [0], [], {}
+        lock = threading.Lock()
+
+        def buyer(user):
+            request = SimpleNamespace(user=user)
+            try:
+                for _ in range(options["attempts"]):
+                    serializer = OrderSerializer(data={"items": cart}, context={"request": request})
+                    serializer.is_valid(raise_exception=True)
+                    started = time.perf_counter()
+                    try:
+                        serializer.save()
+                        ok = True
+                    except Exception as exc:
+                        ok = False
+                        reason = f"{type(exc).__name__}: {exc}"
+                    elapsed = (time.perf_counter() - started) * 1000
+                    with lock:
+                        if ok:
+                            placed[0] += 1
+                        else:
+                            rejected.append(elapsed)
+                            errors[reason] = errors.get(reason, 0) + 1
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buyer, args=(user,)) for user in users]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        if mode == "flash":
+            end_flash_sale(product.id)
+
+        product.refresh_from_db()
+        attempts = len(users) * options["attempts"]
+        rejected.sort()
+        self.stdout.write(f"[{mode}] attempts={attempts} placed={placed[0]} rejected={len(rejected)}")
+        self.stdout.write(f"[{mode}] elapsed={elapsed:.2f}s attempts/sec={attempts / elapsed:.1f}")
+        if rejected:
+            self.stdout.write(
+                f"[{mode}] rejection p50={percentile(rejected, 50):.2f}ms p95={percentile(rejected, 95):.2f}ms"
+            )
+        sold = stock - product.stock
+        verdict = "ok" if sold == placed[0] and placed[0] <= stock else "MISMATCH"
+        self.stdout.write(f"[{mode}] units sold={sold} of {stock}, orders={placed[0]} ({verdict})")
+        for reason, count in sorted(errors.items(), key=lambda item: -item[1]):
+            self.stdout.write(f"  {count} x {reason}")
@@ -0,0 +1,76 @@
+import threading
+import time
+from types import SimpleNamespace
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from api.models import Category, Product, Order
+from api.serializers import OrderSerializer
+
+User = get_user_model()
+
+
+# Benchmark order placement: concurrent buyers posting large carts that all
+# contain the same hot SKU. Creates its own fixtures and removes them afterwards.
+class Command(BaseCommand):
+    help = "Measure orders/sec for concurrent buyers placing large carts that share a hot SKU."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--buyers", type=int, default=32)
+        parser.add_argument("--items", type=int, default=50, help="lines per cart")
+        parser.add_argument("--orders", type=int, default=20, help="orders per buyer")
+
+    def handle(self, *args, **options):
+        buyers, items, orders = options["buyers"], options["items"], options["orders"]
+        category = Category.objects.create(name=f"bench-orders-{time.time_ns()}")
+        products = Product.objects.bulk_create([
+            Product(name=f"bench sku {i}", price=10 + i, stock=10**9, category=category)
+            for i in range(items)
+        ])
+        users = [User.objects.create_user(username=f"bench-{category.id}-{i}") for i in range(buyers)]
+        # every cart starts with the hot SKU (products[0])
+        cart = [{"product_id": product.id, "quantity": 1} for product in products]
+
+        placed, failed, errors = [0], [0], {}
+        lock = threading.Lock()
+
+        def buyer(user):
+            request = SimpleNamespace(user=user)
+            try:
+                for _ in range(orders):
+                    serializer = OrderSerializer(data={"items": cart}, context={"request": request})
+                    serializer.is_valid(raise_exception=True)
+                    try:
+                        serializer.save()
+                        ok = True
+                    except Exception as exc:
+                        # stock errors and lock timeouts both count as failed orders
+                        ok = False
+                        reason = f"{type(exc).__name__}: {exc}"
+                    with lock:
+                        if ok:
+                            placed[0] += 1
+                        else:
+                            failed[0] += 1
+                            errors[reason] = errors.get(reason, 0) + 1
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buyer, args=(user,)) for user in users]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        hot = Product.objects.get(pk=products[0].pk)
+        self.stdout.write(f"buyers={buyers} cart_lines={items} orders_placed={placed[0]} failed={failed[0]}")
+        self.stdout.write(f"elapsed={elapsed:.2f}s orders/sec={placed[0] / elapsed:.1f}")
+        self.stdout.write(f"hot sku units sold={10**9 - hot.stock} (expected {placed[0]})")
+        for reason, count in sorted(errors.items(), key=lambda item: -item[1]):
+            self.stdout.write(f"  {count} x {reason}")
+
+        Order.objects.filter(user__in=users).delete()
+        category.delete()
+        User.objects.filter(pk__in=[user.pk for user in users]).delete()
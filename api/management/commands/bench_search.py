@@ -0,0 +1,93 @@
+import random
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from api.models import Category, Product
+from api.search import search_products, rebuild_index
+
+SYLLABLES = "ka lo mi ne ru sa ti vo ze xa bri cor dal fen gor hul jin kel mon pra".split()
+BENCH_CATEGORY = "bench-search"
+
+
+# Deterministic pseudo-word vocabulary; text draws words with a Zipf-like
+# skew so a few terms are common and most are selective, as in real catalogues
+def vocabulary(rng, size=20000):
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))))
+    words = sorted(words)
+    rng.shuffle(words)
+    weights = [1 / (rank + 1) for rank in range(size)]
+    return words, weights
+
+
+# Compare ranked full-text search against the previous icontains search.
+# Products are generated once into a "bench-search" category and reused by
+# later runs; point this at a scratch database.
+class Command(BaseCommand):
+    help = "Benchmark full-text product search against icontains at catalogue scale."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=1_000_000)
+        parser.add_argument("--queries", type=int, default=50)
+        parser.add_argument("--seed", type=int, default=7)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        words, weights = vocabulary(rng)
+        self.ensure_products(options["products"], rng, words, weights)
+        # separate stream so the query set is the same whether or not data was generated
+        query_rng = random.Random(options["seed"] + 1)
+        terms = [
+            " ".join(query_rng.choices(words, weights, k=query_rng.choice((1, 2))))
+            for _ in range(options["queries"])
+        ]
+        # a search request costs a page fetch plus the pagination COUNT(*)
+        for label, run in (("icontains", self.icontains), ("full-text", self.fulltext)):
+            timings = []
+            for term in terms:
+                started = time.perf_counter()
+                run(term)
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            self.stdout.write(
+                f"{label:>10}: p50={statistics.median(timings):.1f}ms "
+                f"p95={timings[int(len(timings) * 0.95) - 1]:.1f}ms max={timings[-1]:.1f}ms"
+            )
+
+    @staticmethod
+    def icontains(term):
+        queryset = Product.objects.all()
+        for token in term.split():
+            queryset = queryset.filter(Q(name__icontains=token) | Q(description__icontains=token))
+        queryset.count()
+        list(queryset.order_by("id")[:10])
+
+    @staticmethod
+    def fulltext(term):
+        queryset = search_products(Product.objects.all(), term)
+        queryset.count()
+        list(queryset[:10])
+
+    def ensure_products(self, target, rng, words, weights):
+        category, _ = Category.objects.get_or_create(name=BENCH_CATEGORY)
+        existing = Product.objects.filter(category=category).count()
+        if existing >= target:
+            return
+        self.stdout.write(f"Generating {target - existing} products...")
+        batch = []
+        for i in range(existing, target):
+            batch.append(Product(
+                name=" ".join(rng.choices(words, weights, k=3)).title(),
+                description=" ".join(rng.choices(words, weights, k=20)),
+                price=rng.randint(100, 100000) / 100,
+                stock=rng.randint(0, 500),
+                category=category,
+            ))
+            if len(batch) == 5000:
+                Product.objects.bulk_create(batch)
+                batch = []
+        Product.objects.bulk_create(batch)
+        # bulk_create skips the signals that maintain the index
+        rebuild_index()
@@ -0,0 +1,88 @@
+import time
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from api.models import Category, Product, Order, OrderItem
+from api.renderers import ORJSONRenderer
+from api.serializers import OrderSerializer, ProductSerializer
+from api.fast_serializers import order_rows, order_values, product_rows, product_values
+
+BENCH_CATEGORY_PREFIX = "bench-serializers"
+BENCH_USER = "bench-serializers"
+
+
+# Rows/sec of the model serializers + JSONRenderer against the values-based
+# fast path + ORJSONRenderer, fetching and rendering pages as the list
+# endpoints do. Data is generated once and reused; point this at a scratch database.
+class Command(BaseCommand):
+    help = "Benchmark DRF serializers against the fast read-path serialization."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=5000)
+        parser.add_argument("--orders", type=int, default=1000)
+        parser.add_argument("--page-size", type=int, default=100)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        self.ensure_data(options["products"], options["orders"])
+        products = Product.objects.filter(category__name__startswith=BENCH_CATEGORY_PREFIX).order_by("id")
+        orders = Order.objects.filter(user__username=BENCH_USER).order_by("id")
+        page_size = options["page_size"]
+        cases = (
+            ("products", products, page_size,
+             lambda qs: JSONRenderer().render(ProductSerializer(qs.select_related("category"), many=True).data),
+             lambda qs: ORJSONRenderer().render(product_rows(product_values(qs)))),
+            ("orders", orders, page_size,
+             lambda qs: JSONRenderer().render(OrderSerializer(qs.prefetch_related("items__product__category"), many=True).data),
+             lambda qs: ORJSONRenderer().render(order_rows(order_values(qs)))),
+        )
+        for label, queryset, size, drf, fast in cases:
+            # pages by primary key, so the timings are about serialization, not OFFSET scans
+            ids = list(queryset.values_list("id", flat=True))
+            total = len(ids)
+            model = queryset.model
+            pages = [model.objects.filter(id__in=ids[offset:offset + size]).order_by("id") for offset in range(0, total, size)]
+            identical = all(drf(page) == fast(page) for page in pages[:3])
+            results = {}
+            for name, render in (("serializers", drf), ("fast path", fast)):
+                best = min(self.timed(render, pages) for _ in range(options["repeat"]))
+                results[name] = total / best
+                self.stdout.write(f"{label:>8} {name:>11}: {results[name]:10.0f} rows/s")
+            self.stdout.write(
+                f"{label:>8}    speed-up: {results['fast path'] / results['serializers']:.1f}x "
+                f"(identical output: {'yes' if identical else 'NO'})"
+            )
+
+    @staticmethod
+    def timed(render, pages):
+        started = time.perf_counter()
+        for page in pages:
+            render(page)
+        return time.perf_counter() - started
+
+    def ensure_data(self, product_count, order_count):
+        categories = [
+            Category.objects.get_or_create(name=f"{BENCH_CATEGORY_PREFIX}-{i}", defaults={"description": f"Category {i}"})[0]
+            for i in range(20)
+        ]
+        existing = Product.objects.filter(category__in=categories).count()
+        if existing < product_count:
+            Product.objects.bulk_create([
+                Product(
+                    name=f"Product {i}", description="A fairly ordinary product description " * 3,
+                    price=f"{1 + i % 997}.{i % 100:02d}", stock=i % 50, category=categories[i % len(categories)],
+                )
+                for i in range(existing, product_count)
+            ], batch_size=2000)
+        user, _ = get_user_model().objects.get_or_create(username=BENCH_USER)
+        existing = Order.objects.filter(user=user).count()
+        if existing < order_count:
+            product_ids = list(Product.objects.filter(category__in=categories).values_list("id", flat=True)[:500])
+            new_orders = Order.objects.bulk_create([
+                Order(user=user, total_price=0) for _ in range(existing, order_count)
+            ])
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product_id=product_ids[(order.id * 7 + line) % len(product_ids)],
+                          quantity=1 + line, price_at_purchase="9.99")
+                for order in new_orders for line in range(3)
+            ], batch_size=2000)
@@ -0,0 +1,131 @@
+import asyncio
+import json
+import resource
+import statistics
+import time
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from api.benchmark import WebSocketClient, percentile
+from api.outbox import user_group
+from api.routing import websocket_urlpatterns
+from api.websocket import ConnectionAdmission, JWTAuthMiddleware
+
+IN_MEMORY_LAYER = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+
+
+def _summary(timings):
+    timings = sorted(timings)
+    if not timings:
+        return {"count": 0}
+    return {
+        "count": len(timings),
+        "mean_ms": round(statistics.fmean(timings), 3),
+        "p50_ms": round(percentile(timings, 50), 3),
+        "p95_ms": round(percentile(timings, 95), 3),
+        "p99_ms": round(percentile(timings, 99), 3),
+    }
+
+
+# Connection storm against OrderConsumer behind JWTAuthMiddleware, in-process
+# on an in-memory channel layer: open --connections sockets with at most
+# --concurrency handshakes in flight, send every user one order notification
+# and time its delivery, then close everything. Any database access on the
+# connect path would fail here, as it runs in the event loop.
+class Command(BaseCommand):
+    help = "Open thousands of concurrent order WebSockets and measure handshakes, admission and notification fan-out."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--connections", type=int, default=5000)
+        parser.add_argument("--users", type=int, default=1000, help="distinct users the sockets belong to")
+        parser.add_argument("--concurrency", type=int, default=500, help="handshakes in flight at once")
+        parser.add_argument("--rate", type=float, help="admitted handshakes per second (default: unlimited)")
+        parser.add_argument("--burst", type=int, help="admission burst (default: --connections)")
+        parser.add_argument("--max-connections", type=int, help="open socket cap (default: --connections)")
+        parser.add_argument("--timeout", type=float, default=10, help="seconds to wait for each handshake or message")
+        parser.add_argument("--output", help="write the results to this JSON file")
+
+    def handle(self, *args, **options):
+        connections = options["connections"]
+        admission = ConnectionAdmission(
+            rate=options["rate"] or float("inf"),
+            burst=options["burst"] or connections,
+            max_connections=options["max_connections"] or connections,
+        )
+        with override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYER):
+            results = asyncio.run(self.storm(admission, options))
+        connect, delivery = results["connect"], results["delivery"]
+        self.stdout.write(
+            f"connect   {results['opened']}/{connections} open ({results['refused']} refused) "
+            f"{results['connects_per_second']:.0f}/s  p50={connect.get('p50_ms', 0):.2f}ms "
+            f"p95={connect.get('p95_ms', 0):.2f}ms p99={connect.get('p99_ms', 0):.2f}ms"
+        )
+        self.stdout.write(
+            f"fan-out   {delivery['count']} delivered ({results['lost']} lost)  p50={delivery.get('p50_ms', 0):.2f}ms "
+            f"p95={delivery.get('p95_ms', 0):.2f}ms p99={delivery.get('p99_ms', 0):.2f}ms"
+        )
+        self.stdout.write(f"max RSS   {results['max_rss_mb']:.0f} MiB")
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump({"options": {k: options[k] for k in (
+                    "connections", "users", "concurrency", "rate", "burst", "max_connections",
+                )}, "results": results}, output, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+
+    async def storm(self, admission, options):
+        app = JWTAuthMiddleware(URLRouter(websocket_urlpatterns), admission)
+        users = max(1, options["users"])
+        tokens = []
+        for user_id in range(1, users + 1):
+            token = AccessToken()
+            token["user_id"] = str(user_id)
+            tokens.append(str(token))
+        gate = asyncio.Semaphore(options["concurrency"])
+        timeout = options["timeout"]
+        sockets, connect_ms = [], []
+
+        async def open_socket(number):
+            client = WebSocketClient(app, f"/ws/orders/?token={tokens[number % users]}")
+            async with gate:
+                started = time.perf_counter()
+                connected, _ = await client.connect(timeout)
+                connect_ms.append((time.perf_counter() - started) * 1000)
+            if connected:
+                sockets.append(client)
+            else:
+                await client.wait(timeout)
+
+        started = time.perf_counter()
+        await asyncio.gather(*[open_socket(number) for number in range(options["connections"])])
+        connect_seconds = time.perf_counter() - started
+
+        # one notification per user, received by each of that user's sockets
+        channel_layer = get_channel_layer()
+        sent_at = time.perf_counter()
+        await asyncio.gather(*[
+            channel_layer.group_send(user_group(user_id), {"type": "order.notification", "order_id": user_id, "status": "shipped"})
+            for user_id in range(1, users + 1)
+        ])
+        delivery_ms, lost = [], 0
+
+        async def receive(client):
+            nonlocal lost
+            try:
+                await client.receive(timeout)
+                delivery_ms.append((time.perf_counter() - sent_at) * 1000)
+            except asyncio.TimeoutError:
+                lost += 1
+
+        await asyncio.gather(*[receive(client) for client in sockets])
+        await asyncio.gather(*[client.disconnect(timeout=timeout) for client in sockets])
+        return {
+            "opened": len(sockets),
+            "refused": admission.refused,
+            "connects_per_second": round(len(sockets) / connect_seconds, 1) if connect_seconds else 0,
+            "connect": _summary(connect_ms),
+            "delivery": _summary(delivery_ms),
+            "lost": lost,
+            "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        }
@@ -0,0 +1,33 @@
+import asyncio
+from django.core.management.base import BaseCommand
+from api.outbox import BATCH_SIZE, dispatch_batch, run_dispatcher
+
+
+# Long-running dispatcher that delivers outbox messages to the channel layer
+class Command(BaseCommand):
+    help = "Deliver queued order notifications from the outbox to WebSocket groups."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+        parser.add_argument("--interval", type=float, default=0.5, help="seconds to wait when the outbox is empty")
+        parser.add_argument("--once", action="store_true", help="deliver what is due and exit")
+
+    def handle(self, *args, **options):
+        if options["once"]:
+            total = asyncio.run(self.drain(options["batch_size"]))
+            self.stdout.write(f"Dispatched {total} message(s).")
+            return
+        self.stdout.write("Dispatching outbox messages (Ctrl+C to stop)...")
+        try:
+            asyncio.run(run_dispatcher(options["interval"], options["batch_size"]))
+        except KeyboardInterrupt:
+            pass
+
+    @staticmethod
+    async def drain(batch_size):
+        total = 0
+        while True:
+            claimed = await dispatch_batch(limit=batch_size)
+            total += claimed
+            if claimed < batch_size:
+                return total
@@ -0,0 +1,42 @@
+import logging
+import time
+from django.core.management.base import BaseCommand
+from api.reservations import SWEEP_BATCH_SIZE, expire_reservations
+
+logger = logging.getLogger(__name__)
+
+
+# Long-running sweeper that expires stock reservations past their expiry
+class Command(BaseCommand):
+    help = "Expire timed stock reservations and return their units, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=SWEEP_BATCH_SIZE)
+        parser.add_argument("--interval", type=float, default=5.0, help="seconds to wait when nothing is due")
+        parser.add_argument("--once", action="store_true", help="expire what is due and exit")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        if options["once"]:
+            total = 0
+            while True:
+                expired = expire_reservations(batch_size)
+                total += expired
+                if expired < batch_size:
+                    break
+            self.stdout.write(f"Expired {total} reservation(s).")
+            return
+        self.stdout.write("Expiring reservations (Ctrl+C to stop)...")
+        try:
+            while True:
+                # a failed sweep (e.g. the database briefly locked) is retried
+                # after the interval
+                try:
+                    expired = expire_reservations(batch_size)
+                except Exception:
+                    logger.exception("Reservation sweep failed")
+                    expired = 0
+                if expired < batch_size:
+                    time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from api.datagen import PASSWORD, generate
+
+
+# Fill a scratch database with a synthetic catalogue and order history for
+# load tests and benchmarks (see api.datagen); reruns add another batch
+class Command(BaseCommand):
+    help = "Generate categories, products, users and orders with items at a configurable scale."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--categories", type=int, default=20)
+        parser.add_argument("--products", type=int, default=10_000)
+        parser.add_argument("--users", type=int, default=1_000)
+        parser.add_argument("--orders", type=int, default=20_000)
+        parser.add_argument("--max-items", type=int, default=5, help="lines per order, at most")
+        parser.add_argument("--days", type=int, default=90, help="orders are spread over this many past days")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--prefix", default="load", help="prefix of generated category and user names")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        counts = generate(
+            categories=options["categories"], products=options["products"], users=options["users"],
+            orders=options["orders"], max_items=options["max_items"], days=options["days"],
+            seed=options["seed"], prefix=options["prefix"], batch_size=options["batch_size"],
+        )
+        summary = ", ".join(f"{count} {name.replace('_', ' ')}" for name, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Generated {summary}."))
+        self.stdout.write(f"Generated users log in with the password {PASSWORD!r}.")
@@ -0,0 +1,38 @@
+import json
+import os
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from api.ingest import BATCH_SIZE, FORMATS, decode_lines, upsert_products
+
+
+# Bulk upsert products by SKU from an NDJSON or CSV file (or stdin)
+class Command(BaseCommand):
+    help = "Create or update products by SKU from an NDJSON or CSV file; '-' reads stdin."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=FORMATS, help="defaults to the file extension")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson"}.get(
+            os.path.splitext(path)[1].lower()
+        )
+        if fmt is None:
+            raise CommandError("Cannot tell the format from the file name; pass --format.")
+        try:
+            stream = sys.stdin.buffer if path == "-" else open(path, "rb")
+        except OSError as exc:
+            raise CommandError(exc)
+        try:
+            report = upsert_products(decode_lines(stream), fmt, batch_size=options["batch_size"])
+        except UnicodeDecodeError:
+            raise CommandError("Input is not valid UTF-8.")
+        finally:
+            stream.close()
+        for error in report.errors:
+            self.stderr.write(json.dumps(error))
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {report.created}, updated {report.updated}, failed {report.error_count}."
+        ))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from api.analytics import rebuild_rollups
+
+
+# Recompute the daily sales rollups from orders, e.g. to backfill them or after
+# orders were changed outside the API; --start/--end limit it to a range of days
+class Command(BaseCommand):
+    help = "Rebuild the daily sales rollups from orders and order items."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start", help="first day to rebuild (YYYY-MM-DD)")
+        parser.add_argument("--end", help="last day to rebuild (YYYY-MM-DD)")
+
+    def handle(self, *args, **options):
+        days = {}
+        for name in ("start", "end"):
+            if options[name]:
+                days[name] = parse_date(options[name])
+                if days[name] is None:
+                    raise CommandError(f"--{name} must be a date (YYYY-MM-DD).")
+        written = rebuild_rollups(**days)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt sales rollups ({written} rows)."))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from api.search import rebuild_index
+
+
+# Rebuild the product full-text index, e.g. after raw SQL imports or restores
+class Command(BaseCommand):
+    help = "Rebuild the product full-text search index."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt product search index ({connection.vendor})."))
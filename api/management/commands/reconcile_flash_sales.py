@@ -0,0 +1,32 @@
+import logging
+import time
+from django.core.management.base import BaseCommand
+from api.flashsale import reconcile
+
+logger = logging.getLogger(__name__)
+
+# Long-running reconciler that writes flash-sale stock from Redis to the product rows
+class Command(BaseCommand):
+    help = "Write the Redis stock of running flash sales back to their products."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=float, default=1.0, help="seconds between reconciliations")
+        parser.add_argument("--once", action="store_true", help="reconcile once and exit")
+
+    def handle(self, *args, **options):
+        if options["once"]:
+            stocks = reconcile()
+            self.stdout.write(f"Reconciled {len(stocks)} flash sale(s).")
+            return
+        self.stdout.write("Reconciling flash sales (Ctrl+C to stop)...")
+        try:
+            while True:
+                # a failed pass (e.g. Redis or the database briefly away) is
+                # retried at the next one
+                try:
+                    reconcile()
+                except Exception:
+                    logger.exception("Flash sale reconciliation failed")
+                time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,36 @@
+import threading
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+from api.checkout import BATCH_SIZE, QUEUE, InMemoryQueue, run_worker
+
+
+# Long-running pool of checkout workers placing asynchronously submitted orders
+class Command(BaseCommand):
+    help = "Place orders submitted with asynchronous checkout, in batched transactions."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+        parser.add_argument("--timeout", type=float, default=1.0, help="seconds to wait for submissions per poll")
+
+    def handle(self, *args, **options):
+        queue_class = import_string(QUEUE)
+        if issubclass(queue_class, InMemoryQueue):
+            raise CommandError(f"{QUEUE} lives in the web process; set CHECKOUT_QUEUE to a shared queue.")
+        stop = threading.Event()
+        # one queue (stream consumer) per thread
+        threads = [
+            threading.Thread(target=run_worker, args=(queue_class(), options["batch_size"], options["timeout"], stop))
+            for _ in range(options["workers"])
+        ]
+        for thread in threads:
+            thread.start()
+        self.stdout.write(f"{len(threads)} checkout worker(s) running (Ctrl+C to stop)...")
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(0.5)
+        except KeyboardInterrupt:
+            stop.set()
+            for thread in threads:
+                thread.join()
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from api.cache import invalidate_category
+from api.summaries import find_drift, recompute_summaries
+
+
+# Compare the stored category summaries with the products and, with --repair,
+# rewrite the ones that drifted (e.g. after raw SQL or bulk writes)
+class Command(BaseCommand):
+    help = "Check the denormalized category summaries against the products, and optionally repair them."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repair", action="store_true", help="rewrite drifted summaries")
+
+    def handle(self, *args, **options):
+        drift = find_drift()
+        for category, actual in drift:
+            stored = {field: getattr(category, field) for field in actual}
+            self.stdout.write(f"Category {category.pk}: stored {stored}, actual {actual}")
+        if not drift:
+            self.stdout.write(self.style.SUCCESS("Category summaries are consistent."))
+        elif options["repair"]:
+            repaired = recompute_summaries([category.pk for category, _ in drift])
+            for category, _ in repaired:
+                invalidate_category(category.pk)
+            self.stdout.write(self.style.SUCCESS(f"Repaired {len(repaired)} category summaries."))
+        else:
+            self.stdout.write(self.style.WARNING(f"{len(drift)} category summaries drifted; run with --repair."))
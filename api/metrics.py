@@ -0,0 +1,329 @@
+import functools
+import heapq
+import logging
+import random
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils import timezone
+
+# Request, database, cache and channel-layer instrumentation.
+# MetricsMiddleware labels every request with its URL name and viewset action;
+# a database execute wrapper (installed on each connection) and the cache
+# backends report into the current request, and everything is aggregated in a
+# process-wide registry rendered in the Prometheus text format (see
+# views.metrics). Figures are per worker process. Requests slower than
+# METRICS_SLOW_REQUEST_MS are sampled with their slowest SQL statements and
+# logged at INFO, or at WARNING past METRICS_SLOW_REQUEST_WARNING_MS.
+
+logger = logging.getLogger(__name__)
+
+ENABLED = getattr(settings, "METRICS_ENABLED", True)
+SLOW_REQUEST_SECONDS = getattr(settings, "METRICS_SLOW_REQUEST_MS", 500) / 1000
+SLOW_REQUEST_WARNING_SECONDS = getattr(settings, "METRICS_SLOW_REQUEST_WARNING_MS", 2000) / 1000
+# fraction of slow requests kept as samples; all of them are counted
+SLOW_SAMPLE_RATE = getattr(settings, "METRICS_SLOW_SAMPLE_RATE", 1.0)
+SLOW_SAMPLES_KEPT = getattr(settings, "METRICS_SLOW_SAMPLES_KEPT", 50)
+SLOW_SQL_KEPT = getattr(settings, "METRICS_SLOW_SQL_STATEMENTS", 20)
+
+REQUEST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FAST_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+# name: (type, help, histogram buckets)
+METRICS = {
+    "http_requests": ("counter", "Requests by view, action, method and status.", None),
+    "http_request_duration_seconds": ("histogram", "Request latency by view and action.", REQUEST_BUCKETS),
+    "http_slow_requests": ("counter", "Requests slower than the slow-request threshold.", None),
+    "db_query_duration_seconds": ("histogram", "SQL statement latency by the view and action that ran it.", FAST_BUCKETS),
+    "cache_lookups": ("counter", "Cache reads by key family, operation and result (hit or miss).", None),
+    "cache_operation_duration_seconds": ("histogram", "Cache operation latency by key family and operation.", FAST_BUCKETS),
+    "channel_layer_send_duration_seconds": ("histogram", "Channel-layer group sends by message type and outcome.", FAST_BUCKETS),
+}
+
+# labels of work done outside a request (outbox dispatcher, commands)
+BACKGROUND = (("view", "-"), ("action", "-"))
+
+
+class Histogram:
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        # the last slot counts values above every bucket (le="+Inf" only)
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+# Thread-safe store of the METRICS series, keyed by sorted label pairs
+class Registry:
+
+    def __init__(self, metrics=METRICS):
+        self.metrics = metrics
+        self._series = {name: {} for name in metrics}
+        self._lock = threading.Lock()
+
+    def inc(self, name, labels, amount=1):
+        with self._lock:
+            series = self._series[name]
+            series[labels] = series.get(labels, 0) + amount
+
+    def observe(self, name, labels, *values):
+        with self._lock:
+            series = self._series[name]
+            histogram = series.get(labels)
+            if histogram is None:
+                histogram = series[labels] = Histogram(self.metrics[name][2])
+            for value in values:
+                histogram.observe(value)
+
+    def value(self, name, labels):
+        with self._lock:
+            return self._series[name].get(labels)
+
+    def reset(self):
+        with self._lock:
+            for series in self._series.values():
+                series.clear()
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name, (kind, help_text, _) in self.metrics.items():
+                exposed = f"{name}_total" if kind == "counter" else name
+                lines.append(f"# HELP {exposed} {help_text}")
+                lines.append(f"# TYPE {exposed} {kind}")
+                for labels, value in sorted(self._series[name].items()):
+                    if kind == "counter":
+                        lines.append(f"{exposed}{_labels(labels)} {value}")
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(value.buckets, value.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_labels(labels + (('le', repr(float(bound))),))} {cumulative}")
+                    total = cumulative + value.counts[-1]
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {total}")
+                    lines.append(f"{name}_sum{_labels(labels)} {value.sum!r}")
+                    lines.append(f"{name}_count{_labels(labels)} {total}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+registry = Registry()
+slow_samples = deque(maxlen=SLOW_SAMPLES_KEPT)
+
+# What the current request did so far; None outside requests
+_request = ContextVar("api_metrics_request", default=None)
+
+
+class RequestStats:
+    __slots__ = ("queries", "cache_ops", "cache_seconds")
+
+    def __init__(self):
+        self.queries = []  # (sql, seconds)
+        self.cache_ops = 0
+        self.cache_seconds = 0.0
+
+
+# Database execute wrapper; installed on every connection by install()
+def observe_query(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        stats = _request.get()
+        if stats is None:
+            registry.observe("db_query_duration_seconds", BACKGROUND, elapsed)
+        else:
+            stats.queries.append((sql, elapsed))
+
+
+def _wrap_connection(connection, **kwargs):
+    if observe_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(observe_query)
+
+
+# Instrument database connections opened from now on, and any already open
+def install():
+    if not ENABLED:
+        return
+    from django.db import connections
+    from django.db.backends.signals import connection_created
+    connection_created.connect(_wrap_connection, dispatch_uid="api.metrics")
+    for connection in connections.all(initialized_only=True):
+        _wrap_connection(connection)
+
+
+def _family(key):
+    return str(key).split(":", 1)[0]
+
+
+# Record a cache operation on `key` (or keys, for *_many). Reads also count
+# hits and misses: get() misses when it returned `default`, get_many() for
+# every key it didn't return
+def observe_cache(op, key, seconds, result=None, default=None):
+    if not ENABLED:
+        return
+    if isinstance(key, (list, tuple, set, dict)):
+        keys = list(key)
+        family = _family(keys[0]) if keys else ""
+    else:
+        keys, family = [key], _family(key)
+    registry.observe("cache_operation_duration_seconds", (("family", family), ("op", op)), seconds)
+    if op == "get":
+        registry.inc("cache_lookups", (("family", family), ("op", op), ("result", "miss" if result is default else "hit")))
+    elif op == "get_many":
+        hits = len(result)
+        if hits:
+            registry.inc("cache_lookups", (("family", family), ("op", op), ("result", "hit")), hits)
+        if len(keys) > hits:
+            registry.inc("cache_lookups", (("family", family), ("op", op), ("result", "miss")), len(keys) - hits)
+    stats = _request.get()
+    if stats is not None:
+        stats.cache_ops += 1
+        stats.cache_seconds += seconds
+
+
+def _default(args, kwargs):
+    return args[0] if args else kwargs.get("default")
+
+
+# Decorator for cache backend methods taking the key (or keys) first; works
+# on sync and async methods
+def cache_operation(op):
+    def decorator(method):
+        if iscoroutinefunction(method):
+            async def wrapper(self, key, *args, **kwargs):
+                started = time.perf_counter()
+                result = await method(self, key, *args, **kwargs)
+                observe_cache(op, key, time.perf_counter() - started, result, _default(args, kwargs))
+                return result
+        else:
+            def wrapper(self, key, *args, **kwargs):
+                started = time.perf_counter()
+                result = method(self, key, *args, **kwargs)
+                observe_cache(op, key, time.perf_counter() - started, result, _default(args, kwargs))
+                return result
+        return functools.wraps(method)(wrapper)
+    return decorator
+
+
+def observe_channel_send(message_type, outcome, seconds):
+    if ENABLED:
+        registry.observe(
+            "channel_layer_send_duration_seconds", (("type", message_type), ("outcome", outcome)), seconds,
+        )
+
+
+# (view, action) labels of a routed request: the URL name and the viewset
+# action, or the lowercased method for other views
+def view_labels(request):
+    match = getattr(request, "resolver_match", None)
+    method = request.method.lower()
+    if match is None:
+        return "unresolved", method
+    actions = getattr(match.func, "actions", None) or {}
+    return match.view_name, actions.get(method, method)
+
+
+def _record(request, response, stats, elapsed):
+    view, action = view_labels(request)
+    labels = (("view", view), ("action", action))
+    status = getattr(response, "status_code", 500)
+    registry.inc("http_requests", labels + (("method", request.method), ("status", str(status))))
+    registry.observe("http_request_duration_seconds", labels, elapsed)
+    if stats.queries:
+        registry.observe("db_query_duration_seconds", labels, *(seconds for _, seconds in stats.queries))
+    if elapsed >= SLOW_REQUEST_SECONDS:
+        registry.inc("http_slow_requests", labels)
+        if random.random() < SLOW_SAMPLE_RATE:
+            _sample(request, view, action, status, stats, elapsed)
+
+
+def _sample(request, view, action, status, stats, elapsed):
+    slowest = heapq.nlargest(SLOW_SQL_KEPT, enumerate(stats.queries), key=lambda query: query[1][1])
+    sample = {
+        "at": timezone.now().isoformat(),
+        "method": request.method,
+        "path": request.get_full_path(),
+        "view": view,
+        "action": action,
+        "status": status,
+        "duration_ms": round(elapsed * 1000, 3),
+        "queries": len(stats.queries),
+        "query_ms": round(sum(seconds for _, seconds in stats.queries) * 1000, 3),
+        "cache_operations": stats.cache_ops,
+        "cache_ms": round(stats.cache_seconds * 1000, 3),
+        # the slowest statements, in execution order
+        "sql": [{"ms": round(seconds * 1000, 3), "sql": sql} for _, (sql, seconds) in sorted(slowest)],
+    }
+    slow_samples.append(sample)
+    logger.log(
+        logging.WARNING if elapsed >= SLOW_REQUEST_WARNING_SECONDS else logging.INFO,
+        "Slow request %s %s (%s) took %.1f ms with %s queries (%.1f ms)",
+        request.method, sample["path"], view, sample["duration_ms"], sample["queries"], sample["query_ms"],
+    )
+
+
+def reset():
+    registry.reset()
+    slow_samples.clear()
+
+
+# Times each request and attributes its queries and cache operations to the
+# view that served it. Streaming responses are timed until their headers are
+# ready. Goes first in MIDDLEWARE, so other middleware is included
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not ENABLED:
+            return self.get_response(request)
+        stats = RequestStats()
+        token = _request.set(stats)
+        started = time.perf_counter()
+        response = None
+        try:
+            response = self.get_response(request)
+            return response
+        finally:
+            _request.reset(token)
+            _record(request, response, stats, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        if not ENABLED:
+            return await self.get_response(request)
+        stats = RequestStats()
+        token = _request.set(stats)
+        started = time.perf_counter()
+        response = None
+        try:
+            response = await self.get_response(request)
+            return response
+        finally:
+            _request.reset(token)
+            _record(request, response, stats, time.perf_counter() - started)
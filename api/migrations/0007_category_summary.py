@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-17 08:34
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Q
+
+
+# Fill in the summaries of existing categories
+def backfill_summaries(apps, schema_editor):
+    Category = apps.get_model("api", "Category")
+    Product = apps.get_model("api", "Product")
+    rows = Product.objects.values("category_id").annotate(
+        product_count=Count("id"),
+        in_stock_count=Count("id", filter=Q(stock__gt=0)),
+        min_price=Min("price"),
+        max_price=Max("price"),
+    ).order_by()
+    for row in rows:
+        Category.objects.filter(pk=row.pop("category_id")).update(**row)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_sales_rollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='in_stock_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='max_price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='min_price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='product_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
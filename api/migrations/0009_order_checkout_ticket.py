@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 09:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_stock_reservation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='checkout_ticket',
+            field=models.CharField(blank=True, max_length=32, null=True, unique=True),
+        ),
+    ]
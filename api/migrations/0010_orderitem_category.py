@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 10:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+# Existing lines were rolled up under their product's current category
+def backfill_categories(apps, schema_editor):
+    OrderItem = apps.get_model("api", "OrderItem")
+    Product = apps.get_model("api", "Product")
+    OrderItem.objects.update(
+        category=Subquery(Product.objects.filter(pk=OuterRef("product_id")).values("category_id")[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_order_checkout_ticket'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='category',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='api.category'),
+        ),
+        migrations.RunPython(backfill_categories, migrations.RunPython.noop),
+    ]
@@ -6,25 +6,89 @@ User = settings.AUTH_USER_MODEL
 
 # Create your models here.
 
+# Denormalized catalogue summary columns of Category, maintained by api.summaries
+CATEGORY_SUMMARY_FIELDS = ("product_count", "in_stock_count", "min_price", "max_price")
+
 # E-commerce category models
 class Category(models.Model):
     name = models.CharField(max_length=150, unique=True)
     description = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # catalogue summary; signed, so drift never makes a product write fail
+    product_count = models.IntegerField(default=0)
+    in_stock_count = models.IntegerField(default=0)
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+
+    # summary columns are only written by api.summaries, so saving a category
+    # loaded earlier can't overwrite newer counts
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in CATEGORY_SUMMARY_FIELDS
+            ]
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.name
 
+# (category_id, stock, price) of a product, or None if any of them is deferred
+def summary_state(product):
+    fields = product.__dict__
+    if "category_id" in fields and "stock" in fields and "price" in fields:
+        return fields["category_id"], fields["stock"], fields["price"]
+    return None
+
 # E-commerce product models
 class Product(models.Model):
+    # external (ERP) identifier; bulk upserts match products on it
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True)
     name = models.CharField(max_length=200)
     description = models.TextField(blank=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.PositiveIntegerField(default=0)
+    # units held by active reservations, maintained by api.reservations;
+    # available stock is stock - reserved
+    reserved = models.PositiveIntegerField(default=0)
     category = models.ForeignKey(Category, related_name="products", on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # indexes follow ProductFilter and the list orderings (keyset pages use id as tie-breaker)
+    class Meta:
+        indexes = [
+            models.Index(fields=["category", "price"], name="api_prod_category_price_idx"),
+            models.Index(fields=["stock", "price"], name="api_prod_stock_price_idx"),
+            models.Index(fields=["price", "id"], name="api_prod_price_id_idx"),
+            models.Index(fields=["created_at", "id"], name="api_prod_created_id_idx"),
+        ]
+
+    # remember the category a product was loaded with so cache invalidation
+    # can reach its previous category when it is moved, and the state category
+    # summaries are adjusted from (see api.summaries)
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_category_id = instance.__dict__.get("category_id")
+        instance._loaded_summary = summary_state(instance)
+        return instance
+
+    # `reserved` is only written by api.reservations, so saving a product
+    # loaded earlier can't undo newer holds
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != "reserved"
+            ]
+        super().save(*args, **kwargs)
+
+    # units buyers can still order
+    @property
+    def available(self):
+        return max(self.stock - self.reserved, 0)
+
     def __str__(self):
         return self.name
 
@@ -35,22 +99,124 @@ class Order(models.Model):
         ("shipped", "Shipped"),
         ("delivered", "Delivered"),
     )
+    # statuses an order may move to from each status; orders never go back
+    TRANSITIONS = {
+        "pending": ("shipped", "delivered"),
+        "shipped": ("delivered",),
+        "delivered": (),
+    }
     user = models.ForeignKey(User, related_name="orders", on_delete=models.CASCADE)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
     total_price = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # ticket of an asynchronous checkout (api.checkout); unique, so a
+    # redelivered submission can't place its order twice
+    checkout_ticket = models.CharField(max_length=32, unique=True, null=True, blank=True)
     # shipping fields (address snapshot)
 
+    # per-user order history and admin listings, both by recency
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "created_at"], name="api_order_user_created_idx"),
+            models.Index(fields=["status", "created_at"], name="api_order_status_created_idx"),
+            models.Index(fields=["created_at", "id"], name="api_order_created_id_idx"),
+        ]
+
     def __str__(self):
         return f"Order {self.id} - {self.user}"
 
+# Stock held for a user during a multi-step checkout (see api.reservations).
+# A hold is confirmed into an order, released by the user, or expires at
+# expires_at and is swept by `manage.py expire_reservations`
+class StockReservation(models.Model):
+    STATUS_CHOICES = (
+        ("held", "Held"),
+        ("confirmed", "Confirmed"),
+        ("released", "Released"),
+        ("expired", "Expired"),
+    )
+    user = models.ForeignKey(User, related_name="reservations", on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, related_name="reservations", on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="held")
+    expires_at = models.DateTimeField()
+    order = models.ForeignKey("Order", related_name="reservations", null=True, blank=True, on_delete=models.SET_NULL)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    # the expiry sweep walks held rows by expiry; users list theirs by recency
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "expires_at"], name="api_resv_status_expires_idx"),
+            models.Index(fields=["user", "created_at"], name="api_resv_user_created_idx"),
+        ]
+
+    def __str__(self):
+        return f"Reservation {self.id} - {self.quantity} x {self.product_id}"
+
 # E-commerce order item models
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, related_name="items", on_delete=models.CASCADE)
     product = models.ForeignKey(Product, related_name="order_items", on_delete=models.PROTECT)
     quantity = models.PositiveIntegerField()
     price_at_purchase = models.DecimalField(max_digits=12, decimal_places=2)
+    # the product's category when the order was placed, which its sales rollups
+    # are filed under (see api.analytics); lines created without it fall back
+    # to the product's current category
+    category = models.ForeignKey(Category, related_name="+", null=True, blank=True, on_delete=models.SET_NULL)
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product.name}"
+
+# Transactional outbox for channel-layer notifications.
+# Rows are written in the same transaction as the change they announce and
+# delivered by the dispatcher (manage.py dispatch_outbox); available_at is
+# cleared once a message has exhausted its retries.
+class OutboxMessage(models.Model):
+    group = models.CharField(max_length=150)
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    available_at = models.DateTimeField(default=timezone.now, null=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["available_at", "id"],
+                condition=models.Q(available_at__isnull=False),
+                name="api_outbox_pending_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Outbox {self.id} -> {self.group}"
+
+# Daily sales rollups, maintained incrementally by api.analytics as orders are
+# placed and change status, and rebuilt by manage.py rebuild_sales_rollups.
+# One row per day, order status and dimension member: `key` is a product id
+# for "product" rows, a category id for "category" rows and 0 for the
+# store-wide "total" row. `orders` counts distinct orders, so category and total
+# rows are not sums of product rows.
+class SalesRollup(models.Model):
+    DIMENSION_CHOICES = (
+        ("total", "Total"),
+        ("product", "Product"),
+        ("category", "Category"),
+    )
+    day = models.DateField()
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    dimension = models.CharField(max_length=10, choices=DIMENSION_CHOICES)
+    key = models.PositiveIntegerField()
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    units = models.IntegerField(default=0)
+    orders = models.IntegerField(default=0)
+
+    # the unique constraint also serves date-range reads of one dimension
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["dimension", "day", "status", "key"], name="api_rollup_unique"),
+        ]
 
     def __str__(self):
-        return f"{self.quantity} x {self.product.name}"
\ No newline at end of file
+        return f"{self.day} {self.dimension}:{self.key} ({self.status})"
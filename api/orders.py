@@ -0,0 +1,167 @@
+from collections import Counter
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Q, Value, When
+from django.utils import timezone
+from rest_framework import serializers
+from .models import Product, Order, OrderItem
+from .cache import invalidate_products
+from .analytics import record_order, record_status_changes
+from .outbox import enqueue_status_notifications
+from .summaries import adjust_summary
+from .flashsale import admit, release
+
+# Order placement.
+# A cart of N lines costs one locking SELECT, one conditional UPDATE, one INSERT
+# for the order and one bulk INSERT for its items, whatever N is, plus two
+# statements folding the order into the sales rollups. Flash-sale products
+# skip the lock and the UPDATE (see api.flashsale).
+
+
+# Total quantity requested per product, merging repeated lines
+def requested_quantities(items_data):
+    quantities = {}
+    for item in items_data:
+        quantities[item["product_id"]] = quantities.get(item["product_id"], 0) + item["quantity"]
+    return quantities
+
+
+# Place an order for `user` from validated item dicts ({"product_id", "quantity"}).
+# Only available stock (stock - reserved) can be ordered. Flash-sale products
+# are admitted against their Redis stock before any database work (see
+# api.flashsale) and given back if the order fails. With `held`, the items are
+# units the user reserved (see api.reservations): they come out of the
+# product's reserved units and skip flash-sale admission. `ticket` is the
+# asynchronous checkout the order comes from (see api.checkout). The order's
+# admitted quantities are left in `order.flash_admitted` ({product_id:
+# quantity}) for callers whose wider transaction may still roll back
+def place_order(user, items_data, held=False, ticket=None):
+    quantities = requested_quantities(items_data)
+    flash = {} if held else admit(quantities)
+    admitted = {product_id: quantities[product_id] for product_id in flash}
+    try:
+        order = _place_order(user, items_data, quantities, flash, held, ticket)
+    except BaseException:
+        release(admitted)
+        raise
+    order.flash_admitted = admitted
+    return order
+
+
+# `flash`: {product_id: remaining stock} of the admitted flash-sale products,
+# whose rows are neither locked nor updated here
+def _place_order(user, items_data, quantities, flash, held, ticket):
+    stocked = {product_id: qty for product_id, qty in quantities.items() if product_id not in flash}
+    with transaction.atomic():
+        # lock every affected product in one query, always in id order so two
+        # carts sharing products can't deadlock each other
+        products = {
+            product.id: product
+            for product in Product.objects.select_for_update(of=("self",))
+            .select_related("category").filter(id__in=stocked).order_by("id")
+        } if stocked else {}
+        if flash:
+            for product in Product.objects.select_related("category").filter(id__in=flash):
+                # the sale's stock is what is available; reserved units stay on the row
+                product.stock = flash[product.id] + product.reserved
+                products[product.id] = product
+        missing = sorted(set(quantities) - set(products))
+        if missing:
+            raise serializers.ValidationError(f"Invalid product id(s): {', '.join(map(str, missing))}")
+
+        for product_id, qty in stocked.items():
+            product = products[product_id]
+            if (product.stock if held else product.stock - product.reserved) < qty:
+                raise serializers.ValidationError(f"Not enough stock for {product.name}")
+
+        now = timezone.now()
+        if stocked:
+            # one conditional decrement for the whole cart; the stock guard makes it
+            # safe even where the locking SELECT is a no-op
+            required = Case(
+                *[When(pk=product_id, then=Value(qty)) for product_id, qty in stocked.items()],
+                output_field=PositiveIntegerField(),
+            )
+            if held:
+                updates = {"reserved": F("reserved") - required}
+                guard = Q(stock__gte=required, reserved__gte=required)
+            else:
+                updates = {}
+                guard = Q(stock__gte=F("reserved") + required)
+            updated = Product.objects.filter(guard, pk__in=stocked).update(
+                stock=F("stock") - required, updated_at=now, **updates
+            )
+            if updated != len(stocked):
+                raise serializers.ValidationError("Not enough stock for one or more products")
+        sold_out = Counter()
+        for product_id, qty in stocked.items():
+            product = products[product_id]
+            product.stock -= qty
+            if held:
+                product.reserved -= qty
+            product.updated_at = now
+            if product.stock == 0:
+                sold_out[product.category_id] += 1
+        # no signals fire for the stock update, so category summaries are adjusted here
+        for category_id, count in sold_out.items():
+            adjust_summary(category_id, in_stock=-count)
+
+        total = 0
+        lines = []
+        for item in items_data:
+            product = products[item["product_id"]]
+            total += product.price * item["quantity"]
+            lines.append((product, item["quantity"]))
+
+        order = Order.objects.create(user=user, status="pending", total_price=total, checkout_ticket=ticket)
+        items = OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order, product=product, quantity=qty, price_at_purchase=product.price,
+                category_id=product.category_id,
+            )
+            for product, qty in lines
+        ])
+        # hand the items to the response serializer without re-querying them
+        order._prefetched_objects_cache = {"items": items}
+        record_order(order, [(product.id, product.category_id, qty, product.price) for product, qty in lines])
+        # stock changed without saving the rows, so no signals fire; flash-sale
+        # pages follow at reconciliation
+        invalidate_products((product_id, products[product_id].category_id) for product_id in stocked)
+    return order
+
+
+# Statuses an order can move to `status` from
+def transition_sources(status):
+    return [source for source, targets in Order.TRANSITIONS.items() if status in targets]
+
+
+# Move many orders to `status` at once: one locking SELECT, one UPDATE for all
+# of them, their rollups moved in bulk and one notification per user. Orders
+# that don't exist, already have the status or can't move to it are skipped.
+# Returns (updated ids, skipped [{"id", "reason", "status"}]), in request order
+def transition_orders(ids, status):
+    ids = list(dict.fromkeys(ids))
+    sources = transition_sources(status)
+    with transaction.atomic():
+        current = {
+            order["id"]: order
+            for order in Order.objects.select_for_update().filter(id__in=ids).order_by("id")
+            .values("id", "user_id", "status", "created_at")
+        }
+        moving, skipped = [], []
+        for order_id in ids:
+            order = current.get(order_id)
+            if order is None:
+                skipped.append({"id": order_id, "reason": "not_found", "status": None})
+            elif order["status"] == status:
+                skipped.append({"id": order_id, "reason": "unchanged", "status": status})
+            elif order["status"] not in sources:
+                skipped.append({"id": order_id, "reason": "invalid_transition", "status": order["status"]})
+            else:
+                moving.append(order)
+        if moving:
+            Order.objects.filter(id__in=[order["id"] for order in moving], status__in=sources).update(
+                status=status, updated_at=timezone.now(),
+            )
+            record_status_changes(moving, status)
+            enqueue_status_notifications([(order["user_id"], order["id"]) for order in moving], status)
+    return [order["id"] for order in moving], skipped
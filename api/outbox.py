@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from datetime import timedelta
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from .models import OutboxMessage
+from .metrics import observe_channel_send
+
+# Transactional outbox.
+# Write paths call enqueue() inside their transaction, so a notification exists
+# exactly when the change it announces commits. A long-running dispatcher
+# claims due messages in batches, fans them out to the channel layer and
+# retries failures with exponential backoff.
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = getattr(settings, "OUTBOX_BATCH_SIZE", 100)
+MAX_ATTEMPTS = getattr(settings, "OUTBOX_MAX_ATTEMPTS", 8)
+# claimed messages are hidden from other dispatchers for this long
+LEASE = timedelta(seconds=getattr(settings, "OUTBOX_LEASE_SECONDS", 30))
+
+
+def user_group(user_id):
+    return f"user_{user_id}"
+
+
+def enqueue(group, payload):
+    return OutboxMessage.objects.create(group=group, payload=payload)
+
+
+# Queue an order.notification for the order's owner (OrderConsumer.order_notification)
+def enqueue_order_notification(order):
+    return enqueue(
+        user_group(order.user_id),
+        {"type": "order.notification", "order_id": order.id, "status": order.status},
+    )
+
+
+# Queue one order.notifications message per user for orders given as
+# (user_id, order_id) pairs that moved to `status` (OrderConsumer.order_notifications)
+def enqueue_status_notifications(orders, status):
+    by_user = defaultdict(list)
+    for user_id, order_id in orders:
+        by_user[user_id].append({"order_id": order_id, "status": status})
+    return OutboxMessage.objects.bulk_create([
+        OutboxMessage(group=user_group(user_id), payload={"type": "order.notifications", "orders": updates})
+        for user_id, updates in by_user.items()
+    ])
+
+
+def _backoff(attempts):
+    return timedelta(seconds=min(2 ** attempts, 300))
+
+
+# Claim up to `limit` due messages by pushing their availability past the lease
+def claim_batch(limit=BATCH_SIZE):
+    now = timezone.now()
+    with transaction.atomic():
+        skip_locked = connection.features.has_select_for_update_skip_locked
+        messages = list(
+            OutboxMessage.objects.select_for_update(skip_locked=skip_locked)
+            .filter(available_at__lte=now)
+            .order_by("available_at", "id")[:limit]
+        )
+        if messages:
+            OutboxMessage.objects.filter(id__in=[m.id for m in messages]).update(available_at=now + LEASE)
+    return messages
+
+
+# Record the outcome of a dispatched batch: delivered messages are removed,
+# failed ones are rescheduled or, past MAX_ATTEMPTS, parked for inspection
+def complete_batch(sent_ids, failures):
+    now = timezone.now()
+    with transaction.atomic():
+        if sent_ids:
+            OutboxMessage.objects.filter(id__in=sent_ids).delete()
+        for message, error in failures:
+            attempts = message.attempts + 1
+            available_at = now + _backoff(attempts) if attempts < MAX_ATTEMPTS else None
+            OutboxMessage.objects.filter(id=message.id).update(
+                attempts=attempts, available_at=available_at, last_error=error[:2000]
+            )
+            if available_at is None:
+                logger.error("Outbox message %s dropped after %s attempts: %s", message.id, attempts, error)
+
+
+# group_send, timed for api.metrics by message type (e.g. order.notification)
+async def _send(channel_layer, message):
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        await channel_layer.group_send(message.group, message.payload)
+        outcome = "sent"
+    finally:
+        observe_channel_send(message.payload.get("type", ""), outcome, time.perf_counter() - started)
+
+
+# Deliver one batch; returns the number of messages claimed
+async def dispatch_batch(channel_layer=None, limit=BATCH_SIZE):
+    channel_layer = channel_layer or get_channel_layer()
+    messages = await sync_to_async(claim_batch)(limit)
+    if not messages:
+        return 0
+    results = await asyncio.gather(
+        *[_send(channel_layer, message) for message in messages],
+        return_exceptions=True,
+    )
+    sent_ids, failures = [], []
+    for message, result in zip(messages, results):
+        if isinstance(result, BaseException):
+            failures.append((message, f"{type(result).__name__}: {result}"))
+        else:
+            sent_ids.append(message.id)
+    await sync_to_async(complete_batch)(sent_ids, failures)
+    return len(messages)
+
+
+# Drain the outbox until `stop` is set; sleeps only when a poll comes back empty
+async def run_dispatcher(poll_interval=0.5, limit=BATCH_SIZE, stop=None, channel_layer=None):
+    stop = stop or asyncio.Event()
+    channel_layer = channel_layer or get_channel_layer()
+    while not stop.is_set():
+        try:
+            claimed = await dispatch_batch(channel_layer, limit)
+        except Exception:
+            logger.exception("Outbox dispatch failed")
+            claimed = 0
+        if claimed < limit:
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=poll_interval)
+            except asyncio.TimeoutError:
+                pass
@@ -1,7 +1,175 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import json
+from collections import OrderedDict
+from django.core.paginator import InvalidPage, Page
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 # Custom pagination class
 class StandardResultsSetPagination(PageNumberPagination):
     page_size = 10
     page_size_query_param = "page_size"
     max_page_size = 100
+
+    # Async counterpart of paginate_queryset for native async views
+    async def apaginate_queryset(self, queryset, request, view=None):
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        paginator = self.django_paginator_class(queryset, page_size)
+        # counted up front so the paginator never queries synchronously
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            number = paginator.validate_number(page_number)
+        except InvalidPage as exc:
+            msg = self.invalid_page_message.format(page_number=page_number, message=str(exc))
+            raise NotFound(msg)
+        bottom = (number - 1) * paginator.per_page
+        top = bottom + paginator.per_page
+        if top + paginator.orphans >= paginator.count:
+            top = paginator.count
+        rows = [row async for row in queryset[bottom:top]]
+        self.request = request
+        self.page = Page(rows, number, paginator)
+        return rows
+
+
+# Keyset (cursor) pagination.
+# Pages are fetched with `WHERE (field, id) > (last_field, last_id)` on the
+# active ordering, so page N costs the same as page 1 and no COUNT(*) is run
+# unless the client asks for one with `with_count=true`.
+class KeysetPagination(BasePagination):
+    cursor_query_param = "cursor"
+    page_size = 10
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    ordering_param = "ordering"
+    count_query_param = "with_count"
+    default_ordering = "id"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.page_queryset(queryset, request, view)
+        self.count = queryset.count() if self.wants_count(request) else None
+        return self.set_page(list(queryset[:self.page_size + 1]))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        queryset = self.page_queryset(queryset, request, view)
+        self.count = await queryset.acount() if self.wants_count(request) else None
+        return self.set_page([row async for row in queryset[:self.page_size + 1]])
+
+    # Order and position `queryset` for the requested page; rows are fetched
+    # by the caller (one more than a page, to tell whether another follows)
+    def page_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.field, self.descending = self.get_ordering(request, view)
+        self.cursor = self.decode_cursor(request)
+        # walking backwards flips the ordering, then the page is reversed back
+        self.backwards = self.cursor is not None and self.cursor["d"] == "prev"
+        reverse = self.descending != self.backwards
+        keys = [self.field, "id"] if self.field != "id" else ["id"]
+        queryset = queryset.order_by(*[f"-{key}" if reverse else key for key in keys])
+        if self.cursor is not None:
+            queryset = queryset.filter(self.position_filter(self.cursor, reverse))
+        return queryset
+
+    def set_page(self, rows):
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if self.backwards:
+            rows.reverse()
+        self.has_next = has_more if not self.backwards else True
+        self.has_previous = has_more if self.backwards else self.cursor is not None
+        self.page = rows
+        return rows
+
+    def get_paginated_response(self, data):
+        payload = [("next", self.get_next_link()), ("previous", self.get_previous_link()), ("results", data)]
+        if self.count is not None:
+            payload.insert(0, ("count", self.count))
+        return Response(OrderedDict(payload))
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    # Ordering field and direction; only the view's `ordering_fields` are allowed
+    def get_ordering(self, request, view):
+        default = getattr(view, "keyset_default_ordering", self.default_ordering)
+        requested = request.query_params.get(self.ordering_param, "").split(",")[0].strip()
+        allowed = getattr(view, "ordering_fields", None) or []
+        ordering = requested if requested.lstrip("-") in allowed else default
+        return ordering.lstrip("-"), ordering.startswith("-")
+
+    def wants_count(self, request):
+        return request.query_params.get(self.count_query_param, "").lower() in ("1", "true", "yes")
+
+    def position_filter(self, cursor, reverse):
+        op = "lt" if reverse else "gt"
+        if self.field == "id":
+            return Q(**{f"id__{op}": cursor["id"]})
+        return Q(**{f"{self.field}__{op}": cursor["v"]}) | Q(**{self.field: cursor["v"], f"id__{op}": cursor["id"]})
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode("ascii")))
+            if cursor["o"] != self.ordering_token() or cursor["d"] not in ("next", "prev"):
+                raise ValueError
+            int(cursor["id"])
+        except (ValueError, TypeError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    def encode_cursor(self, row, direction):
+        cursor = {"o": self.ordering_token(), "d": direction, "id": self.row_value(row, "id")}
+        if self.field != "id":
+            value = self.row_value(row, self.field)
+            cursor["v"] = value.isoformat() if hasattr(value, "isoformat") else str(value)
+        token = base64.urlsafe_b64encode(json.dumps(cursor, separators=(",", ":")).encode()).decode("ascii")
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, token)
+
+    def ordering_token(self):
+        return f"-{self.field}" if self.descending else self.field
+
+    @staticmethod
+    def row_value(row, name):
+        return row[name] if isinstance(row, dict) else getattr(row, name)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], "next")
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return self.encode_cursor(self.page[0], "prev")
+
+
+# Lets a viewset opt into keyset pagination per request: passing the `cursor`
+# query parameter (empty for the first page) switches from page numbers
+class OptionalKeysetPaginationMixin:
+    keyset_pagination_class = KeysetPagination
+
+    @property
+    def paginator(self):
+        if not hasattr(self, "_paginator"):
+            request = getattr(self, "request", None)
+            if request is not None and self.keyset_pagination_class.cursor_query_param in request.query_params:
+                self._paginator = self.keyset_pagination_class()
+            else:
+                self._paginator = None if self.pagination_class is None else self.pagination_class()
+        return self._paginator
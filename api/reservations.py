@@ -0,0 +1,123 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Value, When
+from django.utils import timezone
+from rest_framework import serializers
+from .cache import invalidate_products
+from .flashsale import on_flash_sale
+from .models import Product, StockReservation
+from .orders import place_order, requested_quantities
+from .outbox import enqueue_order_notification
+
+# Timed stock reservations.
+# A hold takes N units of a product for RESERVATION_TTL seconds, so a
+# multi-step checkout can't lose them to other buyers. Holds are rows of the
+# StockReservation ledger; Product.reserved is the sum of a product's active
+# holds, moved by one conditional UPDATE per hold, so available stock
+# (stock - reserved) never needs a lock on the product row. Confirming holds
+# places their order; expired holds are swept in batches by `manage.py
+# expire_reservations`, one UPDATE for the holds and one for their products.
+# Until then an expired hold still counts, except that a hold short of stock
+# sweeps its product's expired holds first. Product pages show available
+# stock, so taking or returning units invalidates them.
+
+RESERVATION_TTL = getattr(settings, "RESERVATION_TTL", 900)
+SWEEP_BATCH_SIZE = getattr(settings, "RESERVATION_SWEEP_BATCH_SIZE", 1000)
+
+
+def _invalidate(product_ids):
+    invalidate_products(Product.objects.filter(pk__in=product_ids).values_list("id", "category_id"))
+
+
+def _take(product_id, quantity):
+    return Product.objects.filter(pk=product_id, stock__gte=F("reserved") + quantity).update(
+        reserved=F("reserved") + quantity,
+    )
+
+
+# Hold `quantity` units of a product for `user`; returns the reservation
+def reserve(user, product_id, quantity, ttl=RESERVATION_TTL):
+    # a sale's stock lives in Redis, where holds can't be taken from
+    if on_flash_sale(product_id):
+        raise serializers.ValidationError("Products on flash sale can't be reserved.")
+    with transaction.atomic():
+        taken = _take(product_id, quantity)
+        if not taken and expire_reservations(product_id=product_id):
+            taken = _take(product_id, quantity)
+        if not taken:
+            if not Product.objects.filter(pk=product_id).exists():
+                raise serializers.ValidationError(f"Invalid product id(s): {product_id}")
+            raise serializers.ValidationError("Not enough stock to reserve.")
+        _invalidate([product_id])
+        return StockReservation.objects.create(
+            user=user, product_id=product_id, quantity=quantity, expires_at=timezone.now() + timedelta(seconds=ttl),
+        )
+
+
+# Active holds of `user` among `ids`, locked; raises a ValidationError naming
+# the first one that isn't
+def _active_holds(user, ids, now):
+    holds = {
+        hold.id: hold
+        for hold in StockReservation.objects.select_for_update().filter(user=user, id__in=ids).order_by("id")
+    }
+    for reservation_id in ids:
+        hold = holds.get(reservation_id)
+        if hold is None:
+            raise serializers.ValidationError(f"Reservation {reservation_id} does not exist.")
+        if hold.status != "held" or hold.expires_at <= now:
+            state = "expired" if hold.status == "held" else hold.status
+            raise serializers.ValidationError(f"Reservation {reservation_id} is {state}.")
+    return list(holds.values())
+
+
+# Place one order from `user`'s holds `ids`, all of which must be active, and
+# queue its notification; the held units become the order's
+def confirm_reservations(user, ids):
+    ids = list(dict.fromkeys(ids))
+    with transaction.atomic():
+        holds = _active_holds(user, ids, timezone.now())
+        order = place_order(user, [{"product_id": hold.product_id, "quantity": hold.quantity} for hold in holds], held=True)
+        StockReservation.objects.filter(id__in=ids).update(status="confirmed", order=order)
+        enqueue_order_notification(order)
+    return order
+
+
+# Give `user`'s active holds `ids` back early
+def release_reservations(user, ids):
+    ids = list(dict.fromkeys(ids))
+    with transaction.atomic():
+        holds = _active_holds(user, ids, timezone.now())
+        StockReservation.objects.filter(id__in=ids).update(status="released")
+        _unreserve(holds)
+
+
+def _unreserve(holds):
+    quantities = requested_quantities({"product_id": hold.product_id, "quantity": hold.quantity} for hold in holds)
+    if quantities:
+        required = Case(
+            *[When(pk=product_id, then=Value(qty)) for product_id, qty in quantities.items()],
+            output_field=PositiveIntegerField(),
+        )
+        Product.objects.filter(pk__in=quantities).update(reserved=F("reserved") - required)
+        _invalidate(quantities)
+
+
+# Expire up to `batch_size` holds past their expiry, oldest first (of one
+# product with `product_id`), returning their units. Returns how many expired
+def expire_reservations(batch_size=SWEEP_BATCH_SIZE, product_id=None, now=None):
+    now = now or timezone.now()
+    expired = StockReservation.objects.filter(status="held", expires_at__lte=now)
+    if product_id is not None:
+        expired = expired.filter(product_id=product_id)
+    with transaction.atomic():
+        holds = list(
+            expired.select_for_update().order_by("expires_at").only("id", "product_id", "quantity")[:batch_size]
+        )
+        if not holds:
+            return 0
+        StockReservation.objects.filter(id__in=[hold.id for hold in holds]).update(status="expired")
+        _unreserve(holds)
+    return len(holds)
+
@@ -0,0 +1,78 @@
+import re
+from django.db import connection
+from django.db.models import Q
+
+# Full-text product search.
+# SQLite keeps an FTS5 table (api_product_fts, rowid = product id) that is
+# maintained from the Product signals and bulk write paths. Postgres uses a
+# generated tsvector column with a GIN index, so it never needs syncing.
+# Other backends fall back to icontains.
+
+FTS_TABLE = "api_product_fts"
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _tokens(term):
+    return TOKEN_RE.findall(term or "")
+
+
+# Narrow `queryset` to products matching `term`, best matches first.
+# Every token must match, as a prefix, in the name or the description.
+def search_products(queryset, term):
+    tokens = _tokens(term)
+    if not tokens:
+        return queryset
+    if connection.vendor == "sqlite":
+        match = " ".join('"{}"*'.format(token.replace('"', '""')) for token in tokens)
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f"{FTS_TABLE}.rowid = api_product.id", f"{FTS_TABLE} MATCH %s"],
+            params=[match],
+            # bm25 is lower-is-better; negate so higher ranks sort first
+            select={"search_rank": f"-bm25({FTS_TABLE}, 10.0, 1.0)"},
+        ).order_by("-search_rank", "id")
+    if connection.vendor == "postgresql":
+        tsquery = " & ".join(f"{token}:*" for token in tokens)
+        return queryset.extra(
+            where=["api_product.search_vector @@ to_tsquery('english', %s)"],
+            params=[tsquery],
+            select={"search_rank": "ts_rank(api_product.search_vector, to_tsquery('english', %s))"},
+            select_params=[tsquery],
+        ).order_by("-search_rank", "id")
+    for token in tokens:
+        queryset = queryset.filter(Q(name__icontains=token) | Q(description__icontains=token))
+    return queryset
+
+
+# (Re)index the given products; a no-op outside SQLite
+def index_products(products):
+    if connection.vendor != "sqlite":
+        return
+    rows = [(product.id, product.name, product.description) for product in products]
+    if not rows:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(row[0],) for row in rows])
+        cursor.executemany(f"INSERT INTO {FTS_TABLE} (rowid, name, description) VALUES (%s, %s, %s)", rows)
+
+
+# Drop products from the index; a no-op outside SQLite
+def unindex_products(product_ids):
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(pk,) for pk in product_ids])
+
+
+# Rebuild the whole index from the product table
+def rebuild_index():
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, name, description) "
+                "SELECT id, name, description FROM api_product"
+            )
+            cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+        elif connection.vendor == "postgresql":
+            cursor.execute("REINDEX INDEX api_product_search_gin")
@@ -1,10 +1,22 @@
+from datetime import timedelta
+from django.db import transaction
+from django.utils import timezone
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from .models import Category, Product, Order, OrderItem
-from django.db import transaction
+from .models import Category, Product, Order, OrderItem, StockReservation
+from .orders import place_order
+from .analytics import record_status_change
+from .cart import MAX_QUANTITY as CART_MAX_QUANTITY
+from .reservations import reserve
 
 User = get_user_model()
 
+# orders per bulk status transition request
+BULK_STATUS_MAX_ORDERS = 5000
+
+# largest id a BigAutoField holds; bigger ones overflow the query instead of not matching
+MAX_ID = 2**63 - 1
+
 # User Serializers
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -29,28 +41,52 @@ class RegisterSerializer(serializers.ModelSerializer):
         )
         return user
 
+# Whether a request opted in to category summaries (`?summary=true`)
+def summary_requested(request):
+    return request is not None and request.query_params.get("summary", "").lower() in ("1", "true", "yes")
+
+# Catalogue summary of a category, kept up to date by api.summaries
+class CategorySummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Category
+        fields = ["product_count", "in_stock_count", "min_price", "max_price"]
+        read_only_fields = fields
+
 # Product and Category Serializers
 class CategorySerializer(serializers.ModelSerializer):
+    # only included when the request opts in (see summary_requested)
+    summary = CategorySummarySerializer(source="*", read_only=True)
+
     class Meta:
         model = Category
-        fields = ["id", "name", "description"]
+        fields = ["id", "name", "description", "summary"]
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not summary_requested(self.context.get("request")):
+            self.fields.pop("summary")
 
 # Nested serializers for Product and Order
 class ProductSerializer(serializers.ModelSerializer):
     category = CategorySerializer(read_only=True)
     category_id = serializers.PrimaryKeyRelatedField(queryset=Category.objects.all(), source='category', write_only=True)
+    # stock not held by reservations
+    available = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Product
-        fields = ["id", "name", "description", "price", "stock", "category", "category_id", "created_at", "updated_at"]
+        fields = ["id", "sku", "name", "description", "price", "stock", "available", "category", "category_id", "created_at", "updated_at"]
 
 # Order and OrderItem Serializers
 class OrderItemSerializer(serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
-    product_id = serializers.PrimaryKeyRelatedField(queryset=Product.objects.all(), source="product", write_only=True)
+    # products are resolved in bulk (and locked) by OrderSerializer.create
+    product_id = serializers.IntegerField(write_only=True, min_value=1, max_value=MAX_ID)
     class Meta:
         model = OrderItem
         fields = ["id", "product", "product_id", "quantity", "price_at_purchase"]
+        read_only_fields = ["price_at_purchase"]
+        extra_kwargs = {"quantity": {"min_value": 1}}
 
 # Order Serializer with nested items
 class OrderSerializer(serializers.ModelSerializer):
@@ -60,32 +96,85 @@ class OrderSerializer(serializers.ModelSerializer):
         fields = ["id", "user", "status", "total_price", "created_at", "updated_at", "items"]
         read_only_fields = ["user", "total_price", "created_at", "updated_at"]
 
+    def validate_items(self, items):
+        if not items:
+            raise serializers.ValidationError("An order needs at least one item.")
+        return items
+
+    # orders only move forward (Order.TRANSITIONS)
+    def validate_status(self, status):
+        current = self.instance.status if self.instance is not None else None
+        if current is not None and status != current and status not in Order.TRANSITIONS[current]:
+            raise serializers.ValidationError(f"An order can't go from {current} to {status}.")
+        return status
+
     # Create order with items and handle stock reduction
     def create(self, validated_data):
         items_data = validated_data.pop("items")
         user = self.context["request"].user
-        with transaction.atomic():
-            order = Order.objects.create(user=user, status="pending", total_price=0)
-            total = 0
-            for item in items_data:
-                product = item["product"]
-                qty = item["quantity"]
-                if product.stock < qty:
-                    raise serializers.ValidationError(f"Not enough stock for {product.name}")
-                # reduce stock
-                product.stock -= qty
-                product.save()
-                price = product.price
-                OrderItem.objects.create(order=order, product=product, quantity=qty, price_at_purchase=price)
-                total += price * qty
-            order.total_price = total
-            order.save()
-        return order
-
-    # Update order status only
+        return place_order(user, items_data)
+
+    # Update order status only; the sales rollups follow the status
     def update(self, instance, validated_data):
         status = validated_data.get("status")
         if status:
-            instance.status = status
-            instance.save()
+            previous_status = instance.status
+            with transaction.atomic():
+                instance.status = status
+                instance.save()
+                record_status_change(instance, previous_status)
         return instance
+
+
+# Body of the bulk status transition: the orders and the status to move them to
+class BulkStatusSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=BULK_STATUS_MAX_ORDERS,
+    )
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
+
+
+# A timed hold of stock (see api.reservations); creating one takes the units
+class StockReservationSerializer(serializers.ModelSerializer):
+    product_id = serializers.IntegerField(min_value=1, max_value=MAX_ID)
+    class Meta:
+        model = StockReservation
+        fields = ["id", "product_id", "quantity", "status", "expires_at", "order", "created_at"]
+        read_only_fields = ["status", "expires_at", "order", "created_at"]
+        extra_kwargs = {"quantity": {"min_value": 1}}
+
+    def create(self, validated_data):
+        return reserve(self.context["request"].user, validated_data["product_id"], validated_data["quantity"])
+
+
+# Holds to confirm into one order
+class ReservationConfirmSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=100)
+
+
+# A product to add to the cart (see api.cart); quantities add up
+class CartItemSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField(min_value=1, max_value=MAX_ID)
+    quantity = serializers.IntegerField(min_value=1, max_value=CART_MAX_QUANTITY, default=1)
+
+
+# A cart line's new quantity; 0 removes it
+class CartQuantitySerializer(serializers.Serializer):
+    quantity = serializers.IntegerField(min_value=0, max_value=CART_MAX_QUANTITY)
+
+
+# Query parameters of the sales analytics endpoint; the range defaults to the
+# last 30 days
+class SalesReportQuerySerializer(serializers.Serializer):
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    group = serializers.ChoiceField(choices=["day", "product", "category"], default="day")
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES, required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=1000, default=50)
+
+    def validate(self, attrs):
+        end = attrs.get("end") or timezone.localdate()
+        start = attrs.get("start") or end - timedelta(days=29)
+        if start > end:
+            raise serializers.ValidationError({"start": ["Must not be after end."]})
+        return {**attrs, "start": start, "end": end}
@@ -1,30 +1,60 @@
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.contrib.auth import get_user_model
 from django.dispatch import receiver
-from .models import Product, Category, Order
-from django.core.cache import cache
+from rest_framework_simplejwt.settings import api_settings
+from .models import Product, Category, summary_state
+from .cache import invalidate_products, invalidate_category, invalidate_user
+from .search import index_products, unindex_products
+from . import summaries
 
-# Signal handlers to clear cache when models are modified
+# Signal handlers to invalidate the cached pages that depend on a modified model
+
+# Category summaries are adjusted from the state a product was loaded with;
+# look it up for instances that weren't loaded from the database
+@receiver(pre_save, sender=Product)
+def product_saving(sender, instance, **kwargs):
+    if instance.pk is not None and getattr(instance, "_loaded_summary", None) is None:
+        instance._loaded_summary = (
+            Product.objects.filter(pk=instance.pk).values_list("category_id", "stock", "price").first()
+        )
+
+# Invalidate a product's pages and reindex its text when it is created or updated;
+# a product moved to another category also drops out of its previous category's pages.
+# Its categories' summaries follow the change
 @receiver(post_save, sender=Product)
-def product_saved(sender, instance, **kwargs):
-    cache.clear()
+def product_saved(sender, instance, created, **kwargs):
+    summaries.product_saved(instance, None if created else getattr(instance, "_loaded_summary", None))
+    instance._loaded_summary = summary_state(instance)
+    affected = [(instance.id, instance.category_id)]
+    loaded_category_id = getattr(instance, "_loaded_category_id", None)
+    if loaded_category_id not in (None, instance.category_id):
+        affected.append((instance.id, loaded_category_id))
+    invalidate_products(affected)
+    instance._loaded_category_id = instance.category_id
+    update_fields = kwargs.get("update_fields")
+    if update_fields is None or {"name", "description"} & set(update_fields):
+        index_products([instance])
 
-# Clear cache when a product is deleted
+# Invalidate a product's pages and drop it from the search index when it is deleted
 @receiver(post_delete, sender=Product)
 def product_deleted(sender, instance, **kwargs):
-    cache.clear()
+    summaries.product_deleted(instance, getattr(instance, "_loaded_summary", None))
+    invalidate_products([(instance.id, instance.category_id)])
+    unindex_products([instance.id])
 
-# Clear cache when a category is created, updated, or deleted
+# Invalidate the category list when a category is created or updated
 @receiver(post_save, sender=Category)
 def category_saved(sender, instance, **kwargs):
-    cache.clear()
+    invalidate_category(instance.id)
 
-# Clear cache when a category is deleted
+# Invalidate the category list when a category is deleted
 @receiver(post_delete, sender=Category)
 def category_deleted(sender, instance, **kwargs):
-    cache.clear()
+    invalidate_category(instance.id)
 
-# Clear cache when an order is deleted
-@receiver(post_save, sender=Order)
-def order_saved(sender, instance, created, **kwargs):
-    # cache cleared during create in view too, but this is a safety net
-    cache.clear()
+# Drop a user's cached JWT authentication entry when it is saved (deactivation,
+# password or permission changes) or deleted
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def user_changed(sender, instance, **kwargs):
+    invalidate_user(getattr(instance, api_settings.USER_ID_FIELD))
@@ -0,0 +1,91 @@
+from django.db.models import Count, F, Max, Min, OuterRef, Q, Subquery
+from .models import CATEGORY_SUMMARY_FIELDS, Category, Product, summary_state
+
+# Per-category catalogue summaries (Category.product_count, in_stock_count,
+# min_price and max_price).
+# Product saves and deletes adjust them in place: counts by deltas, and price
+# bounds re-read through the (category, price) index, so keeping them up to
+# date costs one UPDATE per affected category and never a scan. Writes that
+# bypass model signals call adjust_summary() or recompute_summaries()
+# themselves; manage.py verify_category_summaries detects and repairs drift.
+# in_stock_count counts stock on hand (stock > 0), whatever is reserved:
+# holds come and go within minutes and would churn the summaries.
+
+EMPTY_SUMMARY = {"product_count": 0, "in_stock_count": 0, "min_price": None, "max_price": None}
+
+
+def _price_bound(ordering):
+    return Subquery(Product.objects.filter(category=OuterRef("pk")).order_by(ordering).values("price")[:1])
+
+
+# Add count deltas to a category's summary and, with `prices`, re-read its
+# price bounds
+def adjust_summary(category_id, products=0, in_stock=0, prices=False):
+    updates = {}
+    if products:
+        updates["product_count"] = F("product_count") + products
+    if in_stock:
+        updates["in_stock_count"] = F("in_stock_count") + in_stock
+    if prices:
+        updates["min_price"] = _price_bound("price")
+        updates["max_price"] = _price_bound("-price")
+    if updates:
+        Category.objects.filter(pk=category_id).update(**updates)
+
+
+# Adjust summaries after a product was saved; `previous` is its
+# (category_id, stock, price) before the save, None if it was created
+def product_saved(product, previous):
+    category_id, stock, price = summary_state(product)
+    if previous is None:
+        adjust_summary(category_id, 1, int(stock > 0), prices=True)
+    elif previous[0] != category_id:
+        adjust_summary(previous[0], -1, -int(previous[1] > 0), prices=True)
+        adjust_summary(category_id, 1, int(stock > 0), prices=True)
+    else:
+        adjust_summary(category_id, in_stock=int(stock > 0) - int(previous[1] > 0), prices=previous[2] != price)
+
+
+def product_deleted(product, previous):
+    category_id, stock, _ = previous or summary_state(product)
+    adjust_summary(category_id, -1, -int(stock > 0), prices=True)
+
+
+# Summaries computed from the products, {category_id: summary}, for the given
+# categories or all of them; categories without products are left out
+def compute_summaries(category_ids=None):
+    products = Product.objects.all()
+    if category_ids is not None:
+        products = products.filter(category_id__in=category_ids)
+    rows = products.values("category_id").annotate(
+        product_count=Count("id"),
+        in_stock_count=Count("id", filter=Q(stock__gt=0)),
+        min_price=Min("price"),
+        max_price=Max("price"),
+    ).order_by()
+    return {row.pop("category_id"): row for row in rows}
+
+
+# Categories whose stored summary differs from their products, as
+# (category, actual summary) pairs
+def find_drift(category_ids=None):
+    actual = compute_summaries(category_ids)
+    categories = Category.objects.only("id", *CATEGORY_SUMMARY_FIELDS).order_by("id")
+    if category_ids is not None:
+        categories = categories.filter(pk__in=category_ids)
+    drift = []
+    for category in categories.iterator():
+        summary = actual.get(category.pk, EMPTY_SUMMARY)
+        if any(getattr(category, field) != value for field, value in summary.items()):
+            drift.append((category, summary))
+    return drift
+
+
+# Rewrite drifted summaries from the products; returns the repaired (category, actual summary) pairs
+def recompute_summaries(category_ids=None):
+    drift = find_drift(category_ids)
+    for category, summary in drift:
+        for field, value in summary.items():
+            setattr(category, field, value)
+    Category.objects.bulk_update([category for category, _ in drift], CATEGORY_SUMMARY_FIELDS, batch_size=500)
+    return drift
@@ -0,0 +1,128 @@
+from datetime import timedelta
+from io import StringIO
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from api.models import Category, Product, Order, SalesRollup
+
+
+class SalesRollupTests(APITestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username="admin", password="adminpass")
+        self.buyer = User.objects.create_user(username="buyer", password="buyerpass")
+        self.phones = Category.objects.create(name="Phones")
+        self.books = Category.objects.create(name="Books")
+        self.pixel = Product.objects.create(name="Pixel", price="500.00", stock=50, category=self.phones)
+        self.galaxy = Product.objects.create(name="Galaxy", price="400.00", stock=50, category=self.phones)
+        self.novel = Product.objects.create(name="Novel", price="12.50", stock=50, category=self.books)
+        self.url = reverse("analytics-sales")
+
+    def place(self, *lines):
+        self.client.force_authenticate(self.buyer)
+        items = [{"product_id": product.id, "quantity": quantity} for product, quantity in lines]
+        response = self.client.post(reverse("orders-list"), {"items": items}, format="json")
+        self.assertEqual(response.status_code, 201)
+        return response.json()["id"]
+
+    def report(self, **params):
+        self.client.force_authenticate(self.admin)
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def rollups(self):
+        return sorted(SalesRollup.objects.filter(orders__gt=0).values_list(
+            "day", "status", "dimension", "key", "revenue", "units", "orders"))
+
+    def test_orders_are_rolled_up_as_they_are_placed(self):
+        self.place((self.pixel, 1), (self.novel, 2), (self.pixel, 1))
+        self.place((self.galaxy, 1), (self.novel, 1))
+        data = self.report()
+        self.assertEqual(data["totals"], {"revenue": "1437.50", "units": 6, "orders": 2})
+        self.assertEqual(len(data["results"]), 30)
+        self.assertEqual(data["results"][-1]["day"], timezone.localdate().isoformat())
+        self.assertEqual(data["results"][-1]["orders"], 2)
+        data = self.report(group="category")
+        self.assertEqual(
+            [(row["name"], row["revenue"], row["units"], row["orders"]) for row in data["results"]],
+            [("Phones", "1400.00", 3, 2), ("Books", "37.50", 3, 2)],
+        )
+        data = self.report(group="product", limit=1)
+        self.assertEqual(data["results"], [
+            {"product_id": self.pixel.id, "name": "Pixel", "revenue": "1000.00", "units": 2, "orders": 1},
+        ])
+
+    def test_status_changes_and_deletes_move_the_figures(self):
+        first = self.place((self.pixel, 1))
+        second = self.place((self.novel, 4))
+        self.client.force_authenticate(self.admin)
+        self.client.patch(reverse("orders-detail", args=[first]), {"status": "shipped"}, format="json")
+        self.assertEqual(self.report(status="shipped")["totals"], {"revenue": "500.00", "units": 1, "orders": 1})
+        self.assertEqual(self.report(status="pending")["totals"], {"revenue": "50.00", "units": 4, "orders": 1})
+        self.client.delete(reverse("orders-detail", args=[second]))
+        self.assertEqual(self.report(status="pending")["totals"], {"revenue": "0.00", "units": 0, "orders": 0})
+
+    def test_orders_without_items_leave_the_rollups_alone(self):
+        self.place((self.pixel, 1))
+        # created outside the API, without items
+        empty = Order.objects.create(user=self.buyer, total_price=0)
+        before = self.rollups()
+        self.client.force_authenticate(self.admin)
+        response = self.client.patch(reverse("orders-detail", args=[empty.id]), {"status": "shipped"}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.delete(reverse("orders-detail", args=[empty.id])).status_code, 204)
+        self.assertEqual(self.rollups(), before)
+
+    def test_sales_stay_with_the_category_they_were_placed_in(self):
+        order = self.place((self.pixel, 1))
+        self.pixel.category = self.books
+        self.pixel.save()
+        self.client.force_authenticate(self.admin)
+        self.client.patch(reverse("orders-detail", args=[order]), {"status": "shipped"}, format="json")
+        categories = {
+            (row["status"], row["key"]): (str(row["revenue"]), row["orders"])
+            for row in SalesRollup.objects.filter(dimension="category").values("status", "key", "revenue", "orders")
+        }
+        self.assertEqual(categories[("pending", self.phones.id)], ("0.00", 0))
+        self.assertEqual(categories[("shipped", self.phones.id)], ("500.00", 1))
+        self.assertNotIn(("pending", self.books.id), categories)
+        incremental = self.rollups()
+        call_command("rebuild_sales_rollups", stdout=StringIO())
+        self.assertEqual(self.rollups(), incremental)
+        self.client.delete(reverse("orders-detail", args=[order]))
+        self.assertEqual(self.rollups(), [])
+
+    def test_rebuild_matches_incremental_rollups(self):
+        self.place((self.pixel, 1), (self.novel, 2))
+        order = self.place((self.galaxy, 3), (self.novel, 1))
+        self.client.force_authenticate(self.admin)
+        self.client.patch(reverse("orders-detail", args=[order]), {"status": "delivered"}, format="json")
+        # an order placed outside the API, yesterday
+        yesterday = Order.objects.create(user=self.buyer, total_price=500)
+        yesterday.items.create(product=self.pixel, quantity=1, price_at_purchase="500.00")
+        Order.objects.filter(pk=yesterday.pk).update(created_at=timezone.now() - timedelta(days=1))
+        incremental = self.rollups()
+        call_command("rebuild_sales_rollups", start=timezone.localdate().isoformat(), stdout=StringIO())
+        self.assertEqual(self.rollups(), incremental)
+        call_command("rebuild_sales_rollups", stdout=StringIO())
+        self.assertEqual(self.report()["totals"]["orders"], 3)
+
+    def test_report_reads_only_rollups(self):
+        self.place((self.pixel, 1))
+        self.client.force_authenticate(self.admin)
+        # totals and the grouped rows, plus the names for product rows
+        with self.assertNumQueries(2):
+            self.client.get(self.url)
+        with self.assertNumQueries(3):
+            self.client.get(self.url, {"group": "product"})
+
+    def test_endpoint_is_admin_only_and_validates_ranges(self):
+        self.client.force_authenticate(self.buyer)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.client.force_authenticate(self.admin)
+        response = self.client.get(self.url, {"start": "2026-02-01", "end": "2026-01-01"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("start", response.json())
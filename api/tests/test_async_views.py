@@ -0,0 +1,81 @@
+import json
+from asgiref.sync import sync_to_async
+from django.test import TestCase
+from django.urls import reverse
+from api.models import Category, Product
+
+
+class AsyncReadViewTests(TestCase):
+
+    def setUp(self):
+        self.phones = Category.objects.create(name="Phones", description="Mobiles")
+        self.books = Category.objects.create(name="Books", description="Reading")
+        for i in range(12):
+            Product.objects.create(name=f"Phone {i}", price=100 + i, stock=i % 3, category=self.phones)
+        Product.objects.create(name="Django Book", description="Learn Django", price=40, stock=3, category=self.books)
+
+    async def get_both(self, query=""):
+        sync_response = await sync_to_async(self.client.get)(reverse("products-list") + query)
+        async_response = await self.async_client.get(reverse("async-products-list") + query)
+        return sync_response, async_response
+
+    async def test_product_list_matches_sync_view(self):
+        for query in ("", "?page=2", "?page_size=5&ordering=-price", f"?category={self.phones.id}&in_stock=true",
+                      "?min_price=105&max_price=108", "?search=django"):
+            sync_response, async_response = await self.get_both(query)
+            self.assertEqual(async_response.status_code, 200, query)
+            sync_data, async_data = sync_response.json(), async_response.json()
+            self.assertEqual(async_data["count"], sync_data["count"], query)
+            self.assertEqual(async_data["results"], sync_data["results"], query)
+            self.assertEqual(async_data["next"] is None, sync_data["next"] is None, query)
+
+    async def test_second_request_is_served_from_cache(self):
+        url = reverse("async-products-list") + "?ordering=price"
+        first = await self.async_client.get(url)
+        second = await self.async_client.get(url)
+        self.assertEqual(first.content, second.content)
+
+    async def test_cache_is_invalidated_by_product_writes(self):
+        url = reverse("async-products-list") + f"?category={self.books.id}"
+        await self.async_client.get(url)
+        await Product.objects.acreate(name="Flask Book", price=30, stock=1, category=self.books)
+        response = await self.async_client.get(url)
+        self.assertEqual(response.json()["count"], 2)
+
+    async def test_keyset_pages_walk_the_whole_list(self):
+        url = reverse("async-products-list") + "?cursor=&ordering=price&page_size=5"
+        seen = []
+        while url:
+            data = (await self.async_client.get(url)).json()
+            seen += [row["id"] for row in data["results"]]
+            url = data["next"]
+        expected = [pk async for pk in Product.objects.order_by("price", "id").values_list("id", flat=True)]
+        self.assertEqual(seen, expected)
+
+    async def test_invalid_filters_and_pages_are_rejected(self):
+        response = await self.async_client.get(reverse("async-products-list") + "?min_price=cheap")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("min_price", response.json())
+        response = await self.async_client.get(reverse("async-products-list") + "?page=99")
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {"detail": "Invalid page."})
+        response = await self.async_client.get(reverse("async-products-list") + "?cursor=garbage")
+        self.assertEqual(response.status_code, 404)
+
+    async def test_product_detail(self):
+        product = await Product.objects.aget(name="Django Book")
+        response = await self.async_client.get(reverse("async-products-detail", args=[product.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["category"]["name"], "Books")
+        response = await self.async_client.get(reverse("async-products-detail", args=[999999]))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_category_list_matches_sync_view(self):
+        sync_response = await sync_to_async(self.client.get)(reverse("categories-list"))
+        async_response = await self.async_client.get(reverse("async-categories-list"))
+        self.assertEqual(async_response.status_code, 200)
+        self.assertEqual(json.loads(async_response.content), sync_response.json())
+
+    async def test_async_endpoints_are_read_only(self):
+        response = await self.async_client.post(reverse("async-products-list"), {})
+        self.assertEqual(response.status_code, 405)
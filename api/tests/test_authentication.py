@@ -0,0 +1,63 @@
+from unittest import mock
+from django.contrib.auth.models import User
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.tokens import RefreshToken
+from api import authentication
+from api.models import Category, Product
+
+
+class CachedJWTAuthenticationTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="alice", password="password123")
+        self.url = reverse("orders-list")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}")
+
+    def test_users_are_served_from_the_cache(self):
+        # the user lookup, then the (empty) order page
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        user = response.wsgi_request.user
+        self.assertEqual((user.pk, user.username), (self.user.pk, "alice"))
+        # the password hash isn't cached; it's loaded on first access
+        self.assertEqual(user.get_deferred_fields(), {"password"})
+        self.assertTrue(user.check_password("password123"))
+
+    def test_user_changes_invalidate_the_entry(self):
+        self.client.get(self.url)
+        self.user.set_password("new-password")
+        self.user.save()
+        with self.assertNumQueries(2):
+            self.client.get(self.url)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+        self.user.delete()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_orders_are_placed_as_the_cached_user(self):
+        self.client.get(self.url)
+        category = Category.objects.create(name="Phones")
+        product = Product.objects.create(name="Pixel", price="500.00", stock=5, category=category)
+        response = self.client.post(self.url, {"items": [{"product_id": product.id, "quantity": 1}]}, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.user.orders.count(), 1)
+
+    def test_stateless_reads_skip_the_lookup(self):
+        self.client.get(reverse("categories-list"))
+        with mock.patch.object(authentication, "STATELESS_READS", True):
+            # a cached page with an uncached user
+            self.user.save()
+            with self.assertNumQueries(0):
+                response = self.client.get(reverse("categories-list"))
+            self.assertIsInstance(response.wsgi_request.user, TokenUser)
+            self.assertEqual(response.wsgi_request.user.id, str(self.user.pk))
+            # only for safe methods on views that opt in
+            self.assertIsInstance(self.client.get(self.url).wsgi_request.user, User)
+            response = self.client.post(reverse("categories-list"), {"name": "Books"}, format="json")
+            self.assertEqual(response.status_code, 403)
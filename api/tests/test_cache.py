@@ -0,0 +1,71 @@
+import gzip
+import json
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from api.models import Category, Product
+from api.cache import category_list_key, product_list_key
+
+
+class VersionedCacheTests(TestCase):
+
+    def setUp(self):
+        self.phones = Category.objects.create(name="Phones", description="Mobiles")
+        self.books = Category.objects.create(name="Books", description="Reading")
+        self.phone = Product.objects.create(name="Pixel", price=500, stock=5, category=self.phones)
+
+    def test_product_change_only_invalidates_its_category(self):
+        phones_key = product_list_key("/api/products/", category_id=self.phones.id)
+        books_key = product_list_key("/api/products/", category_id=self.books.id)
+        all_key = product_list_key("/api/products/")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.phone.stock = 4
+            self.phone.save()
+        self.assertNotEqual(product_list_key("/api/products/", category_id=self.phones.id), phones_key)
+        self.assertNotEqual(product_list_key("/api/products/"), all_key)
+        self.assertEqual(product_list_key("/api/products/", category_id=self.books.id), books_key)
+
+    def test_moving_product_invalidates_both_categories(self):
+        phones_key = product_list_key("/api/products/", category_id=self.phones.id)
+        books_key = product_list_key("/api/products/", category_id=self.books.id)
+        phone = Product.objects.get(pk=self.phone.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            phone.category = self.books
+            phone.save()
+        self.assertNotEqual(product_list_key("/api/products/", category_id=self.phones.id), phones_key)
+        self.assertNotEqual(product_list_key("/api/products/", category_id=self.books.id), books_key)
+
+    def test_category_change_invalidates_category_list(self):
+        categories_key = category_list_key()
+        books_key = product_list_key("/api/products/", category_id=self.books.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.phones.description = "Smartphones"
+            self.phones.save()
+        self.assertNotEqual(category_list_key(), categories_key)
+        self.assertEqual(product_list_key("/api/products/", category_id=self.books.id), books_key)
+
+
+class ProductListCacheTests(APITestCase):
+
+    def setUp(self):
+        self.phones = Category.objects.create(name="Phones", description="Mobiles")
+        self.books = Category.objects.create(name="Books", description="Reading")
+        for i in range(3):
+            Product.objects.create(name=f"Phone {i}", description="x" * 500, price=100 + i, stock=5, category=self.phones)
+        Product.objects.create(name="Novel", price=10, stock=5, category=self.books)
+        self.url = reverse("products-list")
+
+    def test_cache_hit_serves_filtered_page_without_queries(self):
+        first = self.client.get(f"{self.url}?category={self.phones.id}")
+        self.assertEqual(first.status_code, 200)
+        with self.assertNumQueries(0):
+            second = self.client.get(f"{self.url}?page=1&category={self.phones.id}")
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(json.loads(second.content), first.data)
+        self.assertEqual(second.json()["count"], 3)
+
+    def test_cache_hit_serves_gzip_body(self):
+        first = self.client.get(self.url)
+        second = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(second["Content-Encoding"], "gzip")
+        self.assertEqual(json.loads(gzip.decompress(second.content)), json.loads(first.content))
@@ -0,0 +1,123 @@
+import threading
+import time
+import uuid
+from django.conf import settings
+from django.test import SimpleTestCase
+from api.cache_backends import LocalLRU, LocalTier, TwoTierRedisCache
+
+
+def make_backend(channel, separate_process=False):
+    backend = TwoTierRedisCache(settings.CACHES["default"]["LOCATION"], {
+        "KEY_PREFIX": "two-tier-test",
+        "OPTIONS": {
+            "CLIENT_CLASS": "django_redis.client.DefaultClient",
+            "LOCAL_KEY_PREFIXES": ("ver:",),
+            "INVALIDATION_CHANNEL": channel,
+        },
+    })
+    if separate_process:
+        # backends share their process' tier; give this one its own, like another worker
+        backend.tier = LocalTier(channel, 100, 1024 * 1024, 30)
+    return backend
+
+
+def wait_for(condition, timeout=3):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class TwoTierCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        channel = f"test-invalidate-{uuid.uuid4().hex}"
+        self.worker_a = make_backend(channel, separate_process=True)
+        self.worker_b = make_backend(channel, separate_process=True)
+        for worker in (self.worker_a, self.worker_b):
+            self.assertTrue(wait_for(worker._local_ready))
+        self.key = f"ver:{uuid.uuid4().hex}"
+
+    def tearDown(self):
+        self.worker_a.delete(self.key)
+
+    def test_repeated_reads_are_served_locally(self):
+        self.worker_a.set(self.key, 1, None)
+        self.assertEqual([self.worker_a.get(self.key) for _ in range(3)], [1, 1, 1])
+        stats = self.worker_a.stats()
+        self.assertEqual((stats["redis_hits"], stats["local_hits"]), (1, 2))
+        self.assertEqual(stats["local_entries"], 1)
+
+    def test_writes_invalidate_other_workers(self):
+        self.worker_a.set(self.key, 1, None)
+        self.assertEqual(self.worker_b.get(self.key), 1)
+        self.worker_a.set_many({self.key: 2}, None)
+        self.assertTrue(wait_for(lambda: self.worker_b.get(self.key) == 2))
+        self.worker_a.delete(self.key)
+        self.assertTrue(wait_for(lambda: self.worker_b.get(self.key) is None))
+
+    def test_get_many_mixes_tiers(self):
+        other = f"ver:{uuid.uuid4().hex}"
+        self.worker_a.set_many({self.key: 1, other: 2}, None)
+        self.worker_a.get(self.key)
+        self.worker_a.reset_stats()
+        self.assertEqual(self.worker_a.get_many([self.key, other, "ver:missing"]), {self.key: 1, other: 2})
+        stats = self.worker_a.stats()
+        self.assertEqual((stats["local_hits"], stats["redis_hits"], stats["redis_misses"]), (1, 1, 1))
+        self.worker_a.delete(other)
+
+    def test_other_keys_skip_the_local_tier(self):
+        key = f"page:{uuid.uuid4().hex}"
+        self.worker_a.set(key, "x", 60)
+        self.assertEqual(self.worker_a.get(key), "x")
+        self.assertEqual(self.worker_a.stats()["local_entries"], 0)
+        self.worker_a.delete(key)
+
+    def test_values_raced_by_an_invalidation_are_not_kept(self):
+        tier = self.worker_a.tier
+        generation = tier.generation
+        tier.drop(["unrelated"])
+        tier.store("k", 1, generation)
+        self.assertEqual(tier.get("k"), (False, None))
+
+
+class LocalLRUTests(SimpleTestCase):
+
+    def test_entry_and_byte_caps_evict_least_recently_used(self):
+        lru = LocalLRU(max_entries=2, max_bytes=10_000)
+        lru.set("a", 1, 60)
+        lru.set("b", 2, 60)
+        lru.get("a")
+        lru.set("c", 3, 60)
+        self.assertEqual([lru.get(key)[0] for key in "abc"], [True, False, True])
+        lru = LocalLRU(max_entries=100, max_bytes=300)
+        for key in "abcd":
+            lru.set(key, "x" * 100, 60)
+        self.assertLessEqual(lru.bytes, 300)
+        self.assertFalse(lru.get("a")[0])
+        self.assertTrue(lru.get("d")[0])
+
+    def test_entries_expire(self):
+        lru = LocalLRU(max_entries=10, max_bytes=10_000)
+        lru.set("a", {"n": 1}, 0.01)
+        time.sleep(0.02)
+        self.assertEqual(lru.get("a"), (False, None))
+        self.assertEqual(lru.bytes, 0)
+
+
+class LocalTierTests(SimpleTestCase):
+
+    def test_counters_keep_concurrent_increments(self):
+        tier = LocalTier("unused", 10, 10_000, 30)
+        threads = [
+            threading.Thread(target=lambda: [tier.count("local_hits") for _ in range(10_000)]) for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(tier.stats()["local_hits"], 80_000)
+        tier.reset_stats()
+        self.assertEqual(tier.stats()["local_hits"], 0)
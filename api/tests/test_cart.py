@@ -0,0 +1,95 @@
+from unittest import mock
+from django.contrib.auth.models import User
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from api import cart
+from api.models import Category, Product, Order, OutboxMessage
+
+
+class CartTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="carol", password="password123")
+        self.client.force_authenticate(self.user)
+        cart.clear_cart(self.user.id)
+        self.addCleanup(cart.clear_cart, self.user.id)
+        category = Category.objects.create(name="Gadgets")
+        self.products = [
+            Product.objects.create(name=f"Gadget {i}", price=10 + i, stock=5, category=category) for i in range(3)
+        ]
+        self.url = reverse("cart-list")
+
+    def add(self, product, quantity=1):
+        return self.client.post(self.url, {"product_id": product.id, "quantity": quantity}, format="json")
+
+    def test_changing_the_cart_runs_no_sql(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(self.add(self.products[0], 2).data, {"product_id": self.products[0].id, "quantity": 2})
+            self.assertEqual(self.add(self.products[0]).data["quantity"], 3)
+            self.add(self.products[1])
+            response = self.client.patch(reverse("cart-detail", args=[self.products[1].id]), {"quantity": 4}, format="json")
+            self.assertEqual(response.data["quantity"], 4)
+            self.add(self.products[2])
+            self.client.delete(reverse("cart-detail", args=[self.products[2].id]))
+        self.assertEqual(cart.get_cart(self.user.id), {self.products[0].id: 3, self.products[1].id: 4})
+        self.client.put(reverse("cart-detail", args=[self.products[0].id]), {"quantity": 0}, format="json")
+        self.assertEqual(cart.get_cart(self.user.id), {self.products[1].id: 4})
+        self.client.post(reverse("cart-clear"))
+        self.assertEqual(cart.get_cart(self.user.id), {})
+
+    def test_contents_are_priced_in_one_query(self):
+        self.add(self.products[0], 2)
+        self.add(self.products[1], 6)
+        self.add(self.products[2])
+        self.products[2].delete()
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        first, short, gone = response.data["items"]
+        self.assertEqual((first["price"], first["subtotal"], first["available"]), ("10.00", "20.00", True))
+        self.assertFalse(short["available"])
+        self.assertEqual((gone["name"], gone["available"]), (None, False))
+        # unavailable lines don't count
+        self.assertEqual(response.data["total"], "20.00")
+
+    def test_carts_are_per_user(self):
+        self.add(self.products[0])
+        other = User.objects.create_user(username="dave", password="password123")
+        self.addCleanup(cart.clear_cart, other.id)
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(self.url).data["items"], [])
+
+    def test_limits(self):
+        response = self.add(self.products[0], cart.MAX_QUANTITY + 1)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(self.url, {"product_id": 2**63}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        with mock.patch.object(cart, "MAX_LINES", 1):
+            self.add(self.products[0])
+            self.assertEqual(self.add(self.products[1]).status_code, status.HTTP_400_BAD_REQUEST)
+            # existing lines can still change
+            self.assertEqual(self.add(self.products[0]).status_code, status.HTTP_201_CREATED)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_checkout_places_the_order(self):
+        self.add(self.products[0], 2)
+        self.add(self.products[1])
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse("cart-checkout"))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        order = Order.objects.get()
+        self.assertEqual((order.user, str(order.total_price)), (self.user, "31.00"))
+        self.assertEqual(response.data["id"], order.id)
+        self.products[0].refresh_from_db()
+        self.assertEqual(self.products[0].stock, 3)
+        self.assertEqual(OutboxMessage.objects.count(), 1)
+        self.assertEqual(cart.get_cart(self.user.id), {})
+
+    def test_failed_checkout_keeps_the_cart(self):
+        self.assertEqual(self.client.post(reverse("cart-checkout")).status_code, status.HTTP_400_BAD_REQUEST)
+        self.add(self.products[0], 6)
+        response = self.client.post(reverse("cart-checkout"))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Order.objects.count(), 0)
+        self.assertEqual(cart.get_cart(self.user.id), {self.products[0].id: 6})
@@ -0,0 +1,150 @@
+import threading
+import uuid
+from unittest import mock
+from django.contrib.auth.models import User
+from django.db import OperationalError
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from django.test import SimpleTestCase
+from api import checkout, flashsale, orders
+from api.checkout import InMemoryQueue, RedisStreamQueue, process_batch, run_worker
+from api.models import Category, Product, Order, OutboxMessage
+from api.outbox import user_group
+
+
+class AsyncCheckoutTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="hana", password="password123")
+        self.client.force_authenticate(self.user)
+        category = Category.objects.create(name="Audio")
+        self.product = Product.objects.create(name="Headphones", price="80.00", stock=3, category=category)
+        self.queue = InMemoryQueue()
+        for patcher in (mock.patch.object(checkout, "ENABLED", True), mock.patch.object(checkout, "_queue", self.queue)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.url = reverse("orders-list")
+
+    def submit(self, quantity, **headers):
+        data = {"items": [{"product_id": self.product.id, "quantity": quantity}]}
+        return self.client.post(self.url, data, format="json", HTTP_PREFER="respond-async", **headers)
+
+    def drain(self):
+        return process_batch([submission for _, submission in self.queue.get_batch(100)])
+
+    def test_submissions_are_accepted_without_placing_the_order(self):
+        with self.assertNumQueries(0):
+            response = self.submit(2)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        ticket = response.data["ticket"]
+        self.assertEqual(response["Location"], f"http://testserver/api/orders/checkout/{ticket}/")
+        self.assertEqual(Order.objects.count(), 0)
+        self.assertEqual(self.client.get(response["Location"]).data, {"ticket": ticket, "status": "queued"})
+        # invalid carts are refused right away
+        response = self.client.post(self.url, {"items": []}, format="json", HTTP_PREFER="respond-async")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        # without the preference, orders are placed in the request
+        data = {"items": [{"product_id": self.product.id, "quantity": 1}]}
+        self.assertEqual(self.client.post(self.url, data, format="json").status_code, status.HTTP_201_CREATED)
+
+    def test_workers_place_batches_and_report_each_outcome(self):
+        placed = self.submit(2).data["ticket"]
+        short = self.submit(2).data["ticket"]
+        results = self.drain()
+        order = Order.objects.get()
+        self.assertEqual(results[placed], {"status": "placed", "order_id": order.id})
+        self.assertEqual(results[short], {"status": "failed", "errors": ["Not enough stock for Headphones"]})
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 1)
+        messages = {
+            message.payload["ticket"]: message.payload
+            for message in OutboxMessage.objects.filter(group=user_group(self.user.id), payload__type="order.checkout")
+        }
+        self.assertEqual(messages[placed]["order_id"], order.id)
+        self.assertEqual(messages[short]["status"], "failed")
+        response = self.client.get(reverse("orders-checkout-ticket", args=[placed]))
+        self.assertEqual(response.data, {"ticket": placed, "status": "placed", "order_id": order.id})
+        self.client.force_authenticate(User.objects.create_user(username="ivan", password="password123"))
+        self.assertEqual(self.client.get(reverse("orders-checkout-ticket", args=[placed])).status_code, 404)
+
+    def test_redelivered_submissions_are_placed_once(self):
+        ticket = self.submit(1).data["ticket"]
+        submissions = [submission for _, submission in self.queue.get_batch(10)]
+        first = process_batch(submissions)
+        self.assertEqual(process_batch(submissions), first)
+        self.assertEqual(Order.objects.filter(checkout_ticket=ticket).count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 2)
+
+    def failing(self, target, name, calls):
+        real = getattr(target, name)
+        count = iter(range(1, 100))
+
+        def call(*args, **kwargs):
+            if next(count) in calls:
+                raise OperationalError("database is locked")
+            return real(*args, **kwargs)
+        return mock.patch.object(target, name, side_effect=call)
+
+    def sale_stock(self):
+        return int(flashsale._redis().get(flashsale.stock_key(self.product.id)))
+
+    def test_database_errors_fail_one_order_and_give_back_sale_stock(self):
+        flashsale.start_flash_sale(self.product.id)
+        self.addCleanup(flashsale.end_flash_sale, self.product.id)
+        placed, failed = self.submit(1).data["ticket"], self.submit(1).data["ticket"]
+        with self.failing(orders, "_place_order", {2}), self.assertLogs("api.checkout", "ERROR"):
+            results = self.drain()
+        self.assertEqual(results[placed]["status"], "placed")
+        self.assertEqual(results[failed], {"status": "failed", "errors": [checkout.PLACEMENT_ERROR]})
+        self.assertEqual(self.sale_stock(), 2)
+
+    def test_rolled_back_batches_give_back_sale_stock(self):
+        flashsale.start_flash_sale(self.product.id)
+        self.addCleanup(flashsale.end_flash_sale, self.product.id)
+        self.submit(1)
+        self.submit(1)
+        with self.failing(checkout, "enqueue", {2}), self.assertRaises(OperationalError):
+            self.drain()
+        self.assertEqual(Order.objects.count(), 0)
+        self.assertEqual(self.sale_stock(), 3)
+
+    def test_local_workers_retry_failed_batches_one_by_one(self):
+        placed, failed = self.submit(1).data["ticket"], self.submit(1).data["ticket"]
+        stop = threading.Event()
+        real = checkout.process_batch
+
+        def process(submissions):
+            # the batch fails, then the second submission alone
+            if len(submissions) > 1 or submissions[0]["ticket"] == failed:
+                raise OperationalError("database is locked")
+            stop.set()
+            return real(submissions)
+
+        with mock.patch.object(checkout, "process_batch", side_effect=process), \
+                mock.patch.object(checkout, "connection"), self.assertLogs("api.checkout", "ERROR"):
+            run_worker(self.queue, timeout=0, stop=stop)
+        self.assertEqual(Order.objects.get().checkout_ticket, placed)
+        response = self.client.get(reverse("orders-checkout-ticket", args=[failed]))
+        self.assertEqual(response.data, {"ticket": failed, "status": "failed", "errors": [checkout.PLACEMENT_ERROR]})
+        message = OutboxMessage.objects.get(payload__type="order.checkout", payload__ticket=failed)
+        self.assertEqual(message.payload["status"], "failed")
+
+
+class RedisStreamQueueTests(SimpleTestCase):
+
+    def test_entries_are_delivered_once_and_claimed_back_from_dead_workers(self):
+        stream = f"checkout-test-{uuid.uuid4().hex}"
+        producer, worker = RedisStreamQueue(stream=stream), RedisStreamQueue(stream=stream)
+        self.addCleanup(producer.redis.delete, stream)
+        for number in range(3):
+            producer.put({"ticket": str(number)})
+        entries = worker.get_batch(2)
+        self.assertEqual([submission for _, submission in entries], [{"ticket": "0"}, {"ticket": "1"}])
+        worker.ack([entry_id for entry_id, _ in entries])
+        # the third entry goes to a worker that dies without acknowledging it
+        self.assertEqual(len(RedisStreamQueue(stream=stream).get_batch(10)), 1)
+        self.assertEqual(worker.get_batch(10), [])
+        with mock.patch.object(RedisStreamQueue, "CLAIM_IDLE_MS", 0):
+            self.assertEqual([submission for _, submission in worker.get_batch(10)], [{"ticket": "2"}])
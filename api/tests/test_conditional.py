@@ -0,0 +1,121 @@
+import time
+from unittest import mock
+from django.contrib.auth.models import User
+from django.urls import reverse
+from django.utils.http import http_date
+from rest_framework.test import APITestCase
+from api import conditional
+from api.cache import bump, product_namespaces, PRODUCTS_NS, CATEGORIES_NS
+from api.models import Category, Product
+
+
+# Read responses as if `seconds` had passed since the latest change
+def later(seconds=2):
+    return mock.patch.object(conditional, "time", **{"time_ns.return_value": time.time_ns() + seconds * 1_000_000_000})
+
+
+class ConditionalReadTests(APITestCase):
+
+    def setUp(self):
+        # generations no earlier test has validators for
+        bump(PRODUCTS_NS, CATEGORIES_NS)
+        self.phones = Category.objects.create(name="Phones")
+        self.product = Product.objects.create(name="Pixel", price=500, stock=3, category=self.phones)
+
+    def assert_revalidates(self, url, change):
+        with later():
+            first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertIn("no-cache", first["Cache-Control"])
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], first["ETag"])
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=first["Last-Modified"])
+        self.assertEqual(response.status_code, 304)
+        change()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], first["ETag"])
+
+    def test_product_list(self):
+        self.assert_revalidates(
+            reverse("products-list") + "?ordering=price",
+            lambda: Product.objects.create(name="Galaxy", price=400, stock=1, category=self.phones),
+        )
+
+    def test_category_list(self):
+        self.assert_revalidates(
+            reverse("categories-list"),
+            lambda: Category.objects.create(name="Books"),
+        )
+
+    def test_product_detail(self):
+        def change():
+            self.product.price = 450
+            self.product.save()
+        self.assert_revalidates(reverse("products-detail", args=[self.product.id]), change)
+
+    def test_product_detail_follows_its_category(self):
+        url = reverse("products-detail", args=[self.product.id])
+        etag = self.client.get(url)["ETag"]
+        self.phones.description = "Smartphones"
+        self.phones.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_async_endpoints_revalidate(self):
+        for url in (reverse("async-products-list"), reverse("async-categories-list"),
+                    reverse("async-products-detail", args=[self.product.id])):
+            first = self.client.get(url)
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"]).status_code, 304, url)
+
+    def test_browsable_api_is_not_conditional(self):
+        response = self.client.get(reverse("products-detail", args=[self.product.id]), HTTP_ACCEPT="text/html")
+        self.assertFalse(response.has_header("ETag"))
+
+
+class ConditionalWriteTests(APITestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username="admin", password="adminpass")
+        self.client.force_authenticate(self.admin)
+        phones = Category.objects.create(name="Phones")
+        self.product = Product.objects.create(name="Pixel", price=500, stock=3, category=phones)
+        self.url = reverse("products-detail", args=[self.product.id])
+
+    def test_edit_from_outdated_copy_is_rejected(self):
+        etag = self.client.get(self.url)["ETag"]
+        response = self.client.patch(self.url, {"price": "450.00"}, format="json", HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        response = self.client.patch(self.url, {"price": "400.00"}, format="json", HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+        self.product.refresh_from_db()
+        self.assertEqual(str(self.product.price), "450.00")
+        response = self.client.delete(self.url, HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+        response = self.client.delete(self.url, HTTP_IF_MATCH=self.client.get(self.url)["ETag"])
+        self.assertEqual(response.status_code, 204)
+
+    def test_dates_never_hide_changes_within_the_same_second(self):
+        clock = mock.Mock(return_value=1_700_000_000_100_000_000)
+        with mock.patch("time.time_ns", clock):
+            bump(*product_namespaces(self.product.id))
+            clock.return_value += 100_000_000
+            # the copy's second isn't over, so it comes without a date
+            self.assertFalse(self.client.get(self.url).has_header("Last-Modified"))
+            # a date from that second doesn't vouch for the copy
+            response = self.client.patch(
+                self.url, {"stock": 5}, format="json", HTTP_IF_UNMODIFIED_SINCE=http_date(1_700_000_000),
+            )
+            self.assertEqual(response.status_code, 412)
+            clock.return_value += 1_000_000_000
+            date = self.client.get(self.url)["Last-Modified"]
+            self.assertEqual(date, http_date(1_700_000_001))
+            response = self.client.patch(self.url, {"stock": 5}, format="json", HTTP_IF_UNMODIFIED_SINCE=date)
+            self.assertEqual(response.status_code, 200)
+            response = self.client.patch(self.url, {"stock": 6}, format="json", HTTP_IF_UNMODIFIED_SINCE=date)
+            self.assertEqual(response.status_code, 412)
+
+    def test_writes_without_preconditions_are_unchanged(self):
+        response = self.client.patch(self.url, {"stock": 7}, format="json")
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,66 @@
+import csv
+import io
+import json
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+from api.models import Category, Product, Order, OrderItem
+
+
+class OrderExportTests(APITestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username="admin", password="adminpass")
+        self.user = User.objects.create_user(username="buyer", password="buyerpass")
+        category = Category.objects.create(name="Books")
+        self.book = Product.objects.create(sku="B-1", name="Django Book", price=40, stock=10, category=category)
+        self.pen = Product.objects.create(name="Pen", price="1.50", stock=10, category=category)
+        self.order = Order.objects.create(user=self.user, total_price="83.00")
+        OrderItem.objects.create(order=self.order, product=self.book, quantity=2, price_at_purchase=40)
+        OrderItem.objects.create(order=self.order, product=self.pen, quantity=2, price_at_purchase="1.50")
+        self.old = Order.objects.create(user=self.user, status="delivered", total_price=0)
+        Order.objects.filter(pk=self.old.pk).update(created_at=timezone.now() - timedelta(days=30))
+        self.url = reverse("orders-export")
+
+    def read(self, response):
+        return b"".join(response.streaming_content).decode()
+
+    def test_csv_has_one_row_per_item(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertIn("attachment;", response["Content-Disposition"])
+        rows = list(csv.DictReader(io.StringIO(self.read(response))))
+        self.assertEqual([(r["order_id"], r["sku"], r["quantity"]) for r in rows], [
+            (str(self.order.id), "B-1", "2"),
+            (str(self.order.id), "", "2"),
+            (str(self.old.id), "", ""),
+        ])
+        self.assertEqual(rows[1]["price_at_purchase"], "1.50")
+        self.assertEqual(rows[0]["username"], "buyer")
+
+    def test_ndjson_with_filters(self):
+        self.client.force_authenticate(self.admin)
+        since = (timezone.now() - timedelta(days=1)).date().isoformat()
+        response = self.client.get(self.url, {"output": "ndjson", "status": "pending", "created_after": since})
+        records = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual(len(records), 2)
+        self.assertEqual(records[0]["order_id"], self.order.id)
+        self.assertEqual(records[0]["total_price"], "83.00")
+        response = self.client.get(self.url, {"output": "ndjson", "status": "delivered"})
+        self.assertEqual([json.loads(line)["order_id"] for line in self.read(response).splitlines()], [self.old.id])
+
+    def test_invalid_parameters_are_rejected(self):
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(self.client.get(self.url, {"output": "xml"}).status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(self.url, {"created_before": "yesterday"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("created_before", response.data)
+
+    def test_export_is_admin_only(self):
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
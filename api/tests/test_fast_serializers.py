@@ -0,0 +1,94 @@
+from unittest import mock
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.permissions import BasePermission, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+from api.models import Category, Product, Order, OrderItem
+from api.renderers import ORJSONRenderer
+from api.serializers import OrderSerializer, ProductSerializer
+from api.views import OrderViewSet
+from api.fast_serializers import order_rows, order_values, product_rows, product_values
+
+
+# An object-level permission reading the model instance
+class IsOrderOwner(BasePermission):
+
+    def has_object_permission(self, request, view, obj):
+        return obj.user == request.user
+
+
+def make_catalogue():
+    phones = Category.objects.create(name="Phones", description="Smart\u2028phones")
+    books = Category.objects.create(name="Bücher", description="")
+    products = [
+        Product.objects.create(sku="P-1", name="Pixel \"9\"", description="línea nueva 📱", price="499.90", stock=3, category=phones),
+        Product.objects.create(name="Kindle", price=120, stock=0, category=books),
+        Product.objects.create(sku="B-1", name="Two Scoops", price="0.05", stock=12, category=books),
+    ]
+    return products
+
+
+class FastSerializerOutputTests(TestCase):
+
+    def setUp(self):
+        self.products = make_catalogue()
+        self.user = User.objects.create_user(username="buyer", password="buyerpass")
+        self.order = Order.objects.create(user=self.user, total_price="619.90")
+        OrderItem.objects.create(order=self.order, product=self.products[0], quantity=1, price_at_purchase="499.90")
+        OrderItem.objects.create(order=self.order, product=self.products[1], quantity=1, price_at_purchase=120)
+        Order.objects.create(user=self.user, status="shipped", total_price=0)
+
+    def test_products_render_byte_for_byte(self):
+        expected = JSONRenderer().render(ProductSerializer(Product.objects.order_by("id"), many=True).data)
+        rows = product_rows(product_values(Product.objects.order_by("id")))
+        self.assertEqual(ORJSONRenderer().render(rows), expected)
+        self.assertEqual(JSONRenderer().render(rows), expected)
+
+    def test_orders_render_byte_for_byte(self):
+        expected = JSONRenderer().render(OrderSerializer(Order.objects.order_by("id"), many=True).data)
+        with self.assertNumQueries(2):
+            rows = order_rows(order_values(Order.objects.prefetch_related("items").order_by("id")))
+        self.assertEqual(ORJSONRenderer().render(rows), expected)
+
+    def test_category_dicts_are_shared(self):
+        rows = product_rows(product_values(Product.objects.order_by("id")))
+        self.assertIs(rows[1]["category"], rows[2]["category"])
+
+    def test_renderer_falls_back_for_indented_output(self):
+        data = {"a": [1, "\u2029"]}
+        self.assertEqual(
+            ORJSONRenderer().render(data, "application/json; indent=2"),
+            JSONRenderer().render(data, "application/json; indent=2"),
+        )
+
+
+class FastReadEndpointTests(APITestCase):
+
+    def setUp(self):
+        self.products = make_catalogue()
+
+    def test_list_and_retrieve_match_model_serializers(self):
+        response = self.client.get(reverse("products-list"), {"ordering": "price"})
+        expected = ProductSerializer(Product.objects.order_by("price"), many=True).data
+        self.assertEqual(response.content, JSONRenderer().render({
+            "count": 3, "next": None, "previous": None, "results": expected,
+        }))
+        product = self.products[0]
+        response = self.client.get(reverse("products-detail", args=[product.id]))
+        self.assertEqual(response.content, JSONRenderer().render(ProductSerializer(product).data))
+        self.assertEqual(self.client.get(reverse("products-detail", args=[999999])).status_code, 404)
+
+    def test_object_permissions_are_checked_on_model_instances(self):
+        buyer = User.objects.create_user(username="buyer", password="buyerpass")
+        order = Order.objects.create(user=buyer, total_price="499.90")
+        OrderItem.objects.create(order=order, product=self.products[0], quantity=1, price_at_purchase="499.90")
+        url = reverse("orders-detail", args=[order.id])
+        with mock.patch.object(OrderViewSet, "permission_classes", (IsAuthenticated, IsOrderOwner)):
+            self.client.force_authenticate(buyer)
+            response = self.client.get(url)
+            self.assertEqual(response.content, JSONRenderer().render(OrderSerializer(order).data))
+            # an admin sees every order, but isn't this one's owner
+            self.client.force_authenticate(User.objects.create_superuser(username="root", password="rootpass"))
+            self.assertEqual(self.client.get(url).status_code, 403)
@@ -0,0 +1,159 @@
+import threading
+from io import StringIO
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TransactionTestCase
+from django.urls import reverse
+from rest_framework import serializers, status
+from rest_framework.test import APITestCase
+from api import flashsale, orders
+from api.flashsale import end_flash_sale, reconcile, start_flash_sale
+from api.models import Category, Product, Order
+from api.orders import place_order
+
+
+def forget_sale(product_id):
+    redis = flashsale._redis()
+    redis.delete(flashsale.stock_key(product_id))
+    redis.hdel(flashsale.SALES_KEY, product_id)
+    redis.hdel(flashsale.NAMES_KEY, product_id)
+
+
+def sale_stock(product_id):
+    stock = flashsale._redis().get(flashsale.stock_key(product_id))
+    return None if stock is None else int(stock)
+
+
+class FlashSaleTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="erin", password="password123")
+        self.category = Category.objects.create(name="Drops")
+        self.hot = Product.objects.create(name="Sneaker", price="100.00", stock=3, category=self.category)
+        self.other = Product.objects.create(name="Laces", price="5.00", stock=1, category=self.category)
+        for product in (self.hot, self.other):
+            self.addCleanup(forget_sale, product.id)
+
+    def buy(self, *lines):
+        return place_order(self.user, [{"product_id": product.id, "quantity": qty} for product, qty in lines])
+
+    def test_admin_starts_and_ends_sales(self):
+        url = reverse("products-flash-sale", args=[self.hot.id])
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.post(url).status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(User.objects.create_superuser(username="root", password="rootpass"))
+        response = self.client.post(url)
+        self.assertEqual(response.data, {"product_id": self.hot.id, "flash_sale": True, "stock": 3})
+        self.assertEqual(sale_stock(self.hot.id), 3)
+        self.buy((self.hot, 2))
+        response = self.client.delete(url)
+        self.assertEqual(response.data, {"product_id": self.hot.id, "flash_sale": False, "stock": 1})
+        self.assertIsNone(sale_stock(self.hot.id))
+        self.assertEqual(self.client.delete(url).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.post(reverse("products-flash-sale", args=[999999])).status_code, 404)
+
+    def test_admitted_orders_leave_the_row_to_reconciliation(self):
+        start_flash_sale(self.hot.id)
+        order = self.buy((self.hot, 2), (self.other, 1))
+        self.assertEqual(order.total_price, 205)
+        self.assertEqual(sale_stock(self.hot.id), 1)
+        self.hot.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual((self.hot.stock, self.other.stock), (3, 0))
+        self.assertEqual(reconcile(), {self.hot.id: 1})
+        self.hot.refresh_from_db()
+        self.assertEqual(self.hot.stock, 1)
+
+    def test_sold_out_buyers_are_refused_before_the_database(self):
+        start_flash_sale(self.hot.id)
+        self.buy((self.hot, 3))
+        with self.assertNumQueries(0), self.assertRaises(serializers.ValidationError) as refused:
+            self.buy((self.hot, 1))
+        self.assertEqual(refused.exception.detail, ["Not enough stock for Sneaker"])
+        self.assertEqual(sale_stock(self.hot.id), 0)
+        self.assertEqual(end_flash_sale(self.hot.id), 0)
+        self.category.refresh_from_db()
+        self.assertEqual(self.category.in_stock_count, 1)
+
+    def test_failed_orders_return_their_stock(self):
+        start_flash_sale(self.hot.id)
+        with self.assertRaises(serializers.ValidationError):
+            self.buy((self.hot, 2), (self.other, 2))
+        self.assertEqual(sale_stock(self.hot.id), 3)
+        self.assertEqual(Order.objects.count(), 0)
+
+    def test_orders_rolled_back_after_placement_return_their_stock(self):
+        start_flash_sale(self.hot.id)
+        self.client.force_authenticate(self.user)
+        with mock.patch("api.views.enqueue_order_notification", side_effect=RuntimeError), self.assertRaises(RuntimeError):
+            self.client.post(
+                reverse("orders-list"), {"items": [{"product_id": self.hot.id, "quantity": 2}]}, format="json",
+            )
+        self.assertEqual(sale_stock(self.hot.id), 3)
+        self.assertEqual(Order.objects.count(), 0)
+
+    def test_row_changes_during_the_sale_are_folded_in(self):
+        start_flash_sale(self.hot.id)
+        self.buy((self.hot, 1))
+        # a restock of 10 units lands on the row
+        Product.objects.filter(pk=self.hot.pk).update(stock=13, name="Sneaker II")
+        self.assertEqual(reconcile(), {self.hot.id: 12})
+        self.assertEqual(sale_stock(self.hot.id), 12)
+        with self.assertRaisesMessage(serializers.ValidationError, "Not enough stock for Sneaker II"):
+            self.buy((self.hot, 13))
+        self.assertEqual(end_flash_sale(self.hot.id), 12)
+
+    def test_reconciler_outlives_a_failed_pass(self):
+        command = "api.management.commands.reconcile_flash_sales"
+        with mock.patch(f"{command}.reconcile", side_effect=[ConnectionError, {}]) as passes, \
+                mock.patch(f"{command}.time.sleep", side_effect=[None, KeyboardInterrupt]), \
+                self.assertLogs(command, "ERROR"):
+            call_command("reconcile_flash_sales", stdout=StringIO())
+        self.assertEqual(passes.call_count, 2)
+
+
+class FlashSaleConcurrencyTests(TransactionTestCase):
+
+    def setUp(self):
+        category = Category.objects.create(name="Drops")
+        self.product = Product.objects.create(name="Sneaker", price="100.00", stock=10, category=category)
+        self.addCleanup(forget_sale, self.product.id)
+        self.users = [User.objects.create_user(username=f"buyer{i}") for i in range(30)]
+
+    def test_no_overselling_under_a_rush(self):
+        start_flash_sale(self.product.id)
+        barrier = threading.Barrier(len(self.users))
+        outcomes = []
+        # the shared in-memory test database fails concurrent writers instead
+        # of making them wait as the file database does; admissions still race
+        database = threading.Lock()
+        place = orders._place_order
+
+        def serialized(*args):
+            with database:
+                return place(*args)
+
+        def buyer(user):
+            barrier.wait()
+            try:
+                place_order(user, [{"product_id": self.product.id, "quantity": 1}])
+                outcomes.append("placed")
+            except serializers.ValidationError:
+                outcomes.append("refused")
+            finally:
+                connection.close()
+
+        with mock.patch.object(orders, "_place_order", serialized):
+            threads = [threading.Thread(target=buyer, args=(user,)) for user in self.users]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual((outcomes.count("placed"), outcomes.count("refused")), (10, len(self.users) - 10))
+        self.assertEqual(Order.objects.count(), 10)
+        self.assertEqual(sale_stock(self.product.id), 0)
+        self.assertEqual(end_flash_sale(self.product.id), 0)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 0)
@@ -0,0 +1,85 @@
+import json
+from django.contrib.auth.models import User
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from api.models import Category, Product
+from api.cache import product_list_key
+from api.ingest import upsert_products
+from api.search import search_products
+
+
+class BulkUpsertTests(APITestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username="admin", password="adminpass")
+        self.user = User.objects.create_user(username="user", password="userpass")
+        self.phones = Category.objects.create(name="Phones")
+        self.books = Category.objects.create(name="Books")
+        self.url = reverse("products-bulk-upsert")
+
+    def post(self, body, content_type):
+        return self.client.generic("POST", self.url, body, content_type=content_type)
+
+    def test_ndjson_creates_updates_and_reports_bad_rows(self):
+        Product.objects.create(sku="P-1", name="Old Pixel", price=400, stock=1, category=self.phones)
+        lines = [
+            {"sku": "P-1", "name": "Pixel", "price": "499.00", "stock": 7, "category_id": self.phones.id},
+            {"sku": "B-1", "name": "Django Book", "price": "40", "category_id": self.books.id},
+            {"sku": "B-2", "name": "No category", "price": "10", "category_id": 999999},
+            {"sku": "B-3", "name": "Negative", "price": "-1", "category_id": self.books.id},
+        ]
+        body = "\n".join(json.dumps(line) for line in lines) + "\nnot json\n"
+        self.client.force_authenticate(self.admin)
+        response = self.post(body, "application/x-ndjson")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data["created"], response.data["updated"], response.data["failed"]), (1, 1, 3))
+        self.assertEqual([error["line"] for error in response.data["errors"]], [3, 4, 5])
+        self.assertIn("category_id", response.data["errors"][0]["errors"])
+        pixel = Product.objects.get(sku="P-1")
+        self.assertEqual((pixel.name, pixel.stock), ("Pixel", 7))
+        self.assertEqual(Product.objects.get(sku="B-1").stock, 0)
+
+    def test_csv_upload_is_indexed_for_search(self):
+        body = "sku,name,description,price,stock,category_id\n" \
+               f"B-1,Two Scoops,Django best practices,45.50,3,{self.books.id}\n" \
+               f"B-2,Fluent Python,,60,,{self.books.id}\n"
+        self.client.force_authenticate(self.admin)
+        response = self.post(body, "text/csv")
+        self.assertEqual(response.data["created"], 2, response.data)
+        self.assertEqual(response.data["failed"], 0)
+        found = search_products(Product.objects.all(), "scoops")
+        self.assertEqual([p.sku for p in found], ["B-1"])
+
+    def test_moving_products_invalidates_old_and_new_category_pages(self):
+        Product.objects.create(sku="X-1", name="Tablet", price=300, stock=2, category=self.phones)
+        phones_key = product_list_key("/api/products/", category_id=self.phones.id)
+        books_key = product_list_key("/api/products/", category_id=self.books.id)
+        lines = [json.dumps({"sku": "X-1", "name": "Tablet", "price": "300", "category_id": self.books.id})]
+        with self.captureOnCommitCallbacks(execute=True):
+            report = upsert_products(lines, "ndjson")
+        self.assertEqual(report.updated, 1)
+        self.assertNotEqual(product_list_key("/api/products/", category_id=self.phones.id), phones_key)
+        self.assertNotEqual(product_list_key("/api/products/", category_id=self.books.id), books_key)
+
+    def test_later_rows_win_and_batches_resolve_categories_once(self):
+        lines = [
+            json.dumps({"sku": f"S-{i % 50}", "name": f"Item {i}", "price": "1", "category_id": self.books.id})
+            for i in range(200)
+        ]
+        # per batch: categories, existing SKUs, upsert, search index (delete + insert) and a savepoint pair;
+        # then the category summaries: aggregate, stored values and their update
+        with self.assertNumQueries(4 * 7 + 3):
+            report = upsert_products(lines, "ndjson", batch_size=50)
+        self.assertEqual((report.created, report.updated, report.error_count), (50, 150, 0))
+        self.assertEqual(Product.objects.get(sku="S-0").name, "Item 150")
+
+    def test_only_admins_can_bulk_upsert(self):
+        self.client.force_authenticate(self.user)
+        response = self.post("{}", "application/x-ndjson")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_unknown_format_is_rejected(self):
+        self.client.force_authenticate(self.admin)
+        response = self.post("{}", "application/xml")
+        self.assertEqual(response.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
@@ -0,0 +1,113 @@
+from unittest import mock
+from asgiref.sync import async_to_sync
+from channels.layers import InMemoryChannelLayer
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from api import metrics
+from api.cache import invalidate_products
+from api.models import Category, Product, OutboxMessage
+from api.outbox import dispatch_batch
+
+
+class FailingChannelLayer(InMemoryChannelLayer):
+    async def group_send(self, group, message):
+        raise ConnectionError("redis unavailable")
+
+
+class RegistryTests(SimpleTestCase):
+
+    def test_histograms_render_cumulative_buckets(self):
+        registry = metrics.Registry({
+            "latency_seconds": ("histogram", "Latency.", (0.1, 1.0)),
+            "requests": ("counter", "Requests.", None),
+        })
+        registry.observe("latency_seconds", (("view", 'say "hi"'),), 0.05, 0.1, 0.5, 3)
+        registry.inc("requests", (("status", "200"),), 2)
+        self.assertEqual(registry.render().splitlines(), [
+            "# HELP latency_seconds Latency.",
+            "# TYPE latency_seconds histogram",
+            'latency_seconds_bucket{view="say \\"hi\\"",le="0.1"} 2',
+            'latency_seconds_bucket{view="say \\"hi\\"",le="1.0"} 3',
+            'latency_seconds_bucket{view="say \\"hi\\"",le="+Inf"} 4',
+            'latency_seconds_sum{view="say \\"hi\\""} 3.65',
+            'latency_seconds_count{view="say \\"hi\\""} 4',
+            "# HELP requests_total Requests.",
+            "# TYPE requests_total counter",
+            'requests_total{status="200"} 2',
+        ])
+
+
+class MetricsTests(APITestCase):
+
+    def setUp(self):
+        metrics.reset()
+        self.admin = User.objects.create_superuser(username="admin", password="adminpass")
+        self.buyer = User.objects.create_user(username="buyer", password="buyerpass")
+        self.category = Category.objects.create(name="Phones")
+        self.product = Product.objects.create(name="Pixel", price="500.00", stock=5, category=self.category)
+        invalidate_products([(self.product.id, self.category.id)])
+
+    def histogram(self, name, **labels):
+        return metrics.registry.value(name, tuple(labels.items()))
+
+    def test_requests_are_labelled_by_view_and_action(self):
+        self.client.get(reverse("products-list"))
+        self.client.get(reverse("products-list"))
+        self.client.get(reverse("products-detail", args=[self.product.id]))
+        self.client.get(reverse("async-products-list"))
+        requests = metrics.registry.value(
+            "http_requests", (("view", "products-list"), ("action", "list"), ("method", "GET"), ("status", "200")),
+        )
+        self.assertEqual(requests, 2)
+        self.assertIsNotNone(self.histogram("http_request_duration_seconds", view="products-detail", action="retrieve"))
+        self.assertIsNotNone(self.histogram("http_request_duration_seconds", view="async-products-list", action="get"))
+        # the first list request ran the queries, the second was a cache hit
+        self.assertGreater(sum(self.histogram("db_query_duration_seconds", view="products-list", action="list").counts), 0)
+        hits = metrics.registry.value(
+            "cache_lookups", (("family", "products_list"), ("op", "get"), ("result", "hit")),
+        )
+        self.assertGreaterEqual(hits, 1)
+
+    def test_endpoint_is_admin_only_prometheus_text(self):
+        url = reverse("metrics")
+        self.assertEqual(self.client.get(url).status_code, 401)
+        self.client.force_authenticate(self.buyer)
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_authenticate(self.admin)
+        self.client.get(reverse("categories-list"))
+        response = self.client.get(url, HTTP_ACCEPT="text/plain")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/plain; charset=utf-8")
+        body = response.content.decode()
+        self.assertIn("# TYPE http_request_duration_seconds histogram", body)
+        self.assertIn('http_requests_total{view="categories-list",action="list",method="GET",status="200"} 1', body)
+        self.assertIn('cache_operation_duration_seconds_count{family="ver",op="get_many"}', body)
+
+    def test_slow_requests_are_sampled_with_their_sql(self):
+        with mock.patch.object(metrics, "SLOW_REQUEST_SECONDS", 0), self.assertLogs("api.metrics", "INFO") as logs:
+            self.client.get(reverse("products-list"), {"min_price": "100"})
+        # warnings are kept for requests past the second threshold
+        self.assertEqual([record.levelname for record in logs.records], ["INFO"])
+        with mock.patch.object(metrics, "SLOW_REQUEST_SECONDS", 0), \
+                mock.patch.object(metrics, "SLOW_REQUEST_WARNING_SECONDS", 0), self.assertLogs("api.metrics", "WARNING"):
+            self.client.get(reverse("products-list"), {"min_price": "100"})
+        self.client.force_authenticate(self.admin)
+        sample = self.client.get(reverse("metrics-slow-requests")).json()["results"][-1]
+        self.assertEqual((sample["view"], sample["action"], sample["status"]), ("products-list", "list", 200))
+        self.assertEqual(sample["path"], "/api/products/?min_price=100")
+        self.assertEqual(sample["queries"], len(sample["sql"]))
+        self.assertTrue(any("api_product" in statement["sql"] for statement in sample["sql"]))
+        self.assertEqual(
+            metrics.registry.value("http_slow_requests", (("view", "products-list"), ("action", "list"))), 2,
+        )
+
+    def test_channel_layer_sends_are_timed(self):
+        OutboxMessage.objects.create(group="user_1", payload={"type": "order.notification", "order_id": 1})
+        async_to_sync(dispatch_batch)(InMemoryChannelLayer())
+        OutboxMessage.objects.create(group="user_1", payload={"type": "order.notification", "order_id": 2})
+        async_to_sync(dispatch_batch)(FailingChannelLayer())
+        for outcome in ("sent", "error"):
+            histogram = self.histogram("channel_layer_send_duration_seconds", type="order.notification", outcome=outcome)
+            self.assertEqual(sum(histogram.counts), 1)
@@ -0,0 +1,148 @@
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from api.analytics import rebuild_rollups
+from api.models import Category, Product, Order, OrderItem, OutboxMessage, SalesRollup
+
+
+class OrderPlacementTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="bob", password="password123")
+        self.client.force_authenticate(self.user)
+        self.category = Category.objects.create(name="Gadgets")
+        self.products = [
+            Product.objects.create(name=f"Gadget {i}", price=10 + i, stock=5, category=self.category)
+            for i in range(20)
+        ]
+        self.order_url = reverse("orders-list")
+
+    def test_repeated_lines_share_one_stock_check(self):
+        product = self.products[0]
+        data = {"items": [{"product_id": product.id, "quantity": 2}, {"product_id": product.id, "quantity": 3}]}
+        response = self.client.post(self.order_url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 0)
+        self.assertEqual(OrderItem.objects.count(), 2)
+        self.assertEqual(Order.objects.get().total_price, Decimal("50.00"))
+
+    def test_insufficient_stock_rolls_back_whole_order(self):
+        data = {"items": [
+            {"product_id": self.products[0].id, "quantity": 1},
+            {"product_id": self.products[1].id, "quantity": 6},
+        ]}
+        response = self.client.post(self.order_url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Order.objects.count(), 0)
+        self.products[0].refresh_from_db()
+        self.assertEqual(self.products[0].stock, 5)
+
+    def test_unknown_product_is_rejected(self):
+        response = self.client.post(self.order_url, {"items": [{"product_id": 999999, "quantity": 1}]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(self.order_url, {"items": [{"product_id": 2**63, "quantity": 1}]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_query_count_does_not_grow_with_cart_size(self):
+        def place(products):
+            data = {"items": [{"product_id": product.id, "quantity": 1} for product in products]}
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(self.order_url, data, format="json")
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            return len(queries)
+
+        self.assertEqual(place(self.products[:2]), place(self.products))
+
+
+class OrderStatusTests(APITestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username="admin", password="adminpass")
+        self.buyers = [User.objects.create_user(username=f"buyer{i}", password="password123") for i in range(2)]
+        category = Category.objects.create(name="Gadgets")
+        self.products = [Product.objects.create(name=f"Gadget {i}", price=10 + i, stock=100, category=category) for i in range(3)]
+        self.url = reverse("orders-bulk-status")
+
+    def place(self, buyer, product, quantity=1):
+        self.client.force_authenticate(buyer)
+        response = self.client.post(
+            reverse("orders-list"), {"items": [{"product_id": product.id, "quantity": quantity}]}, format="json"
+        )
+        return response.json()["id"]
+
+    def rollups(self):
+        return sorted(SalesRollup.objects.filter(orders__gt=0).values_list(
+            "day", "status", "dimension", "key", "revenue", "units", "orders"))
+
+    def test_bulk_transition_applies_allowed_moves_and_reports_the_rest(self):
+        first, second = self.place(self.buyers[0], self.products[0], 2), self.place(self.buyers[0], self.products[1])
+        third = self.place(self.buyers[1], self.products[0])
+        delivered = self.place(self.buyers[1], self.products[2])
+        Order.objects.filter(pk=delivered).update(status="delivered")
+        rebuild_rollups()
+        OutboxMessage.objects.all().delete()
+        self.client.force_authenticate(self.admin)
+        response = self.client.post(
+            self.url, {"ids": [first, second, third, delivered, first, 999], "status": "shipped"}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"status": "shipped", "updated": [first, second, third], "skipped": [
+            {"id": delivered, "reason": "invalid_transition", "status": "delivered"},
+            {"id": 999, "reason": "not_found", "status": None},
+        ]})
+        self.assertEqual(set(Order.objects.filter(status="shipped").values_list("id", flat=True)), {first, second, third})
+        # one notification per user
+        payloads = {message.group: message.payload for message in OutboxMessage.objects.all()}
+        self.assertEqual(payloads, {
+            f"user_{self.buyers[0].id}": {"type": "order.notifications", "orders": [
+                {"order_id": first, "status": "shipped"}, {"order_id": second, "status": "shipped"},
+            ]},
+            f"user_{self.buyers[1].id}": {"type": "order.notifications", "orders": [{"order_id": third, "status": "shipped"}]},
+        })
+        # the rollups moved exactly as a rebuild computes them
+        incremental = self.rollups()
+        rebuild_rollups()
+        self.assertEqual(self.rollups(), incremental)
+        response = self.client.post(self.url, {"ids": [first], "status": "shipped"}, format="json")
+        self.assertEqual(response.json()["skipped"], [{"id": first, "reason": "unchanged", "status": "shipped"}])
+
+    def test_bulk_transition_keeps_sales_in_the_category_they_were_placed_in(self):
+        orders = [self.place(self.buyers[0], self.products[0]), self.place(self.buyers[1], self.products[1])]
+        placed_in = self.products[0].category_id
+        self.products[0].category = Category.objects.create(name="Toys")
+        self.products[0].save()
+        self.client.force_authenticate(self.admin)
+        self.client.post(self.url, {"ids": orders, "status": "shipped"}, format="json")
+        categories = {
+            (status, key): orders for status, key, orders in
+            SalesRollup.objects.filter(dimension="category").values_list("status", "key", "orders")
+        }
+        self.assertEqual(categories, {("pending", placed_in): 0, ("shipped", placed_in): 2})
+
+    def test_bulk_transition_cost_does_not_grow_with_the_wave(self):
+        small = [self.place(self.buyers[0], self.products[0]) for _ in range(2)]
+        large = [self.place(self.buyers[i % 2], self.products[i % 3]) for i in range(12)]
+        self.client.force_authenticate(self.admin)
+        with CaptureQueriesContext(connection) as small_wave:
+            self.client.post(self.url, {"ids": small, "status": "shipped"}, format="json")
+        with CaptureQueriesContext(connection) as large_wave:
+            self.client.post(self.url, {"ids": large, "status": "shipped"}, format="json")
+        self.assertEqual(len(large_wave), len(small_wave))
+
+    def test_only_admins_change_statuses_and_only_forward(self):
+        order = self.place(self.buyers[0], self.products[0])
+        self.client.force_authenticate(self.buyers[0])
+        self.assertEqual(self.client.post(self.url, {"ids": [order], "status": "shipped"}, format="json").status_code, 403)
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(self.client.post(self.url, {"ids": [order], "status": "lost"}, format="json").status_code, 400)
+        self.assertEqual(self.client.post(self.url, {"ids": [], "status": "shipped"}, format="json").status_code, 400)
+        detail = reverse("orders-detail", args=[order])
+        self.assertEqual(self.client.patch(detail, {"status": "delivered"}, format="json").status_code, 200)
+        response = self.client.patch(detail, {"status": "pending"}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("status", response.json())
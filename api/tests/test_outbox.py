@@ -0,0 +1,67 @@
+from asgiref.sync import async_to_sync
+from channels.layers import InMemoryChannelLayer
+from django.contrib.auth.models import User
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from api.models import Category, Product, Order, OutboxMessage
+from api.outbox import dispatch_batch
+
+
+class FailingChannelLayer(InMemoryChannelLayer):
+    async def group_send(self, group, message):
+        raise ConnectionError("redis unavailable")
+
+
+class OrderOutboxTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="erin", password="password123")
+        self.admin = User.objects.create_superuser(username="boss", password="adminpass")
+        category = Category.objects.create(name="Kitchen")
+        self.product = Product.objects.create(name="Kettle", price=40, stock=2, category=category)
+
+    def place_order(self, quantity):
+        self.client.force_authenticate(self.user)
+        return self.client.post(
+            reverse("orders-list"), {"items": [{"product_id": self.product.id, "quantity": quantity}]}, format="json"
+        )
+
+    def test_order_writes_notification_to_outbox(self):
+        response = self.place_order(1)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        message = OutboxMessage.objects.get()
+        self.assertEqual(message.group, f"user_{self.user.id}")
+        self.assertEqual(message.payload, {"type": "order.notification", "order_id": response.data["id"], "status": "pending"})
+
+    def test_failed_order_leaves_no_notification(self):
+        response = self.place_order(5)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(OutboxMessage.objects.exists())
+
+    def test_status_change_is_notified_once(self):
+        order = Order.objects.create(user=self.user, total_price=10)
+        self.client.force_authenticate(self.admin)
+        url = reverse("orders-detail", args=[order.id])
+        self.client.patch(url, {"status": "shipped"}, format="json")
+        self.client.patch(url, {"status": "shipped"}, format="json")
+        self.assertEqual(OutboxMessage.objects.count(), 1)
+
+    def test_dispatcher_delivers_and_removes_messages(self):
+        self.place_order(1)
+        layer = InMemoryChannelLayer()
+        channel = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)(f"user_{self.user.id}", channel)
+        self.assertEqual(async_to_sync(dispatch_batch)(layer), 1)
+        event = async_to_sync(layer.receive)(channel)
+        self.assertEqual(event["type"], "order.notification")
+        self.assertFalse(OutboxMessage.objects.exists())
+
+    def test_dispatcher_reschedules_failures(self):
+        self.place_order(1)
+        async_to_sync(dispatch_batch)(FailingChannelLayer())
+        message = OutboxMessage.objects.get()
+        self.assertEqual(message.attempts, 1)
+        self.assertIn("redis unavailable", message.last_error)
+        # backoff keeps it out of the next batch
+        self.assertEqual(async_to_sync(dispatch_batch)(InMemoryChannelLayer()), 0)
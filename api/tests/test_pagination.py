@@ -0,0 +1,57 @@
+from django.contrib.auth.models import User
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from api.models import Category, Product, Order
+
+
+class KeysetPaginationTests(APITestCase):
+
+    def setUp(self):
+        category = Category.objects.create(name="Tools")
+        # duplicate prices exercise the id tie-breaker
+        for i in range(25):
+            Product.objects.create(name=f"Tool {i}", price=10 + i % 4, stock=i, category=category)
+        self.url = reverse("products-list")
+
+    def walk(self, url):
+        ids, pages = [], 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids.extend(row["id"] for row in response.json()["results"])
+            url = response.json()["next"]
+            pages += 1
+        return ids, pages
+
+    def test_walks_every_row_once_in_ordering(self):
+        ids, pages = self.walk(f"{self.url}?cursor=&ordering=-price")
+        expected = list(Product.objects.order_by("-price", "-id").values_list("id", flat=True))
+        self.assertEqual(ids, expected)
+        self.assertEqual(pages, 3)
+
+    def test_count_only_on_request(self):
+        response = self.client.get(f"{self.url}?cursor=")
+        self.assertNotIn("count", response.json())
+        with self.assertNumQueries(2):
+            response = self.client.get(f"{self.url}?cursor=&with_count=true&ordering=stock")
+        self.assertEqual(response.json()["count"], 25)
+
+    def test_previous_link_returns_prior_page(self):
+        first = self.client.get(f"{self.url}?cursor=&ordering=price").json()
+        second = self.client.get(first["next"]).json()
+        back = self.client.get(second["previous"]).json()
+        self.assertEqual(back["results"], first["results"])
+        self.assertIsNone(back["previous"])
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(f"{self.url}?cursor=bogus")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_orders_default_to_most_recent_first(self):
+        user = User.objects.create_user(username="carol", password="password123")
+        orders = [Order.objects.create(user=user, total_price=i) for i in range(3)]
+        self.client.force_authenticate(user)
+        response = self.client.get(f"{reverse('orders-list')}?cursor=&page_size=2")
+        self.assertEqual([row["id"] for row in response.json()["results"]], [orders[2].id, orders[1].id])
+        self.assertIsNotNone(response.json()["next"])
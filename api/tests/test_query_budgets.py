@@ -0,0 +1,62 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+from api.benchmark import auth_headers, count_queries, invalidate_caches, read_endpoints
+from api.cache import invalidate_user
+from api.datagen import generate
+
+# SQL statements each read endpoint may issue as an admin, (cold, warm): cold
+# is the first request after the cached pages and the cached user were
+# invalidated, warm the next one. Cold counts include the user lookup of JWT
+# authentication. Raise a budget only together with the change that needs it.
+BUDGETS = {
+    "categories-list": (2, 0),
+    "categories-detail": (2, 1),
+    "products-list": (3, 0),
+    "products-detail": (2, 1),
+    "orders-list": (4, 3),
+    "orders-detail": (3, 2),
+    "orders-export": (2, 1),
+    "cart-list": (1, 0),
+    "reservations-list": (2, 1),
+    "async-categories-list": (1, 0),
+    "async-products-list": (2, 0),
+    "async-products-detail": (1, 1),
+    "analytics-sales": (3, 2),
+    "metrics": (1, 0),
+    "metrics-slow-requests": (1, 0),
+}
+
+
+class QueryBudgetTests(TestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username="admin", password="adminpass")
+        self.headers = auth_headers(self.admin)
+
+    def counts(self):
+        counts = {}
+        for name, path in read_endpoints():
+            invalidate_caches()
+            invalidate_user(self.admin.pk)
+            cold = count_queries(self.client, path, self.headers)
+            warm = count_queries(self.client, path, self.headers)
+            self.assertEqual((cold[0], warm[0]), (200, 200), path)
+            counts[name] = (cold[1], warm[1])
+        return counts
+
+    def test_every_read_endpoint_has_a_budget(self):
+        generate(categories=1, products=1, users=1, orders=1)
+        self.assertEqual(sorted(name for name, _ in read_endpoints()), sorted(BUDGETS))
+
+    def test_endpoints_stay_within_their_budgets(self):
+        generate(categories=3, products=30, users=5, orders=20)
+        for name, (cold, warm) in self.counts().items():
+            with self.subTest(endpoint=name):
+                self.assertLessEqual(cold, BUDGETS[name][0], "cold")
+                self.assertLessEqual(warm, BUDGETS[name][1], "warm")
+
+    def test_query_counts_do_not_grow_with_the_data(self):
+        generate(categories=2, products=10, users=2, orders=5, seed=1)
+        small = self.counts()
+        generate(categories=6, products=60, users=8, orders=40, max_items=8, seed=2)
+        self.assertEqual(self.counts(), small)
@@ -0,0 +1,75 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from api.models import Category, Product, Order
+
+# Tables whose plans are checked; lookups on other tables (auth, sessions) are out of scope
+CHECKED_TABLES = ("api_product", "api_order", "api_orderitem", "api_category")
+
+
+# Query-plan regression suite: run each endpoint's main requests, EXPLAIN every
+# statement they issued and fail when one falls back to a full table scan.
+class QueryPlanTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="dave", password="password123")
+        cls.category = Category.objects.create(name="Garden")
+        products = Product.objects.bulk_create([
+            Product(name=f"Plant {i}", price=5 + i, stock=i % 3, category=cls.category) for i in range(30)
+        ])
+        for i in range(3):
+            Order.objects.create(user=cls.user, total_price=10 * i, status="pending")
+        cls.product = products[0]
+
+    def setUp(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("plan assertions are written against SQLite's EXPLAIN QUERY PLAN")
+
+    def full_scans(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            details = [row[-1] for row in cursor.fetchall()]
+        # "SCAN t" alone is a full scan; "SCAN t USING INDEX ..." walks an index in order
+        return [
+            detail for detail in details
+            if detail.startswith("SCAN ") and detail.split()[1] in CHECKED_TABLES and "INDEX" not in detail
+        ]
+
+    def assert_no_full_scans(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        selects = [query["sql"] for query in queries if query["sql"].lstrip().upper().startswith("SELECT")]
+        self.assertTrue(selects, f"{url} was served without touching the database")
+        for sql in selects:
+            self.assertEqual(self.full_scans(sql), [], f"{url}\n{sql}")
+
+    def test_product_filters(self):
+        url = reverse("products-list")
+        for query in (
+            f"category={self.category.id}&ordering=price",
+            "in_stock=true&ordering=price",
+            "min_price=10&max_price=20",
+            "cursor=&ordering=-created_at",
+            "cursor=&ordering=price",
+        ):
+            with self.subTest(query=query):
+                self.assert_no_full_scans(f"{url}?{query}")
+
+    def test_product_detail(self):
+        self.assert_no_full_scans(reverse("products-detail", args=[self.product.id]))
+
+    def test_user_order_history(self):
+        self.client.force_authenticate(self.user)
+        self.assert_no_full_scans(reverse("orders-list"))
+        self.assert_no_full_scans(f"{reverse('orders-list')}?cursor=")
+
+    def test_admin_orders_by_status(self):
+        sql, params = Order.objects.filter(status="pending").order_by("-created_at").query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            details = [row[-1] for row in cursor.fetchall()]
+        self.assertTrue(any("api_order_status_created_idx" in detail for detail in details), details)
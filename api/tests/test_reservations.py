@@ -0,0 +1,140 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+from api import cart, flashsale
+from api.models import Category, Product, Order, StockReservation
+from api.reservations import expire_reservations, reserve
+
+
+class ReservationTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="frank", password="password123")
+        self.client.force_authenticate(self.user)
+        self.category = Category.objects.create(name="Consoles")
+        self.product = Product.objects.create(name="Console", price="300.00", stock=5, category=self.category)
+        self.url = reverse("reservations-list")
+
+    def hold(self, quantity, product=None):
+        return self.client.post(self.url, {"product_id": (product or self.product).id, "quantity": quantity}, format="json")
+
+    def order(self, quantity):
+        return self.client.post(
+            reverse("orders-list"), {"items": [{"product_id": self.product.id, "quantity": quantity}]}, format="json",
+        )
+
+    def test_holds_are_kept_from_other_buyers(self):
+        response = self.hold(3)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual((response.data["status"], response.data["quantity"]), ("held", 3))
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.reserved), (5, 3))
+        self.client.force_authenticate(User.objects.create_user(username="gina", password="password123"))
+        self.assertEqual(self.order(3).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.hold(3).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.order(2).status_code, status.HTTP_201_CREATED)
+        response = self.client.post(self.url, {"product_id": 2**63, "quantity": 1}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(self.url).data["count"], 0)
+
+    def test_product_pages_and_carts_show_available_stock(self):
+        url = reverse("products-detail", args=[self.product.id])
+        self.assertEqual(self.client.get(url).data["available"], 5)
+        self.hold(3)
+        self.assertEqual((self.client.get(url).data["stock"], self.client.get(url).data["available"]), (5, 2))
+        listed = self.client.get(reverse("products-list"), {"category": self.category.id}).data["results"]
+        self.assertEqual(listed[0]["available"], 2)
+        buyer = User.objects.create_user(username="gina", password="password123")
+        self.addCleanup(cart.clear_cart, buyer.id)
+        self.client.force_authenticate(buyer)
+        self.client.post(reverse("cart-list"), {"product_id": self.product.id, "quantity": 3}, format="json")
+        line = self.client.get(reverse("cart-list")).data["items"][0]
+        self.assertEqual((line["stock"], line["available"]), (2, False))
+
+    def test_confirming_holds_places_the_order(self):
+        other = Product.objects.create(name="Controller", price="50.00", stock=4, category=self.category)
+        ids = [self.hold(2).data["id"], self.hold(1, other).data["id"]]
+        response = self.client.post(reverse("reservations-confirm"), {"ids": ids}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        order = Order.objects.get()
+        self.assertEqual((response.data["id"], str(order.total_price)), (order.id, "650.00"))
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.reserved), (3, 0))
+        self.assertEqual(set(StockReservation.objects.values_list("status", "order")), {("confirmed", order.id)})
+        response = self.client.post(reverse("reservations-confirm"), {"ids": ids}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_releasing_returns_the_units(self):
+        reservation_id = self.hold(4).data["id"]
+        self.client.force_authenticate(User.objects.create_user(username="gina", password="password123"))
+        self.assertEqual(self.client.delete(reverse("reservations-detail", args=[reservation_id])).status_code, 404)
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.delete(reverse("reservations-detail", args=[reservation_id])).status_code, 204)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved, 0)
+        self.assertEqual(StockReservation.objects.get().status, "released")
+
+    def test_expired_holds_are_swept_in_one_update(self):
+        products = [
+            Product.objects.create(name=f"Game {i}", price="20.00", stock=10, category=self.category) for i in range(4)
+        ]
+
+        def sweep(count):
+            for product in products[:count]:
+                reserve(self.user, product.id, 2, ttl=60)
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(expire_reservations(now=timezone.now() + timedelta(seconds=61)), count)
+            return len(queries)
+
+        self.assertEqual(sweep(1), sweep(4))
+        reserved = Product.objects.filter(pk__in=[product.pk for product in products]).values_list("reserved", flat=True)
+        self.assertEqual(list(reserved), [0] * 4)
+        self.assertEqual(StockReservation.objects.filter(status="expired").count(), 5)
+
+    def test_sweeper_outlives_a_failed_sweep(self):
+        command = "api.management.commands.expire_reservations"
+        with mock.patch(f"{command}.expire_reservations", side_effect=[OperationalError, 0]) as sweeps, \
+                mock.patch(f"{command}.time.sleep", side_effect=[None, KeyboardInterrupt]), \
+                self.assertLogs(command, "ERROR"):
+            call_command("expire_reservations", stdout=StringIO())
+        self.assertEqual(sweeps.call_count, 2)
+
+    def test_expired_holds_cant_be_confirmed_and_free_their_units(self):
+        held = reserve(self.user, self.product.id, 5, ttl=0)
+        response = self.client.post(reverse("reservations-confirm"), {"ids": [held.id]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(str(response.data[0]), f"Reservation {held.id} is expired.")
+        # not swept yet, but a hold short of stock sweeps its product first
+        self.assertEqual(self.hold(5).status_code, status.HTTP_201_CREATED)
+        held.refresh_from_db()
+        self.assertEqual(held.status, "expired")
+
+    def test_product_saves_keep_newer_holds(self):
+        product = Product.objects.get(pk=self.product.pk)
+        self.hold(2)
+        product.name = "Console Pro"
+        product.save()
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.name, self.product.reserved), ("Console Pro", 2))
+
+    def test_flash_sale_products_cant_be_reserved(self):
+        flashsale.start_flash_sale(self.product.id)
+        self.addCleanup(flashsale.end_flash_sale, self.product.id)
+        self.assertEqual(self.hold(1).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_released_units_join_a_running_flash_sale(self):
+        reservation_id = self.hold(2).data["id"]
+        self.assertEqual(flashsale.start_flash_sale(self.product.id), 3)
+        self.addCleanup(flashsale.end_flash_sale, self.product.id)
+        self.client.delete(reverse("reservations-detail", args=[reservation_id]))
+        self.assertEqual(flashsale.reconcile([self.product.id]), {self.product.id: 5})
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.reserved), (5, 0))
@@ -0,0 +1,41 @@
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from api.models import Category, Product
+
+
+class ProductSearchTests(APITestCase):
+
+    def setUp(self):
+        self.audio = Category.objects.create(name="Audio")
+        self.home = Category.objects.create(name="Home")
+        self.speaker = Product.objects.create(
+            name="Wireless Speaker", description="Portable bluetooth speaker", price=80, stock=3, category=self.audio
+        )
+        self.headphones = Product.objects.create(
+            name="Headphones", description="Wireless, with a speaker-grade driver", price=120, stock=0, category=self.audio
+        )
+        self.lamp = Product.objects.create(name="Desk Lamp", description="Warm light", price=30, stock=9, category=self.home)
+        self.url = reverse("products-list")
+
+    def search(self, query):
+        response = self.client.get(f"{self.url}?{query}")
+        self.assertEqual(response.status_code, 200)
+        return [row["id"] for row in response.json()["results"]]
+
+    def test_ranks_name_matches_first(self):
+        self.assertEqual(self.search("search=speaker"), [self.speaker.id, self.headphones.id])
+
+    def test_matches_prefixes_and_requires_every_term(self):
+        self.assertEqual(self.search("search=wire%20blue"), [self.speaker.id])
+
+    def test_combines_with_product_filters(self):
+        self.assertEqual(self.search(f"search=wireless&in_stock=true&category={self.audio.id}"), [self.speaker.id])
+        self.assertEqual(self.search("search=wireless&min_price=100"), [self.headphones.id])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.lamp.name = "Reading Lamp"
+        self.lamp.save()
+        self.assertEqual(self.search("search=reading"), [self.lamp.id])
+        self.assertEqual(self.search("search=desk"), [])
+        self.speaker.delete()
+        self.assertEqual(self.search("search=bluetooth"), [])
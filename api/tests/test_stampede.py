@@ -0,0 +1,100 @@
+import threading
+import time
+import uuid
+from unittest import mock
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TransactionTestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+from api.cache import _refresh_early, _wrap, get_or_regenerate, bump, PRODUCTS_NS
+from api.models import Category, Product
+from api.views import FastReadMixin
+
+
+# Run `target` in `count` threads released at the same moment; returns their results
+def herd(target, count=24):
+    barrier = threading.Barrier(count)
+    results = [None] * count
+
+    def run(index):
+        barrier.wait()
+        try:
+            results[index] = target()
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class SingleFlightTests(SimpleTestCase):
+
+    def setUp(self):
+        self.key = f"products_list:test:{uuid.uuid4().hex}"
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def compute(self):
+        with self.lock:
+            self.calls += 1
+        time.sleep(0.3)
+        return {"page": self.key}
+
+    def test_herd_recomputes_once_and_waits_for_the_winner(self):
+        results = herd(lambda: get_or_regenerate(self.key, self.compute, 60))
+        self.assertEqual(self.calls, 1)
+        self.assertTrue(all(result == {"page": self.key} for result in results))
+
+    def test_herd_is_served_the_stale_copy_meanwhile(self):
+        stale_key = f"{self.key}:stale"
+        get_or_regenerate(f"{self.key}:old", lambda: "old page", 60, stale_key=stale_key)
+        results = herd(lambda: get_or_regenerate(self.key, self.compute, 60, stale_key=stale_key))
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results.count({"page": self.key}), 1)
+        self.assertEqual(results.count("old page"), len(results) - 1)
+
+    def test_early_refresh_is_likelier_close_to_expiry(self):
+        far = _wrap("v", delta=0.1, timeout=3600)
+        near = _wrap("v", delta=0.5, timeout=0)
+        self.assertFalse(any(_refresh_early(far) for _ in range(1000)))
+        self.assertTrue(all(_refresh_early(near) for _ in range(1000)))
+
+    def test_hot_key_near_expiry_is_refreshed_once_while_others_are_served(self):
+        get_or_regenerate(self.key, lambda: "current", 60)
+        with mock.patch("api.cache._refresh_early", return_value=True):
+            results = herd(lambda: get_or_regenerate(self.key, self.compute, 60))
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results.count("current"), len(results) - 1)
+
+
+class ProductListStampedeTests(TransactionTestCase):
+
+    def setUp(self):
+        category = Category.objects.create(name="Phones")
+        for i in range(15):
+            Product.objects.create(name=f"Phone {i}", price=100 + i, stock=5, category=category)
+        # start from a generation no earlier test has cached pages for, and
+        # without stale copies, so the herd has to wait for the single render
+        bump(PRODUCTS_NS)
+        cache.delete_pattern("products_list:stale:*")
+
+    def test_one_database_render_per_page_under_a_thundering_herd(self):
+        renders = []
+        original = FastReadMixin.list
+
+        def slow_list(view, request, *args, **kwargs):
+            renders.append(request.get_full_path())
+            time.sleep(0.3)
+            return original(view, request, *args, **kwargs)
+
+        url = reverse("products-list")
+        with mock.patch.object(FastReadMixin, "list", slow_list):
+            results = herd(lambda: APIClient().get(url, {"page": 2}, HTTP_ACCEPT="application/json"))
+        self.assertEqual(len(renders), 1)
+        self.assertEqual({response.status_code for response in results}, {200})
+        self.assertEqual({response.content for response in results}, {results[0].content})
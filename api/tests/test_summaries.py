@@ -0,0 +1,92 @@
+from decimal import Decimal
+from io import StringIO
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from api.models import Category, Product
+from api.summaries import find_drift
+
+
+class CategorySummaryTests(APITestCase):
+
+    def setUp(self):
+        self.phones = Category.objects.create(name="Phones")
+        self.books = Category.objects.create(name="Books")
+        self.pixel = Product.objects.create(name="Pixel", price="500.00", stock=2, category=self.phones)
+        self.galaxy = Product.objects.create(name="Galaxy", price="400.00", stock=0, category=self.phones)
+        self.nokia = Product.objects.create(name="Nokia", price="40.00", stock=7, category=self.phones)
+
+    def summary(self, category):
+        category.refresh_from_db()
+        return (category.product_count, category.in_stock_count, category.min_price, category.max_price)
+
+    def test_product_writes_keep_summaries_current(self):
+        self.assertEqual(self.summary(self.phones), (3, 2, Decimal("40.00"), Decimal("500.00")))
+        self.nokia.price = "450.00"
+        self.nokia.stock = 0
+        self.nokia.save()
+        self.assertEqual(self.summary(self.phones), (3, 1, Decimal("400.00"), Decimal("500.00")))
+        self.pixel.category = self.books
+        self.pixel.save()
+        self.assertEqual(self.summary(self.phones), (2, 0, Decimal("400.00"), Decimal("450.00")))
+        self.assertEqual(self.summary(self.books), (1, 1, Decimal("500.00"), Decimal("500.00")))
+        self.pixel.delete()
+        self.assertEqual(self.summary(self.books), (0, 0, None, None))
+        # instances not loaded from the database are diffed against the stored row
+        Product(
+            pk=self.galaxy.pk, name="Galaxy", price="10.00", stock=3, category=self.phones, created_at=self.galaxy.created_at,
+        ).save()
+        self.assertEqual(self.summary(self.phones), (2, 1, Decimal("10.00"), Decimal("450.00")))
+        self.assertEqual(find_drift(), [])
+
+    def test_orders_and_bulk_upserts_keep_summaries_current(self):
+        self.client.force_authenticate(User.objects.create_user(username="buyer", password="buyerpass"))
+        response = self.client.post(
+            reverse("orders-list"), {"items": [{"product_id": self.pixel.id, "quantity": 2}]}, format="json"
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.summary(self.phones)[:2], (3, 1))
+        self.client.force_authenticate(User.objects.create_superuser(username="admin", password="adminpass"))
+        body = f"sku,name,price,stock,category_id\nB-1,Novel,9.99,4,{self.books.id}\n"
+        response = self.client.post(reverse("products-bulk-upsert"), body, content_type="text/csv")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.summary(self.books), (1, 1, Decimal("9.99"), Decimal("9.99")))
+        self.assertEqual(find_drift(), [])
+
+    def test_saving_a_stale_category_keeps_its_summary(self):
+        stale = Category.objects.get(pk=self.phones.pk)
+        Product.objects.create(name="Moto", price="90.00", stock=1, category=self.phones)
+        stale.description = "Smartphones"
+        stale.save()
+        self.assertEqual(self.summary(self.phones)[:2], (4, 3))
+
+    def test_summaries_are_opt_in(self):
+        url = reverse("categories-list")
+        self.assertNotIn("summary", self.client.get(url).json()[0])
+        rows = {row["name"]: row for row in self.client.get(url, {"summary": "true"}).json()}
+        self.assertEqual(rows["Phones"]["summary"], {
+            "product_count": 3, "in_stock_count": 2, "min_price": "40.00", "max_price": "500.00",
+        })
+        # cached lists with summaries follow product changes
+        Product.objects.create(name="Moto", price="90.00", stock=1, category=self.phones)
+        rows = {row["name"]: row for row in self.client.get(url, {"summary": "true"}).json()}
+        self.assertEqual(rows["Phones"]["summary"]["product_count"], 4)
+        detail = self.client.get(reverse("categories-detail", args=[self.books.id]), {"summary": "1"}).json()
+        self.assertEqual(detail["summary"]["product_count"], 0)
+        async_rows = self.client.get(reverse("async-categories-list"), {"summary": "true"}).json()
+        self.assertEqual({row["name"]: row for row in async_rows}["Phones"]["summary"]["product_count"], 4)
+        # nested categories are unaffected
+        product = self.client.get(reverse("products-detail", args=[self.pixel.id]), {"summary": "true"}).json()
+        self.assertNotIn("summary", product["category"])
+
+    def test_verify_command_detects_and_repairs_drift(self):
+        Product.objects.filter(pk=self.galaxy.pk).update(stock=5, price="1.00")
+        out = StringIO()
+        call_command("verify_category_summaries", stdout=out)
+        self.assertIn("1 category summaries drifted", out.getvalue())
+        call_command("verify_category_summaries", "--repair", stdout=StringIO())
+        self.assertEqual(self.summary(self.phones), (3, 3, Decimal("1.00"), Decimal("500.00")))
+        out = StringIO()
+        call_command("verify_category_summaries", stdout=out)
+        self.assertIn("consistent", out.getvalue())
@@ -0,0 +1,121 @@
+import asyncio
+import json
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from api import consumers
+from api.benchmark import WebSocketClient
+from api.consumers import Heartbeat, heartbeat
+from api.routing import websocket_urlpatterns
+from api.websocket import ConnectionAdmission, JWTAuthMiddleware
+
+
+def access_token(user_id, lifetime=None):
+    token = AccessToken()
+    token["user_id"] = str(user_id)
+    if lifetime is not None:
+        token.set_exp(lifetime=lifetime)
+    return str(token)
+
+
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+class OrderSocketTests(SimpleTestCase):
+
+    def application(self, **admission):
+        return JWTAuthMiddleware(URLRouter(websocket_urlpatterns), ConnectionAdmission(**admission))
+
+    async def test_token_authenticated_sockets_get_their_notifications(self):
+        app = self.application()
+        client = WebSocketClient(app, f"/ws/orders/?token={access_token(7)}")
+        self.assertEqual(await client.connect(), (True, None))
+        header = WebSocketClient(app, "/ws/orders/", headers=[(b"authorization", f"Bearer {access_token(7)}".encode())])
+        self.assertEqual(await header.connect(), (True, None))
+        await get_channel_layer().group_send("user_7", {"type": "order.notification", "order_id": 3, "status": "shipped"})
+        for socket in (client, header):
+            self.assertEqual(json.loads(await socket.receive()), {"type": "order_update", "order_id": 3, "status": "shipped"})
+        await get_channel_layer().group_send("user_7", {"type": "order.notifications", "orders": [
+            {"order_id": 3, "status": "delivered"}, {"order_id": 4, "status": "delivered"},
+        ]})
+        self.assertEqual(json.loads(await client.receive()), {"type": "order_updates", "orders": [
+            {"order_id": 3, "status": "delivered"}, {"order_id": 4, "status": "delivered"},
+        ]})
+        await get_channel_layer().group_send("user_7", {
+            "type": "order.checkout", "ticket": "t1", "status": "failed", "errors": ["Not enough stock for Pixel"],
+        })
+        self.assertEqual(json.loads(await client.receive()), {
+            "type": "checkout", "ticket": "t1", "status": "failed", "errors": ["Not enough stock for Pixel"],
+        })
+        await client.disconnect()
+        await header.disconnect()
+        for path in ("/ws/orders/", "/ws/orders/?token=garbage", f"/ws/orders/?token={access_token(7, timedelta(seconds=-1))}"):
+            connected, _ = await WebSocketClient(app, path).connect()
+            self.assertFalse(connected, path)
+
+    async def test_handshakes_beyond_the_admission_limits_are_refused(self):
+        app = self.application(rate=0, burst=2, max_connections=10)
+        results = [await WebSocketClient(app, f"/ws/orders/?token={access_token(1)}").connect() for _ in range(3)]
+        self.assertEqual(results[2], (False, 1013))
+        app = self.application(rate=float("inf"), burst=10, max_connections=1)
+        first = WebSocketClient(app, f"/ws/orders/?token={access_token(1)}")
+        await first.connect()
+        self.assertEqual(await WebSocketClient(app, f"/ws/orders/?token={access_token(2)}").connect(), (False, 1013))
+        await first.disconnect()
+        second = WebSocketClient(app, f"/ws/orders/?token={access_token(2)}")
+        self.assertEqual(await second.connect(), (True, None))
+        await second.disconnect()
+
+    async def test_heartbeat_pings_and_evicts(self):
+        beats = consumers._heartbeats[asyncio.get_running_loop()] = Heartbeat(interval=3600, idle_timeout=3600)
+        self.assertIs(heartbeat(), beats)
+        app = self.application()
+        client = WebSocketClient(app, f"/ws/orders/?token={access_token(1)}")
+        await client.connect()
+        await beats.beat()
+        self.assertEqual(json.loads(await client.receive()), {"type": "ping"})
+        await client.send_text('{"type": "ping"}')
+        self.assertEqual(json.loads(await client.receive()), {"type": "pong"})
+        # silent sockets are closed
+        beats.idle_timeout = 0
+        await beats.beat()
+        self.assertEqual(await client.receive(), {"type": "websocket.close", "code": 4008})
+        await client.disconnect()
+        # and so are sockets whose token expired
+        beats.idle_timeout = 3600
+        expiring = WebSocketClient(app, f"/ws/orders/?token={access_token(2)}")
+        await expiring.connect()
+        with mock.patch.object(consumers.time, "time", return_value=4_000_000_000):
+            await beats.beat()
+        self.assertEqual(await expiring.receive(), {"type": "websocket.close", "code": 4001})
+        await expiring.disconnect()
+        self.assertEqual(beats.consumers, set())
+
+    async def test_heartbeat_survives_sockets_failing_mid_round(self):
+        beats = consumers._heartbeats[asyncio.get_running_loop()] = Heartbeat(interval=3600, idle_timeout=3600)
+        app = self.application()
+        broken, client = (WebSocketClient(app, f"/ws/orders/?token={access_token(n)}") for n in (1, 2))
+        await broken.connect()
+        await client.connect()
+        gone = next(consumer for consumer in beats.consumers if consumer.group_name == "user_1")
+        with mock.patch.object(gone, "send", side_effect=RuntimeError("socket vanished")), \
+                self.assertLogs("api.consumers", "WARNING"):
+            await beats.beat()
+        self.assertEqual(json.loads(await client.receive()), {"type": "ping"})
+        self.assertNotIn(gone, beats.consumers)
+        await broken.disconnect()
+        await client.disconnect()
+
+    def test_connection_storm(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "ws.json")
+            call_command("bench_ws", connections=300, users=40, concurrency=100, output=path, stdout=StringIO())
+            with open(path) as output:
+                results = json.load(output)["results"]
+        self.assertEqual((results["opened"], results["refused"], results["lost"]), (300, 0, 0))
+        self.assertEqual(results["delivery"]["count"], 300)
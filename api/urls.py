@@ -1,14 +1,23 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import CategoryViewSet, ProductViewSet, OrderViewSet, RegisterView
+from .views import CategoryViewSet, ProductViewSet, OrderViewSet, CartViewSet, ReservationViewSet, RegisterView, sales_analytics, metrics_view, slow_requests
+from .async_views import AsyncCategoryListView, AsyncProductListView, AsyncProductDetailView
 from rest_framework_simplejwt.views import TokenObtainPairView
 
 router = DefaultRouter()
 router.register("categories", CategoryViewSet, basename="categories")   # Registering the CategoryViewSet with the router
 router.register("products", ProductViewSet, basename="products")   # Registering the ProductViewSet with the router
 router.register("orders", OrderViewSet, basename="orders")   # Registering the OrderViewSet with the router
+router.register("cart", CartViewSet, basename="cart")   # The user's Redis-backed cart
+router.register("reservations", ReservationViewSet, basename="reservations")   # Timed stock holds
 
 urlpatterns = [
     path("", include(router.urls)), # Including the router URLs
     path("auth/register/", RegisterView.as_view(), name="register"), # User registration endpoint
+    path("analytics/sales/", sales_analytics, name="analytics-sales"), # Admin sales figures from the rollups
+    path("metrics/", metrics_view, name="metrics"), # Admin Prometheus metrics of the serving worker
+    path("metrics/slow-requests/", slow_requests, name="metrics-slow-requests"),
+    path("async/categories/", AsyncCategoryListView.as_view(), name="async-categories-list"), # Native async read endpoints
+    path("async/products/", AsyncProductListView.as_view(), name="async-products-list"),
+    path("async/products/<int:pk>/", AsyncProductDetailView.as_view(), name="async-products-detail"),
 ]
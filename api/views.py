@@ -1,13 +1,38 @@
-from rest_framework import viewsets, status, generics
-from rest_framework.decorators import action, api_view, permission_classes
-from rest_framework.permissions import IsAdminUser, IsAuthenticated, AllowAny
+from rest_framework import viewsets, status, generics, mixins
+from rest_framework.generics import get_object_or_404
+from rest_framework.decorators import action, api_view, permission_classes, renderer_classes
+from rest_framework.permissions import AllowAny, BasePermission, IsAdminUser, IsAuthenticated
+from rest_framework.exceptions import NotFound, ParseError, ValidationError
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
 from django.core.cache import cache
 from django.conf import settings
+from django.db import transaction
 from django.db.models import Prefetch
-from .models import Category, Product, Order
-from .serializers import CategorySerializer, ProductSerializer, OrderSerializer, RegisterSerializer, UserSerializer
-from .filters import ProductFilter
+from .models import Category, Product, Order, StockReservation
+from .serializers import (
+    CategorySerializer, ProductSerializer, OrderSerializer, RegisterSerializer, UserSerializer, SalesReportQuerySerializer,
+    BulkStatusSerializer, CartItemSerializer, CartQuantitySerializer, StockReservationSerializer,
+    ReservationConfirmSerializer, summary_requested,
+)
+from .filters import OrderExportFilter, ProductFilter, ProductSearchFilter
+from .pagination import OptionalKeysetPaginationMixin, KeysetPagination
+from .outbox import enqueue_order_notification
+from .orders import transition_orders
+from . import cart, checkout, flashsale
+from .reservations import confirm_reservations, release_reservations
+from .permissions import IsAdminOrReadOnly
+from .ingest import FORMATS, decode_lines, format_for_content_type, upsert_products
+from .exports import FORMATS as EXPORT_FORMATS, export_response
+from .analytics import forget_order, sales_report
+from .fast_serializers import order_rows, order_values, product_rows, product_values
+from .renderers import PrometheusTextRenderer
+from . import metrics
+from .conditional import evaluate_preconditions, has_preconditions, set_validators, validators
+from .cache import (
+    get_versions, category_list_key, category_list_namespaces, product_list_key, product_list_namespaces, product_namespaces,
+    product_list_stale_key, normalize_query, render_cache_entry, cached_json_response, get_or_regenerate,
+)
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework import filters as drf_filters
 from django_filters.rest_framework import DjangoFilterBackend
@@ -16,6 +41,37 @@ from django_filters.rest_framework import DjangoFilterBackend
 
 CACHE_TIMEOUT = 3600  # 1 hour
 
+# List and retrieve from .values() projections instead of the model serializers
+# (see api.fast_serializers); the response JSON is the same. Writes still go
+# through serializer_class.
+class FastReadMixin:
+    # queryset -> .values() queryset, and .values() rows -> response dicts
+    values = None
+    rows = None
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.rows(page))
+        return Response(self.rows(queryset))
+
+    # rows aren't model instances, so views with object-level permissions
+    # retrieve through the serializer, with the instance those checks expect
+    def retrieve(self, request, *args, **kwargs):
+        if self.checks_objects():
+            return super().retrieve(request, *args, **kwargs)
+        queryset = self.values(self.filter_queryset(self.get_queryset()))
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        row = get_object_or_404(queryset, **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        return Response(self.rows([row])[0])
+
+    def checks_objects(self):
+        return any(
+            type(permission).has_object_permission is not BasePermission.has_object_permission
+            for permission in self.get_permissions()
+        )
+
 # User registration view
 class RegisterView(generics.CreateAPIView):
     serializer_class = RegisterSerializer
@@ -25,111 +81,378 @@ class RegisterView(generics.CreateAPIView):
 class CategoryViewSet(viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
-    permission_classes = (IsAdminUser,)  # only admin can create/update/delete
+    permission_classes = (IsAdminOrReadOnly,)  # only admin can create/update/delete
+    stateless_reads = True  # reads don't depend on the user (see api.authentication)
 
+    # JSON lists carry validators; an unchanged list is answered with a 304.
+    # `?summary=true` adds each category's catalogue summary
     def list(self, request, *args, **kwargs):
-        key = "categories_list"
+        summary = summary_requested(request)
+        versions = get_versions(*category_list_namespaces(summary))
+        conditional = request.accepted_renderer.format == "json"
+        if conditional:
+            etag, last_modified = validators(versions, "categories", summary)
+            not_modified = evaluate_preconditions(request, etag, last_modified)
+            if not_modified is not None:
+                return not_modified
+        key = category_list_key(versions, summary)
         data = cache.get(key)
         if data is None:
             qs = self.get_queryset()
-            data = CategorySerializer(qs, many=True).data
+            data = CategorySerializer(qs, many=True, context=self.get_serializer_context()).data
             cache.set(key, data, CACHE_TIMEOUT)
-        return Response(data)
+        response = Response(data)
+        return set_validators(response, etag, last_modified) if conditional else response
 
 # Product viewset with filtering, searching, ordering, and caching
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(FastReadMixin, OptionalKeysetPaginationMixin, viewsets.ModelViewSet):
     queryset = Product.objects.select_related("category").all()
     serializer_class = ProductSerializer
+    values = staticmethod(product_values)
+    rows = staticmethod(product_rows)
     permission_classes = (AllowAny,)
-    filter_backends = [DjangoFilterBackend, drf_filters.SearchFilter, drf_filters.OrderingFilter]
+    stateless_reads = True
+    filter_backends = [DjangoFilterBackend, ProductSearchFilter, drf_filters.OrderingFilter]
     filterset_class = ProductFilter
-    search_fields = ["name", "description"]
     ordering_fields = ["price", "stock", "created_at"]
 
-    # Override list to implement caching
+    # Override list to serve pre-rendered pages from the cache; a page is
+    # rendered by one request at a time while the others get its stale copy.
+    # Pages carry validators, so an unchanged page is answered with a 304
     def list(self, request, *args, **kwargs):
-        # caching key depends on query params so different filters have different keys
-        key = f"products_list:{request.get_full_path()}"
-        data = cache.get(key)
-        if data is None:
-            qs = self.filter_queryset(self.get_queryset())
-            page = self.paginate_queryset(qs)
-            if page is not None:
-                serializer = self.get_serializer(page, many=True)
-                data = serializer.data
-                # stash paginated response as well
-                cache.set(key, data, CACHE_TIMEOUT)
-                return self.get_paginated_response(data)
-            serializer = self.get_serializer(qs, many=True)
-            data = serializer.data
-            cache.set(key, data, CACHE_TIMEOUT)
-        # If cached, still need to return paginated shape when applicable
-        # Simpler approach: return full cached array with manual pagination
-        page = self.paginate_queryset(self.get_queryset())
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
-        return Response(data)
+        # cached bodies are JSON; other renderers (e.g. the browsable API) go uncached
+        if request.accepted_renderer.format != "json":
+            return super().list(request, *args, **kwargs)
+        location, query, category_id = product_list_cache_parts(request, self.paginator)
+        versions = get_versions(*product_list_namespaces(category_id))
+        page_validators = validators(versions, location, query)
+        not_modified = evaluate_preconditions(request, *page_validators)
+        if not_modified is not None:
+            return not_modified
+        rendered = []
 
-    # Admin-only create/update/destroy should invalidate caches
-    def perform_create(self, serializer):
-        serializer.save()
-        cache.clear()
+        def render_page():
+            rendered.append(super(ProductViewSet, self).list(request, *args, **kwargs))
+            return render_cache_entry(rendered[0].data, page_validators)
 
-    def perform_update(self, serializer):
-        serializer.save()
-        cache.clear()
+        entry = get_or_regenerate(
+            product_list_key(location, query, category_id, versions),
+            render_page,
+            CACHE_TIMEOUT,
+            stale_key=product_list_stale_key(location, query),
+        )
+        # the request that rendered the page answers with it directly
+        if rendered:
+            return set_validators(rendered[0], *page_validators)
+        return cached_json_response(request, entry)
 
-    def perform_destroy(self, instance):
-        instance.delete()
-        cache.clear()
+    # JSON product pages carry validators from the product's and the categories'
+    # generations, so polling an unchanged product costs no query
+    def retrieve(self, request, *args, **kwargs):
+        product_validators = self.product_validators() if request.accepted_renderer.format == "json" else None
+        if product_validators is None:
+            return super().retrieve(request, *args, **kwargs)
+        not_modified = evaluate_preconditions(request, *product_validators)
+        if not_modified is not None:
+            return not_modified
+        return set_validators(super().retrieve(request, *args, **kwargs), *product_validators)
+
+    # Edits honour If-Match / If-Unmodified-Since with the validators of the
+    # product page, so an edit made from an outdated copy gets a 412 instead of
+    # overwriting a newer change
+    def update(self, request, *args, **kwargs):
+        with transaction.atomic():
+            self.check_write_preconditions(request)
+            return super().update(request, *args, **kwargs)
+
+    def destroy(self, request, *args, **kwargs):
+        with transaction.atomic():
+            self.check_write_preconditions(request)
+            return super().destroy(request, *args, **kwargs)
+
+    def check_write_preconditions(self, request):
+        product_id = self.product_id()
+        if product_id is None or not has_preconditions(request):
+            return
+        # lock the row first: writes bump the product's generation before they
+        # commit, so of two edits sent with the same ETag only the first passes
+        list(Product.objects.select_for_update().filter(pk=product_id).values_list("pk"))
+        evaluate_preconditions(request, *self.product_validators())
+
+    def product_validators(self):
+        product_id = self.product_id()
+        if product_id is None:
+            return None
+        return validators(get_versions(*product_namespaces(product_id)), "product", product_id)
+
+    def product_id(self):
+        try:
+            return int(self.kwargs[self.lookup_url_kwarg or self.lookup_field])
+        except (KeyError, ValueError):
+            return None
+
+    # Create or update products by SKU from an NDJSON or CSV request body.
+    # The body is read as a stream (never through request.data), so uploads of
+    # any size are processed batch by batch; see api.ingest
+    @action(detail=False, methods=["post"], url_path="bulk-upsert", permission_classes=[IsAdminUser])
+    def bulk_upsert(self, request):
+        fmt = request.query_params.get("input") or format_for_content_type(request.content_type)
+        if fmt not in FORMATS:
+            return Response(
+                {"detail": "Send text/csv or application/x-ndjson, or pass ?input=csv or ?input=ndjson."},
+                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            )
+        try:
+            report = upsert_products(decode_lines(request.stream or []), fmt)
+        except UnicodeDecodeError:
+            raise ParseError("Request body is not valid UTF-8.")
+        return Response(report.as_dict())
+
+    # Put a product on flash sale (POST) with its stock mirrored into Redis, or
+    # take it off (DELETE) with the final stock written back; see api.flashsale
+    @action(detail=True, methods=["post", "delete"], url_path="flash-sale", permission_classes=[IsAdminUser])
+    def flash_sale(self, request, pk=None):
+        product_id = self.product_id()
+        if product_id is None:
+            raise NotFound()
+        if request.method == "DELETE":
+            stock = flashsale.end_flash_sale(product_id)
+            if stock is None:
+                raise NotFound("Product is not on flash sale.")
+            return Response({"product_id": product_id, "flash_sale": False, "stock": stock})
+        try:
+            stock = flashsale.start_flash_sale(product_id)
+        except Product.DoesNotExist:
+            raise NotFound()
+        return Response({"product_id": product_id, "flash_sale": True, "stock": stock})
+
+
+# caching key parts for a product list page: the normalized query, so equivalent
+# filters share an entry, and the category the page is narrowed to, whose
+# generation decides when the page goes stale (see api.cache.product_list_key)
+def product_list_cache_parts(request, paginator):
+    defaults = {"page": "1"}
+    if paginator is not None:
+        defaults[paginator.page_size_query_param] = str(paginator.page_size)
+    location = request.build_absolute_uri(request.path)
+    if isinstance(paginator, KeysetPagination):
+        # `?cursor=` normalizes away, so keep keyset pages apart explicitly
+        location = f"keyset:{location}"
+    query = normalize_query(request.query_params, defaults)
+    try:
+        category_id = int(request.query_params["category"])
+    except (KeyError, ValueError):
+        category_id = None
+    return location, query, category_id
+
+# Place an order from a valid OrderSerializer and queue its notification in the
+# same transaction; product pages whose stock changed are invalidated by the
+# order placement path. Flash-sale stock admitted for an order that is rolled
+# back afterwards goes back to its sales
+def save_order(serializer):
+    order = None
+    try:
+        with transaction.atomic():
+            order = serializer.save()
+            enqueue_order_notification(order)
+    except BaseException:
+        if order is not None:
+            flashsale.release(order.flash_admitted)
+        raise
+    return order
 
 # Order viewset with user-specific data and notifications
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(FastReadMixin, OptionalKeysetPaginationMixin, viewsets.ModelViewSet):
     serializer_class = OrderSerializer
+    values = staticmethod(order_values)
+    rows = staticmethod(order_rows)
     permission_classes = (IsAuthenticated,)
+    keyset_default_ordering = "-created_at"
+
+    # status changes are for admins
+    def get_permissions(self):
+        if self.action in ("update", "partial_update"):
+            return [IsAdminUser()]
+        return super().get_permissions()
 
     # users see only their orders; admins can see all
     def get_queryset(self):
         user = self.request.user
+        queryset = Order.objects.prefetch_related("items__product__category").order_by("-created_at", "-id")
         if user.is_staff:
-            return Order.objects.select_related("user").prefetch_related("items__product")
-        return Order.objects.filter(user=user).prefetch_related("items__product")
+            return queryset
+        return queryset.filter(user=user)
 
-    # notify user on order creation and status change
-    def perform_create(self, serializer):
-        order = serializer.save()
-        # invalidate product cache because stock changed
-        cache.clear()
-        # notify user via channels
-        from asgiref.sync import async_to_sync
-        from channels.layers import get_channel_layer
-        channel_layer = get_channel_layer()
-        group_name = f"user_{order.user.id}"
-        async_to_sync(channel_layer.group_send)(
-            group_name,
-            {
-                "type": "order.notification",
-                "order_id": order.id,
-                "status": order.status,
-            },
+    # With asynchronous checkout (api.checkout), `Prefer: respond-async` gets a
+    # 202 with a ticket once the cart is valid; a checkout worker places the order
+    def create(self, request, *args, **kwargs):
+        if not checkout.wants_async(request):
+            return super().create(request, *args, **kwargs)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ticket = checkout.submit(request.user.id, serializer.validated_data["items"])
+        location = reverse("orders-checkout-ticket", kwargs={"ticket": ticket}, request=request)
+        return Response(
+            {"ticket": ticket, "status": "queued"},
+            status=status.HTTP_202_ACCEPTED,
+            headers={"Location": location, "Preference-Applied": "respond-async"},
         )
 
+    # State of an asynchronous checkout: queued, placed (with order_id) or
+    # failed (with errors)
+    @action(detail=False, methods=["get"], url_path=r"checkout/(?P<ticket>[0-9a-f]{32})")
+    def checkout_ticket(self, request, ticket=None):
+        state = checkout.ticket_state(ticket, request.user.id)
+        if state is None:
+            raise NotFound()
+        return Response(state)
+
+    # notify user on order creation and status change; notifications go through
+    # the outbox in the same transaction and are delivered by dispatch_outbox
+    def perform_create(self, serializer):
+        save_order(serializer)
+
     # notify user on status change
     def perform_update(self, serializer):
-        prev_status = self.get_object().status
-        order = serializer.save()
-        if order.status != prev_status:
-            # send notification
-            from asgiref.sync import async_to_sync
-            from channels.layers import get_channel_layer
-            channel_layer = get_channel_layer()
-            group_name = f"user_{order.user.id}"
-            async_to_sync(channel_layer.group_send)(
-                group_name,
-                {
-                    "type": "order.notification",
-                    "order_id": order.id,
-                    "status": order.status,
-                },
-            )
\ No newline at end of file
+        prev_status = serializer.instance.status
+        with transaction.atomic():
+            order = serializer.save()
+            if order.status != prev_status:
+                enqueue_order_notification(order)
+
+    # deleted orders leave the sales rollups
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            forget_order(instance)
+            instance.delete()
+
+    # Move many orders to one status at once, e.g. a warehouse wave to "shipped":
+    # {"ids": [...], "status": "shipped"}. Only allowed transitions are applied,
+    # in one UPDATE; the other orders are reported as skipped with the reason
+    @action(detail=False, methods=["post"], url_path="bulk-status", permission_classes=[IsAdminUser])
+    def bulk_status(self, request):
+        params = BulkStatusSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+        updated, skipped = transition_orders(params.validated_data["ids"], params.validated_data["status"])
+        return Response({"status": params.validated_data["status"], "updated": updated, "skipped": skipped})
+
+    # Stream every order with its items as CSV or NDJSON, for reconciliation.
+    # `?output=` picks the format (`?format=` is DRF's renderer override);
+    # `status`, `created_after` and `created_before` narrow the export
+    @action(detail=False, methods=["get"], permission_classes=[IsAdminUser])
+    def export(self, request):
+        fmt = request.query_params.get("output", "csv")
+        if fmt not in EXPORT_FORMATS:
+            raise ValidationError({"output": [f"Choose one of: {', '.join(EXPORT_FORMATS)}."]})
+        filterset = OrderExportFilter(request.query_params, queryset=Order.objects.all())
+        if not filterset.is_valid():
+            raise ValidationError(filterset.errors)
+        return export_response(filterset.qs, fmt)
+
+
+# The user's cart, kept in Redis (see api.cart): GET shows it with current
+# prices and stock, POST adds {"product_id", "quantity"}, PUT/PATCH
+# /cart/<product_id>/ sets a quantity, DELETE /cart/<product_id>/ removes a
+# line. Changing the cart runs no SQL
+class CartViewSet(viewsets.ViewSet):
+    permission_classes = (IsAuthenticated,)
+    lookup_value_regex = r"\d+"
+
+    def list(self, request):
+        return Response(cart.cart_contents(request.user.id))
+
+    def create(self, request):
+        params = CartItemSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+        product_id = params.validated_data["product_id"]
+        try:
+            quantity = cart.add_item(request.user.id, product_id, params.validated_data["quantity"])
+        except cart.CartFull as exc:
+            raise ValidationError({"product_id": [str(exc)]})
+        return Response({"product_id": product_id, "quantity": quantity}, status=status.HTTP_201_CREATED)
+
+    def update(self, request, pk=None):
+        params = CartQuantitySerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+        try:
+            quantity = cart.set_item(request.user.id, int(pk), params.validated_data["quantity"])
+        except cart.CartFull as exc:
+            raise ValidationError({"product_id": [str(exc)]})
+        return Response({"product_id": int(pk), "quantity": quantity})
+
+    def partial_update(self, request, pk=None):
+        return self.update(request, pk)
+
+    def destroy(self, request, pk=None):
+        cart.remove_items(request.user.id, [int(pk)])
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=False, methods=["post"])
+    def clear(self, request):
+        cart.clear_cart(request.user.id)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    # Turn the cart into an order in one request, through the same serializer
+    # and transaction as POST /orders/. The ordered lines leave the cart once
+    # the order is committed; a failed order (e.g. short stock) leaves it as is
+    @action(detail=False, methods=["post"])
+    def checkout(self, request):
+        lines = cart.get_cart(request.user.id)
+        items = [{"product_id": product_id, "quantity": quantity} for product_id, quantity in sorted(lines.items())]
+        serializer = OrderSerializer(data={"items": items}, context={"request": request})
+        serializer.is_valid(raise_exception=True)
+        save_order(serializer)
+        user_id = request.user.id
+        transaction.on_commit(lambda: cart.remove_items(user_id, list(lines)))
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+# The user's stock reservations: POST {"product_id", "quantity"} holds units
+# for RESERVATION_TTL seconds, DELETE /reservations/<id>/ releases a hold and
+# POST /reservations/confirm/ {"ids": [...]} turns holds into one order
+class ReservationViewSet(mixins.ListModelMixin, mixins.CreateModelMixin, mixins.DestroyModelMixin, viewsets.GenericViewSet):
+    serializer_class = StockReservationSerializer
+    permission_classes = (IsAuthenticated,)
+
+    def get_queryset(self):
+        return StockReservation.objects.filter(user=self.request.user).order_by("-created_at", "-id")
+
+    def destroy(self, request, *args, **kwargs):
+        release_reservations(request.user, [self.get_object().id])
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=False, methods=["post"])
+    def confirm(self, request):
+        params = ReservationConfirmSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+        order = confirm_reservations(request.user, params.validated_data["ids"])
+        return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
+
+
+# Sales figures for a date range, answered from the daily rollups (see api.analytics):
+# ?start=&end= (dates, inclusive), ?group=day|product|category, ?status=, ?limit=
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def sales_analytics(request):
+    params = SalesReportQuerySerializer(data=request.query_params)
+    params.is_valid(raise_exception=True)
+    return Response(sales_report(**params.validated_data))
+
+
+# This worker's request, database, cache and channel-layer metrics in the
+# Prometheus text format (see api.metrics)
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+@renderer_classes([PrometheusTextRenderer])
+def metrics_view(request):
+    return Response(metrics.registry.render())
+
+
+# Samples of this worker's slow requests with their slowest SQL, newest first
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def slow_requests(request):
+    return Response({
+        "threshold_ms": metrics.SLOW_REQUEST_SECONDS * 1000,
+        "results": list(reversed(metrics.slow_samples)),
+    })
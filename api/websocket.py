@@ -0,0 +1,97 @@
+import time
+from urllib.parse import parse_qs
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+# WebSocket authentication and admission control.
+# Clients authenticate with a SimpleJWT access token, sent as `?token=` (browsers
+# can't set headers on WebSockets) or as an `Authorization: Bearer` header.
+# The token is only verified (signature, expiry, type), so connecting never
+# touches the database or the session store; the user is a TokenUser built
+# from the claims. Handshakes are admitted at WS_CONNECT_RATE per second (with
+# bursts of WS_CONNECT_BURST) and up to WS_MAX_CONNECTIONS open sockets per
+# worker; the rest are refused before any work is done, so reconnect storms
+# after a deploy are spread out by the clients' retry backoff.
+
+CONNECT_RATE = getattr(settings, "WS_CONNECT_RATE", 500)
+CONNECT_BURST = getattr(settings, "WS_CONNECT_BURST", 2000)
+MAX_CONNECTIONS = getattr(settings, "WS_MAX_CONNECTIONS", 50_000)
+
+
+# Token bucket for handshakes plus a cap on open connections. Used from one
+# event loop, so it needs no locking
+class ConnectionAdmission:
+
+    def __init__(self, rate=CONNECT_RATE, burst=CONNECT_BURST, max_connections=MAX_CONNECTIONS):
+        self.rate = rate
+        self.burst = burst
+        self.max_connections = max_connections
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.open = 0
+        self.refused = 0
+
+    def admit(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.open >= self.max_connections or self.tokens < 1:
+            self.refused += 1
+            return False
+        self.tokens -= 1
+        return True
+
+
+def _raw_token(scope):
+    token = parse_qs(scope.get("query_string", b"").decode("latin-1")).get("token")
+    if token:
+        return token[0]
+    for name, value in scope.get("headers", ()):
+        if name == b"authorization":
+            parts = value.decode("latin-1").split()
+            if len(parts) == 2 and parts[0] in api_settings.AUTH_HEADER_TYPES:
+                return parts[1]
+    return None
+
+
+# (user, expiry as a UNIX timestamp) for the scope's token; AnonymousUser and
+# None without a valid one
+def authenticate_scope(scope):
+    raw = _raw_token(scope)
+    if raw is None:
+        return AnonymousUser(), None
+    try:
+        token = AccessToken(raw)
+    except TokenError:
+        return AnonymousUser(), None
+    if api_settings.USER_ID_CLAIM not in token:
+        return AnonymousUser(), None
+    return api_settings.TOKEN_USER_CLASS(token), token.get("exp")
+
+
+# Sets scope["user"] (and scope["token_expires_at"]) from a JWT and refuses
+# handshakes beyond the admission limits
+class JWTAuthMiddleware:
+
+    def __init__(self, inner, admission=None):
+        self.inner = inner
+        self.admission = admission or ConnectionAdmission()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "websocket":
+            return await self.inner(scope, receive, send)
+        if not self.admission.admit():
+            # refusing the handshake makes the server answer 403
+            await receive()
+            await send({"type": "websocket.close", "code": 1013})
+            return
+        user, expires_at = authenticate_scope(scope)
+        scope = dict(scope, user=user, token_expires_at=expires_at)
+        self.admission.open += 1
+        try:
+            return await self.inner(scope, receive, send)
+        finally:
+            self.admission.open -= 1
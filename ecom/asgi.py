@@ -10,17 +10,19 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 import os
 import django
 from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
 from django.core.asgi import get_asgi_application
-import api.routing
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ecom.settings")
 django.setup()
 
+# imported once Django is set up: they use settings and models
+import api.routing
+from api.websocket import JWTAuthMiddleware
+
 application = ProtocolTypeRouter({
     "http": get_asgi_application(),
-    "websocket": AuthMiddlewareStack(
+    # token-authenticated sockets with connect admission control; no session or database access at connect
+    "websocket": JWTAuthMiddleware(
         URLRouter(api.routing.websocket_urlpatterns)
     ),
 })
-
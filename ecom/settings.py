@@ -53,6 +53,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # first, so the time spent in the other middleware is measured too
+    'api.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -90,6 +92,9 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # SQLite ignores select_for_update; taking the write lock when the
+        # transaction begins avoids lock-upgrade deadlocks between buyers
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE', 'timeout': 20},
     }
 }
 
@@ -106,14 +111,27 @@ DATABASES = {
 # }
 
 # Redis cache
+# Redis behind a per-worker in-process LRU (api.cache_backends); only the
+# version counters, pre-rendered pages and authenticated users are kept locally
 CACHES = {
     "default": {
-        "BACKEND": "django_redis.cache.RedisCache",
+        "BACKEND": "api.cache_backends.TwoTierRedisCache",
         "LOCATION": os.getenv("REDIS_URL", "redis://127.0.0.1:6379/1"),
-        "OPTIONS": {"CLIENT_CLASS": "django_redis.client.DefaultClient"},
+        "OPTIONS": {
+            "CLIENT_CLASS": "django_redis.client.DefaultClient",
+            "LOCAL_MAX_ENTRIES": 2000,
+            "LOCAL_MAX_BYTES": 32 * 1024 * 1024,
+            "LOCAL_TIMEOUT": 30,
+            "LOCAL_KEY_PREFIXES": ("ver:", "categories_list:", "products_list:", "auth_user:"),
+        },
     }
 }
 
+# Pre-rendered API cache entries are also stored gzip-compressed once they
+# reach this size, and served as-is to clients that accept gzip
+API_CACHE_COMPRESS = True
+API_CACHE_COMPRESS_MIN_BYTES = 1024
+
 # Channels layer (Redis)
 CHANNEL_LAYERS = {
     "default": {
@@ -122,12 +140,42 @@ CHANNEL_LAYERS = {
     }
 }
 
+# WebSocket admission per worker (api.websocket) and heartbeats (api.consumers)
+WS_CONNECT_RATE = 500
+WS_CONNECT_BURST = 2000
+WS_MAX_CONNECTIONS = 50_000
+WS_HEARTBEAT_INTERVAL = 25
+WS_IDLE_TIMEOUT = 75
+
+# Server-side carts in Redis (api.cart): expiry after the last change, and limits
+CART_TIMEOUT = 30 * 86400
+CART_MAX_LINES = 100
+CART_MAX_QUANTITY = 1000
+
+# Stock reservations (api.reservations): seconds a hold lasts, and holds
+# expired per sweep
+RESERVATION_TTL = 900
+RESERVATION_SWEEP_BATCH_SIZE = 1000
+
+# Asynchronous checkout (api.checkout): POST /orders/ with `Prefer: respond-async`
+# answers 202 with a ticket, and run_checkout_workers places the orders
+ASYNC_CHECKOUT = os.getenv("ASYNC_CHECKOUT", "False") == "True"
+CHECKOUT_QUEUE = "api.checkout.RedisStreamQueue"
+CHECKOUT_BATCH_SIZE = 50
+CHECKOUT_TICKET_TTL = 3600
+CHECKOUT_STREAM_MAXLEN = 1_000_000
+
 # REST Framework + SimpleJWT
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        # JWTAuthentication with users served from the cache
+        "api.authentication.CachedJWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": ("rest_framework.permissions.IsAuthenticatedOrReadOnly",),
+    "DEFAULT_RENDERER_CLASSES": (
+        "api.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
     "DEFAULT_PAGINATION_CLASS": "api.pagination.StandardResultsSetPagination",
     "DEFAULT_FILTER_BACKENDS": ("django_filters.rest_framework.DjangoFilterBackend",),
 }
@@ -139,6 +187,12 @@ SIMPLE_JWT = {
     "AUTH_HEADER_TYPES": ("Bearer",),
 }
 
+# Seconds a user stays cached for JWT authentication (api.authentication)
+AUTH_USER_CACHE_TIMEOUT = 300
+# Authenticate safe-method requests to views with `stateless_reads` from the
+# token claims alone; a deactivated user keeps those reads until the token expires
+JWT_STATELESS_READS = os.getenv("JWT_STATELESS_READS", "False") == "True"
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 